@@ -2,9 +2,10 @@ from torch_DE.equations import get_NavierStokes,get_derivatives
 from torch_DE.geometry.shapes import *
 from torch_DE.continuous.Engines import FD_engine
 from torch_DE.continuous import DE_Getter
-from torch_DE.continuous.Networks import Fourier_Net
+from torch_DE.continuous.Networks import Fourier_Net,Periodic_embedding
+import torch.nn as nn
 from torch.optim.lr_scheduler import StepLR
-from torch_DE.utils import Loss_handler,GradNorm
+from torch_DE.utils import Loss_handler,GradNorm,Causal_binned_weighting
 from torch_DE.utils.data import PINN_Dataloader,PINN_dataset
 from torch_DE.equations import DE_func
 '''
@@ -15,7 +16,7 @@ u_t - 0.0001*u_xx + 5*u^3 -5*u = 0
 This Example highlights using the Causal Weighting Feature in torch DE. It is effective for time dependent PDEs as it forces propagation from the initial condition via causality
 
 As a comparison you can turn the causal training on and off with the do_causal flag at the start of the file to see the difference in results.
-We also show off the periodic boundary conditions here
+The solution is periodic in x, this is imposed exactly with a Periodic_embedding in front of the network so no boundary groups are needed
 '''
 
 do_causal = True
@@ -28,8 +29,6 @@ domain = Domain2D(base = Rectangle(((xmin,tmin),(xmax,tmax))))
 boundary_points = domain.generate_boundary_points(1000)
 sampled_points = domain.generate_points(100_000)
 
-x0 = boundary_points['exterior_edge_0']
-x1 = boundary_points['exterior_edge_2']
 t0= boundary_points['exterior_edge_3']
 
 
@@ -47,8 +46,6 @@ derivatives = get_derivatives(input_vars,output_vars,AllenCahn)
 # Dataset and Loader
 dataset = PINN_dataset(input_vars)
 
-dataset.add_group('boundary_0',x0,batch_size=100,shuffle = True)
-dataset.add_group('boundary_1',x1,batch_size=100,shuffle = True)
 dataset.add_group('t0',t0,batch_size=100,shuffle = True)
 dataset.add_group('collocation points',sampled_points,batch_size=2000,shuffle=True)
 
@@ -56,13 +53,17 @@ dataset.add_group('collocation points',sampled_points,batch_size=2000,shuffle=Tr
 DL = PINN_Dataloader(dataset)
 
 losses = Loss_handler(dataset)
-# losses.add_periodic('boundary_0','boundary_1','u')
-# losses.add_periodic('boundary_0','boundary_1','u_x')
 losses.add_initial_condition('t0',{'u':u_IC})
-losses.add_residual('collocation points',{'AllenCahn':AllenCahn})
+if do_causal:
+    #Batches are shuffled so the points are binned in time instead of sorted
+    causal = Causal_binned_weighting((tmin,tmax),num_bins = 32,eps = 1.0)
+    losses.add_residual('collocation points',causal.residual_functions({'AllenCahn':AllenCahn}),weighting = causal)
+else:
+    losses.add_residual('collocation points',{'AllenCahn':AllenCahn})
 
 #Network
-net = Fourier_Net(2,1,100,4,RWF=True)
+embedding = Periodic_embedding([xmax - xmin,None])
+net = nn.Sequential(embedding,Fourier_Net(embedding.out_features,1,100,4,RWF=True))
 optimizer = torch.optim.Adam(params = net.parameters(), lr = 1e-3)
 LR_sch = StepLR(optimizer,2000,0.9)
 
@@ -90,6 +91,8 @@ for epoch in range(0,301):
         LR_sch.step()
     
     loss.print_losses(epoch)
+    if do_causal:
+        print(f'Causal bin weights min {causal.bin_weights.min():.3E}')
 
 
 X,T = torch.meshgrid([torch.linspace(-1,1,100),torch.linspace(0,1,100)],indexing='ij')
@@ -4,7 +4,7 @@ from torch_DE.continuous import DE_Getter
 from torch_DE.continuous.Networks import MLP,Wang_Net,Fourier_Net
 from torch.optim.lr_scheduler import StepLR
 from torch_DE.utils.data import PINN_Dataloader,PINN_dataset
-from torch_DE.utils import GradNorm,Loss_handler,add_time,set_time
+from torch_DE.utils import GradNorm,Loss_handler,add_time,set_time,TimeMarchingTrainer
 from torch_DE.post import Plotter,Evaluation,Tracker
 import os
 '''
@@ -20,7 +20,8 @@ This problem demonstrates the following:
 
 - Using multiple networks to time step forward
     - It is difficult to train the whole time interval. For each new interval, we set the initial contiion to be the output of the previous network at t=1
-    - We also use the first network as the initial state for the other networks. This significantly improves convergence and is akin to finetuning later time intervals
+    - We also use the previous network as the initial state for the next network. This significantly improves convergence and is akin to finetuning later time intervals
+    - TimeMarchingTrainer handles the windows, the initial condition transfer and a checkpoint per window
 
 - Using Finite difference rather than autograd for significantly faster training
     - We can get a significant increase in speed up for a modest decrease in accuracy. We could set up a loop to first train using finite difference and then further tune with autograd
@@ -119,8 +120,6 @@ dataset.add_group('collocation points',sampled_points,batch_size=5000,shuffle=Tr
 # We add IC after setting the time for the other groups
 dataset.add_group('initial condition',x_IC,{'u':u0,'v':v0},batch_size=1000,shuffle= True)
 
-DL = PINN_Dataloader(dataset)
-
 #Losses
 losses = Loss_handler(dataset)
 losses.add_boundary('inlet',{'u':u_inlet_func,
@@ -139,68 +138,51 @@ losses.add_residual('collocation points',{'stokes_x':NS_x,
 losses.add_data_constraint('initial condition','initial condition',['u','v'])
 
 #Network, Optimizer and LR SETUP
+torch.manual_seed(1234)
+net = Fourier_Net(3,3,128,4,RWF= True,activation= 'tanh')
+PINN = DE_Getter(net)
+PINN.set_vars(input_vars,output_vars)
+PINN.set_derivatives(derivatives)
+PINN.set_deriv_method('FD')
+
+def optimizer_factory(net):
+    optimizer = torch.optim.Adam(params = net.parameters(), lr = 1e-3)
+    return optimizer,StepLR(optimizer,10000,0.9)
+
+#The trainer moves the state of the network at the end of each window into the initial condition group of the next window in place,
+#warm starts the next window from the current weights and saves a checkpoint per window (restart with trainer.train(...,resume = True))
+trainer = TimeMarchingTrainer(PINN,losses,dataset,optimizer_factory,num_windows = 10,window_length = 1.,ic_group = 'initial condition',
+                              ic_vars = ['u','v'],checkpoint_dir = 'Networks',device = 'cuda')
+steps_per_epoch = len(trainer.loader)
+print(f'Num Batches {steps_per_epoch}')
+
+weights = None
+def gradnorm_callback(trainer,step,loss):
+    #GradNorm on the first batch of every 10th epoch. Called before the backward pass so the graph of the loss is still alive
+    global weights
+    if step == 0:
+        weights = torch.ones(len(losses),dtype = torch.float32,device = 'cuda')
+    epoch = step//steps_per_epoch + 1
+    if step % steps_per_epoch == 0 and epoch % 10 == 0:
+        weights = GradNorm(net,weights,*loss.individual_losses())
+        print(weights)
+    return weights
+
+def print_callback(trainer,step,loss):
+    if (step + 1) % steps_per_epoch == 0:
+        loss.print_losses((step + 1)//steps_per_epoch)
+
+trainer.train(MAX_EPOCHS*steps_per_epoch,step_callback = print_callback,weight_callback = gradnorm_callback)
 
 #Post
 plotter = Plotter(input_vars,output_vars)
 plotter.contour_points_from_domain(domain,time=True)
-net = Fourier_Net(3,3,128,4,RWF= True,activation= 'tanh')
-for tp in range(0,10):
-#PYTORCH SETUP
-    torch.manual_seed(1234)
-
-    if tp > 0:        
-        # Set New IC
+for tp in range(trainer.num_windows):
+    net.load_state_dict(trainer.window_states[tp])
+    net = net.cpu()
+    for time_point in [0.0,1]:
         with torch.no_grad():
-            x_Last = set_time('single point',x_IC,point = 1.)
-            out = net.cpu()(x_Last.cpu())
-            u0,v0 = out[:,0],out[:,1]
-            dataset.update_group('initial condition',inputs = x_IC,targets = {'u':u0,'v':v0})
-
-    optimizer = torch.optim.Adam(params = net.parameters(), lr = 1e-3)
-    LR_sch = StepLR(optimizer,10000,0.9)
-    net = net.cuda()
-
-    PINN = DE_Getter(net)
-    PINN.set_vars(input_vars,output_vars)
-    PINN.set_derivatives(derivatives)
-    PINN.set_deriv_method('FD')
-
-    # Training Loop
-    weights = torch.ones(len(losses),dtype = torch.float32,device = 'cuda')
-    print(f'Num Batches {len(DL)}')
-    for epoch in range(1,MAX_EPOCHS+1):
-        weight_flag = True
-        for x in DL:
-            x = x.to(device = 'cuda')
-            #Calculate Derivatives
-            out = PINN.calculate(x)
-            #Get Losses
-            loss = losses(x,out)
-            
-            loss_sum = sum(loss.individual_losses() * weights)
-
-            if (epoch % 10) == 0 and epoch > 0 and weight_flag is True:
-                weights = GradNorm(net,weights,*loss.individual_losses())
-                weight_flag = False
-                print(weights)
-
-            loss_sum.backward()
-            optimizer.step()
-            LR_sch.step()
-
-            optimizer.zero_grad()
-
-        loss.print_losses(epoch)
-        if (epoch % MAX_EPOCHS) == 0:
-            for time_point in [0.0,1]:
-                with torch.no_grad():
-                    out = net.cpu()(x_IC)
-                    t_str = str(time_point).replace('.','_')
-                    plotter.set_time_point(time_point)
-                    plotter.contour(net,['x','y'],'u',f'u velocity at time {t_str} for period {tp}')
-                    # plotter.show()
-                    plotter.savefig(f'Images/Contour_u_time_{t_str}_period_{tp}.png')
-                net = net.cuda()
-            
-    #End of training Loop:
-    torch.save(net.state_dict(),f'Networks/Network_{tp}.pth')
\ No newline at end of file
+            t_str = str(time_point).replace('.','_')
+            plotter.set_time_point(time_point)
+            plotter.contour(net,['x','y'],'u',f'u velocity at time {t_str} for period {tp}')
+            plotter.savefig(f'Images/Contour_u_time_{t_str}_period_{tp}.png')
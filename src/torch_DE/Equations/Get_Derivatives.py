@@ -1,9 +1,20 @@
 import inspect
+from sympy import Basic
+from torch_DE.symbols.compiler import symbolic_derivatives
+
 def get_derivatives(input_vars,output_vars,*equations,merge = True) -> tuple:
+    '''
+    Find the derivatives needed by each equation. Equations can be python functions (derivatives are found from the argument names)
+    or sympy expressions (derivatives are found exactly from the free symbols)
+    '''
     remove_list = set(['kwargs'] + list(input_vars) + list(output_vars))
 
     derivatives = []
     for equation in equations:
+        if isinstance(equation,Basic):
+            derivatives.append(symbolic_derivatives(equation,input_vars,output_vars))
+            continue
+
         var_names = set(inspect.signature(equation).parameters.keys())
         to_remove = set()
         for var in var_names:
@@ -12,6 +23,8 @@ def get_derivatives(input_vars,output_vars,*equations,merge = True) -> tuple:
             #This means that there is no underscore
             elif str.split(var,'_')[0] == var:
                 to_remove.add(var)
+            elif len(str.split(var,'_')) != 2:
+                to_remove.add(var)
             else:
                 
                 output_var,in_vars = str.split(var,'_')
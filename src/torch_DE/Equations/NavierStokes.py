@@ -2,6 +2,8 @@ from torch_DE.equations.Get_Derivatives import get_derivatives
 from typing import Union,List,Tuple,Dict,Callable
 from torch_DE.equations.de_func import DE_func
 
+from torch_DE.symbols import Deriv
+from sympy import Symbol,Basic
 from functools import partial
 import inspect
 
@@ -22,7 +24,27 @@ def NavierStokes_z(u,v,w, w_x,w_y,w_z ,w_t, w_xx,w_yy,w_zz,p_z,Re, **kwargs):
 def incompressible(u_x,v_y,w_z,**kwargs):
     return u_x + v_y + w_z
 
-def get_NavierStokes(dims:int = 2,steady_state:bool = False,Re= None) -> Tuple[List[str],List[str],List[str],Dict[str,Callable]]:
+def symbolic_NavierStokes(dims:int = 2,steady_state:bool = False,Re = None) -> Dict[str,Basic]:
+    '''
+    Sympy expressions of the NavierStokes and continuity equations in `dims` dimensions. If Re is None then it is left as the symbol `Re`
+    '''
+    spatial = ('x','y','z')[0:dims]
+    velocity = ('u','v','w')[0:dims]
+    Re = Symbol('Re') if Re is None else Re
+    names = ('NavierStokes_x','NavierStokes_y','NavierStokes_z')[0:dims]
+
+    equations = {}
+    for name,u_i,x_i in zip(names,velocity,spatial):
+        NS = sum(Symbol(u_j)*Deriv(u_i,x_j) for u_j,x_j in zip(velocity,spatial)) + Deriv('p',x_i) \
+            - 1/Re*sum(Deriv(u_i,x_j,2) for x_j in spatial)
+        if not steady_state:
+            NS = Deriv(u_i,'t') + NS
+        equations[name] = NS
+    equations['incompressible'] = sum(Deriv(u_j,x_j) for u_j,x_j in zip(velocity,spatial))
+    return equations
+
+
+def get_NavierStokes(dims:int = 2,steady_state:bool = False,Re= None,symbolic:bool = False) -> Tuple[List[str],List[str],List[str],Dict[str,Callable]]:
     '''
     Returns the Reynold non-dimensional incompressible NavierStokes equations and other helpful things for dims upto 3
 
@@ -31,6 +53,8 @@ def get_NavierStokes(dims:int = 2,steady_state:bool = False,Re= None) -> Tuple[L
         steady_state    : bool (default False) of whether to calculate Navierstokes in steady state or transient 
         incompressible  : bool (default True) of if to have incompressible flow
         Re              : float | Nonetype whether to preinitialise the Reynolds number. Default None
+        symbolic        : bool (default False) if True the equations are compiled from sympy expressions with `torch_DE.symbols.compile_equations()`
+                          so terms shared between equations are only calculated once
     Returns:
         tuple: (input_vars,output_vars,function_dict)
             input_vars  : tuple of independent variables in the order of (x,y,z) depending on the number of dims, if transient then the variable t is appended to the end e.g. (u,v,t)
@@ -38,6 +62,17 @@ def get_NavierStokes(dims:int = 2,steady_state:bool = False,Re= None) -> Tuple[L
             derivatives : tuple containing all the derivatives needed across all equations
             functions   : Dict containing the Navier stokes equations in `dims` dimensions and the continuity equation (incompressibility)
     '''
+    if dims > 3 or dims < 1:
+        raise ValueError('Dims can only be int type and between 1 and 3')
+
+    if symbolic:
+        from torch_DE.symbols.compiler import compile_equations
+        input_vars = ('x','y','z')[0:dims] + (tuple() if steady_state else ('t',))
+        output_vars = ('u','v','w')[0:dims] + ('p',)
+        equations = symbolic_NavierStokes(dims,steady_state,Re)
+        derivatives = get_derivatives(input_vars,output_vars,*equations.values())
+        return input_vars,output_vars,derivatives,compile_equations(equations)
+
     t = tuple(['t'])
     if steady_state:
         t = tuple()
@@ -62,9 +97,7 @@ def get_NavierStokes(dims:int = 2,steady_state:bool = False,Re= None) -> Tuple[L
     # variables = set( [inspect.signature(NS).parameters.keys() for NS in equations]  )
 
     
-    if dims > 3 or dims < 1:
-        raise ValueError('Dims can only be int type and between 1 and 3')
-    elif dims == 2:
+    if dims == 2:
         NS_x,NS_y = partial(NS_x,w=0,u_z =0,u_zz = 0),partial(NS_y,w=0,v_z =0,v_zz = 0)
         incomp = partial(incompressible,w_z = 0)
     elif dims == 1:
@@ -0,0 +1,93 @@
+import time
+import torch
+from torch_DE.continuous import DE_Getter
+from torch_DE.continuous.Networks import Fourier_Net
+from torch_DE.utils import Loss_handler,GradNorm
+from torch_DE.utils.loss_weighting import NTK_weighting,GradNorm_batched,subsample_batch
+from torch_DE.utils.data import PINN_dataset,PINN_dict
+from torch_DE.equations import DE_func
+
+'''
+Cost of a weight update relative to one training step for the NTK weighting (full batch and sub-sampled batch) and GradNorm.
+
+The problem is the 2D Poisson equation u_xx + u_yy = f with Dirichlet boundaries. Run with
+
+    python -m torch_DE.benchmark.NTK_weighting_cost
+'''
+
+
+def synchronise(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+
+
+def time_function(func,device,repeats:int = 10) -> float:
+    func()
+    synchronise(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    synchronise(device)
+    return (time.perf_counter() - start)/repeats
+
+
+def build_problem(num_points:int,device):
+    @DE_func
+    def poisson(u_xx,u_yy,x,y,**kwargs):
+        return u_xx + u_yy + 2*torch.pi**2*torch.sin(torch.pi*x)*torch.sin(torch.pi*y)
+
+    dataset = PINN_dataset(['x','y'])
+    dataset.add_group('collocation points',torch.rand(num_points,2),batch_size = num_points)
+    for i,(col,value) in enumerate([(0,0.),(0,1.),(1,0.),(1,1.)]):
+        x = torch.rand(num_points//10,2)
+        x[:,col] = value
+        dataset.add_group(f'boundary_{i}',x,batch_size = num_points//10)
+
+    losses = Loss_handler(dataset)
+    losses.add_residual('collocation points',{'poisson':poisson})
+    for i in range(4):
+        losses.add_boundary(f'boundary_{i}',{'u':0.})
+
+    net = Fourier_Net(2,1,128,4).to(device)
+    PINN = DE_Getter(net,['x','y'],['u'],['u_xx','u_yy'])
+    batch = PINN_dict({name:group for name,group in dataset.groups.items()}).to(device)
+    return net,PINN,losses,batch
+
+
+def run(num_points:int = 10_000,sample_size:int = 512,num_probes:int = 4,device = None,repeats:int = 10) -> dict:
+    '''
+    Returns the time of each operation in seconds and relative to one training step
+    '''
+    device = torch.device(('cuda' if torch.cuda.is_available() else 'cpu') if device is None else device)
+    net,PINN,losses,batch = build_problem(num_points,device)
+    weights = torch.ones(len(losses),device = device)
+
+    def train_step():
+        loss = losses(batch,PINN(batch))
+        (weights*loss.individual_losses()).sum().backward()
+        net.zero_grad()
+
+    def ntk_full():
+        NTK_weighting(net,weights,losses(batch,PINN(batch)),num_probes = num_probes,sample_size = sample_size)
+
+    def ntk_subsampled():
+        sub = subsample_batch(batch,sample_size)
+        NTK_weighting(net,weights,losses(sub,PINN(sub)),num_probes = num_probes,sample_size = sample_size)
+
+    def gradnorm():
+        GradNorm(net,weights,*losses(batch,PINN(batch)).individual_losses())
+
+    def gradnorm_batched():
+        GradNorm_batched(net,weights,*losses(batch,PINN(batch)).individual_losses())
+
+    results = {name:time_function(func,device,repeats) for name,func in [('train step',train_step),('NTK full batch',ntk_full),
+                                                                       ('NTK sub-sampled',ntk_subsampled),('GradNorm',gradnorm),
+                                                                       ('GradNorm batched',gradnorm_batched)]}
+    step = results['train step']
+    for name,t in results.items():
+        print(f'{name:<20} {t*1e3:8.2f} ms  {t/step:6.2f} x train step')
+    return results
+
+
+if __name__ == '__main__':
+    run()
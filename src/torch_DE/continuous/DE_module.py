@@ -1,6 +1,7 @@
 import torch
 import torch.nn as nn
 from .Engines import *
+from .Networks import Ensemble,Operator_Module,Separable_Net
 from typing import Union,Any
 from torch_DE.utils.data import PINN_dict
 from torch_DE.symbols import *
@@ -65,13 +66,19 @@ class DE_Getter():
         #Add the network evaluation output to this dictionary
         self.derivatives.update({output_var: (i,) for i,output_var in enumerate(output_vars) })
 
-        if net_check is True:
+        #Operator networks need a cached branch embedding to be evaluated
+        if net_check is True and isinstance(self.net,Operator_Module):
+            assert getattr(self.net,'num_outputs',len(output_vars)) == len(output_vars), f'The operator has {self.net.num_outputs} outputs but {len(output_vars)} output variables were given'
+        elif net_check is True:
             #Check that networks input and output match
             initial_device = next(self.net.parameters()).device
             test_net = self.net.cpu()
             try:
                 x = torch.zeros((1,len(input_vars)))
                 y = test_net(x)
+                #Ensembles have an extra leading dimension for the members
+                if isinstance(self.net,Ensemble):
+                    y = y[0]
 
                 #Check output size matches number of output_vars given
                 assert y.shape[1] == len(output_vars), f'The output of the network of size {y.shape[1]} does not match the number of output variables given {len(output_vars)}'
@@ -131,6 +138,12 @@ class DE_Getter():
             engine Object: Pass in your own engine object to extract derivatives. Must be already initialised
                 Torch DE has the following engines built in:
                     FD_engine: Obtain the derivatives via finite difference. Currently only supports upto 2nd order non-mixed derivatives
+                    Grid_FD_engine ('grid FD'): Finite differences between neighbouring points of grid groups (see `PINN_grid_group()`). One network pass per batch
+                    RBF_FD_engine ('RBF FD'): Meshless finite differences over scattered points. Stencils must be built with `build()` before training
+                    Ensemble_AD_engine: used automatically with 'AD' when the network is an `Ensemble()`. Outputs have shape (K,B)
+                    Separable_engine: used automatically with 'AD' when the network is a `Separable_Net()`. Forward mode AD of each axis network
+                        and outer products on grid groups
+                    Operator_engine: used automatically with 'AD' or 'FD' when the network is an `Operator_Module()` e.g. `DeepONet()`. Outputs have shape (F,B)
 
             
         kwargs: any keywords to initialize the engine. net and derivatives are automatically passed in
@@ -140,11 +153,24 @@ class DE_Getter():
         
         if not isinstance(self.derivatives,dict):
             raise ValueError(f'The derivatives to extract has not been set properly instead a type of {type(self.derivatives)} was found')
-        if isinstance(deriv_method,str):
+        if isinstance(deriv_method,str) and isinstance(self.net,Operator_Module):
+            self.deriv_method = Operator_engine(self.net,self.derivatives,method = deriv_method,**kwargs)
+        elif deriv_method == 'AD' and isinstance(self.net,Separable_Net):
+            self.deriv_method = Separable_engine(self.net,self.derivatives,**kwargs)
+        elif isinstance(deriv_method,str) and isinstance(self.net,Ensemble):
+            if deriv_method != 'AD':
+                raise ValueError(f'Ensemble networks only support the \'AD\' deriv_method. Got {deriv_method} instead')
+            self.deriv_method = Ensemble_AD_engine(self.net,self.derivatives,**kwargs)
+        elif isinstance(deriv_method,str):
             if deriv_method  == 'AD':
                 self.deriv_method = AD_engine(self.net,self.derivatives,**kwargs)
             elif deriv_method  == 'FD':
                 self.deriv_method = FD_engine(self.net,self.derivatives,**kwargs)
+            elif deriv_method  == 'grid FD':
+                self.deriv_method = Grid_FD_engine(self.net,self.derivatives,**kwargs)
+            elif deriv_method  == 'RBF FD':
+                kwargs.pop('dxs')
+                self.deriv_method = RBF_FD_engine(self.net,self.derivatives,**kwargs)
         elif isinstance(deriv_method,engine):
             self.deriv_method = deriv_method
         else:
@@ -153,7 +179,7 @@ class DE_Getter():
 
 
 
-    def calculate(self,x : Union[torch.Tensor,dict,PINN_dict], **kwargs) -> dict:
+    def calculate(self,x : Union[torch.Tensor,dict,PINN_dict],micro_batch_size:int = None, **kwargs) -> dict:
         '''
         Extract the desired differentials from the neural network using ADE and functorch. The Engine 
 
@@ -162,6 +188,11 @@ class DE_Getter():
             - torch.tensor:  
             - dict | PINN_dict. If the data is stored with a dict like object such as PINN_dict (has dict methods keys(), values() and items()) then groups and group_sizes can be left blank
 
+        micro_batch_size: int | None. If given, every group (or the tensor) is split into micro batches of at most this size which are evaluated one
+            after another and joined. This lowers the peak memory of the engine's intermediate tensors (e.g. during evaluation with `torch.no_grad()`).
+            For training use `torch_DE.utils.training.streamed_backward()` which also frees each micro batch's graph.
+            Groups that cannot be split (see `splittable()`) are evaluated whole
+
         **kwargs: keyword arguments depending on the method to extract derivatives
 
         Autodiff (AD) and  Finite Difference (FD) Engine are built into Torch DE and have the following additional kwargs:
@@ -170,9 +201,44 @@ class DE_Getter():
 
         
         '''
-        return self.deriv_method.calculate(x,**kwargs)
+        if micro_batch_size is None:
+            return self.deriv_method.calculate(x,**kwargs)
+
+        dim = getattr(self.deriv_method,'batch_dim',0)
+        if isinstance(x,torch.Tensor):
+            parts = [self.deriv_method.calculate(x_m,**kwargs) for x_m in torch.split(x,micro_batch_size)]
+            return {name:{key:torch.cat([part[name][key] for part in parts],dim = dim) for key in parts[0][name].keys()} for name in parts[0].keys()}
+
+        splits = {name:group.split(micro_batch_size) if self.splittable(group) else [group] for name,group in x.items()}
+        output = {name:{} for name in x.keys()}
+        has_all = False
+        for m in range(max(len(parts) for parts in splits.values())):
+            out_m = self.deriv_method.calculate(PINN_dict({name:parts[m] for name,parts in splits.items() if m < len(parts)}),**kwargs)
+            for name,group_out in out_m.items():
+                if name not in output:
+                    #'all' holds the groups of this micro batch joined in order. It is rebuilt from the full groups below
+                    has_all = True
+                    continue
+                for key,value in group_out.items():
+                    output[name].setdefault(key,[]).append(value)
+        output = {name:{key:torch.cat(values,dim = dim) for key,values in group_out.items()} for name,group_out in output.items()}
+        if has_all:
+            groups = list(output.values())
+            output = {'all':{key:torch.cat([g[key] for g in groups],dim = dim) for key in groups[0].keys() if all(key in g for g in groups)},**output}
+        return output
        
 
+    def splittable(self,group) -> bool:
+        '''
+        Whether a group of a batch can be split into micro batches. Grid groups (their halo belongs to the whole block), groups marked `full_batch`
+        (e.g. integrals) and, with `RBF_FD_engine()`, groups without a `point_index` batchable kwarg must be evaluated whole
+        '''
+        if 'grid_points' in group.unbatchables or group.unbatchables.get('full_batch',False):
+            return False
+        if isinstance(self.deriv_method,RBF_FD_engine) and 'point_index' not in group.batchables_vars:
+            return False
+        return True
+
     def __call__(self, *args, **kwds) -> dict:
         '''
         Extract the desired differentials from the neural network using ADE and functorch
@@ -4,6 +4,8 @@ from torch_DE.continuous.Engines import engine
 from typing import Union,Dict,List,Callable,Iterable
 from torch_DE.utils.data import PINN_dict
 class AD_engine(engine):
+    #Dimension of the points in the output tensors
+    batch_dim = 0
     def __init__(self,net,derivatives,**kwargs):
         super().__init__()
         self.net = net
@@ -74,7 +76,9 @@ class AD_engine(engine):
 
         Goal of function is to unwrap this tuple and then reverse the order so the jth element corresponds to the jth derivative
         '''
-        out_tuple = vmap(self.autodiff_deriv_func)(x)
+        return self.unpack_derivatives(vmap(self.autodiff_deriv_func)(x))
+
+    def unpack_derivatives(self,out_tuple:tuple) -> List[torch.Tensor]:
         #We get a nested tuple
         #Form is (nth derivative,(n-1,(n-2)...,(f(x))))
         #Need to unwrap into a single tuple and reverse order
@@ -95,7 +99,8 @@ class AD_engine(engine):
         '''
         #Output is a dictionary with keys being the group name. We always have the 'all' group. value of output[key] is another dictionary where
         # the key is the derivative string (e.g. u_xx) and the value is the values for that derivative
-        output = {'all' if target_group is None else target_group : self.assign_derivs(derivs)}
+        all_output = self.assign_derivs(derivs)
+        output = {'all' if target_group is None else target_group : all_output}
         #From Group size determine start of batching
 
         if groups is None:
@@ -105,13 +110,22 @@ class AD_engine(engine):
         idx_start = 0
         for group,g1 in zip(groups,group_sizes):
             idx_end = idx_start + g1
-            group_deriv = [deriv[idx_start:idx_end] for deriv in derivs]
-            output[group] = self.assign_derivs(group_deriv)
+            output[group] = {deriv_var: deriv.narrow(self.batch_dim,idx_start,g1) for deriv_var,deriv in all_output.items()}
             idx_start = idx_end
         
         return output
         
 
+    def net_pass_from_dict(self,x_dict,exclude = None) -> Dict[str,Dict[str,torch.Tensor]]:
+        x,group_names,group_sizes = self.dict_to_tensor(x_dict,exclude=exclude)
+        u = self.net(x)
+        output = {}
+        start_idx = 0
+        for group_name,size in zip(group_names,group_sizes):
+            output[group_name] = {output_var: u.narrow(self.batch_dim,start_idx,size)[...,i] for output_var,i in self.output_vars.items()}
+            start_idx += size
+        return output
+
     def assign_derivs(self,derivs:Dict[str,torch.Tensor]) -> Dict[str,torch.Tensor] :
         '''
         Sort out the derivative output to place in dictionary form
@@ -126,6 +140,6 @@ class AD_engine(engine):
             #The jth element represents the jth order derivative
             j = len(idx) - 1
             #Slice(None) python trick. Represents the ':' when indexing like A[:,1,2]
-            index = (slice(None),) + idx
+            index = (slice(None),)*(self.batch_dim + 1) + idx
             output[deriv_var] = derivs[j][index] 
         return output
\ No newline at end of file
@@ -0,0 +1,24 @@
+import torch
+from torch.func import vmap
+from torch_DE.continuous.Engines.AD import AD_engine
+from typing import List
+
+
+class Ensemble_AD_engine(AD_engine):
+    '''
+    Autodiff engine for an `Ensemble()` network. The derivatives of all K members are calculated with one `vmap` over the stacked parameters
+    (and a `vmap` over the points inside each member). Every output and derivative has shape (K,B).
+    '''
+    batch_dim = 1
+    def __init__(self,net,derivatives,**kwargs):
+        super().__init__(net,derivatives,**kwargs)
+
+    def autodiff(self,x:torch.Tensor) -> List[torch.Tensor]:
+        params,buffers = self.net.stacked_state()
+
+        def member_autodiff(member_params,member_buffers,x):
+            deriv_func = self.compose_autodiff_deriv_func(lambda x_i: self.net.functional_forward(member_params,member_buffers,x_i))
+            return vmap(deriv_func)(x)
+
+        return self.unpack_derivatives(vmap(member_autodiff,in_dims = (0,0,None))(params,buffers,x))
+
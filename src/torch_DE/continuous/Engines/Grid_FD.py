@@ -0,0 +1,94 @@
+from typing import Dict,Callable,Iterable,Union,List
+from torch_DE.continuous.Engines.FD import FD_engine
+from torch_DE.utils.data import PINN_dict,PINN_group
+import torch
+from torch import Tensor
+class Grid_FD_engine(FD_engine):
+    def __init__(self,net:torch.nn.Module,derivatives:Dict,dxs:Iterable,sdf:Callable = None) -> None:
+        '''
+        Finite difference engine for groups on a regular grid (see `torch_DE.utils.grid.PINN_grid_group()`).
+
+        The network is evaluated once on the block plus its halo and all derivatives are computed by central differences between neighbouring grid
+        values, so a batch only needs one network pass instead of 1 + 2*D. Supports up to second order derivatives including mixed derivatives.
+
+        Groups without grid information fall back to the stencil method of `FD_engine()` with step sizes `dxs`.
+        '''
+        super().__init__(net,derivatives,dxs,sdf)
+
+    @staticmethod
+    def is_grid(group:PINN_group) -> bool:
+        return 'grid_points' in group.unbatchables
+
+    def calculate(self,x:Union[torch.Tensor,dict],target_groups:str = None,**kwargs) -> Dict[str,Dict[str,torch.Tensor]]:
+        '''
+        Calculate derivatives using finite differences over grid neighbours
+
+        Input:
+            x: Union[torch.Tensor,PINN_dict]: either tensor or a dictionary of groups represent input to the network
+            target group: str (default None) The group that will be differentiated. if None all groups are differentiated
+
+        Returns
+            Output_dict: Dict
+        '''
+        if isinstance(x,torch.Tensor):
+            return super().calculate(x,target_groups)
+
+        if target_groups is None:
+            target_groups = list(x.keys())
+        elif isinstance(target_groups,str):
+            target_groups = [target_groups]
+
+        grid_groups = [name for name in target_groups if self.is_grid(x[name])]
+        stencil_groups = [name for name in target_groups if name not in grid_groups]
+        plain_groups = [name for name in x.keys() if name not in target_groups]
+
+        #Single network pass for every grid block (with halo) and every group that is not differentiated
+        inputs = [x[name].unbatchables['grid_points'] for name in grid_groups] + [x[name].inputs['input'] for name in plain_groups]
+        output = {}
+        if inputs:
+            u = self.net(torch.cat(inputs))
+            sizes = [len(t) for t in inputs]
+            for name,u_group in zip(grid_groups + plain_groups,torch.split(u,sizes,dim = 0)):
+                if name in grid_groups:
+                    group = x[name]
+                    output[name] = self.grid_derivs(u_group,group.unbatchables['grid_shape'],group.unbatchables['grid_spacing'],group.unbatchables['grid_halo'])
+                else:
+                    output[name] = {output_var: u_group[:,i] for output_var,i in self.output_vars.items()}
+
+        if stencil_groups:
+            x_fd,groups,group_sizes = self.dict_to_tensor(PINN_dict({name:x[name] for name in stencil_groups}))
+            output.update(self.group_output(self.finite_diff(x_fd),groups,group_sizes))
+        return output
+
+    def grid_derivs(self,u:Tensor,grid_shape:tuple,spacing:tuple,halo:int) -> Dict[str,Tensor]:
+        '''
+        u is the network output on the block with halo of shape (prod(grid_shape),N_outputs). Returns the outputs and derivatives on the block
+        (without halo) flattened in row-major order, the same order as the group inputs.
+        '''
+        U = u.reshape(*grid_shape,u.shape[-1])
+
+        def shifted(shift:dict) -> Tensor:
+            #Block interior shifted by shift[axis] points along each axis
+            return U[tuple(slice(halo + shift.get(d,0),n - halo + shift.get(d,0)) for d,n in enumerate(grid_shape))].reshape(-1,u.shape[-1])
+
+        centre = shifted({})
+        d_dict = {}
+        for deriv_val,idx in self.derivatives.items():
+            i = idx[0]
+            if deriv_val in self.output_vars:
+                d_dict[deriv_val] = centre[:,i]
+                continue
+
+            order = len(idx) - 1
+            if order == 1:
+                j = idx[1]
+                d_dict[deriv_val] = (shifted({j:1})[:,i] - shifted({j:-1})[:,i])/(2*spacing[j])
+            elif order == 2 and idx[1] == idx[2]:
+                j = idx[1]
+                d_dict[deriv_val] = (shifted({j:-1})[:,i] - 2*centre[:,i] + shifted({j:1})[:,i])/(spacing[j]**2)
+            elif order == 2:
+                j,k = idx[1],idx[2]
+                d_dict[deriv_val] = (shifted({j:1,k:1})[:,i] - shifted({j:1,k:-1})[:,i] - shifted({j:-1,k:1})[:,i] + shifted({j:-1,k:-1})[:,i])/(4*spacing[j]*spacing[k])
+            else:
+                raise ValueError(f'Only upto second order derivatives are currently supported')
+        return d_dict
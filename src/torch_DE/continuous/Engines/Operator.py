@@ -0,0 +1,83 @@
+import torch
+from torch_DE.continuous.Engines.AD import AD_engine
+from torch_DE.continuous.Engines.FD import FD_engine
+from typing import Dict,Callable,Iterable,List
+
+
+class Operator_engine(AD_engine):
+    '''
+    Derivative engine for operator networks such as `DeepONet()`. The branch embedding b (F,O,p) is cached by the network so the derivatives are
+    only taken through the trunk t (B,O,p) and then contracted:
+
+        d^k u_o/dx^k (f,x) = sum_p b_op(f)*d^k t_op/dx^k (x)
+
+    The cost of the derivatives does not depend on the number of functions F. Every output and derivative has shape (F,B).
+
+    inputs:
+        - net: `Operator_Module()` e.g. `DeepONet()`
+        - derivatives: dict of derivatives from `DE_Getter()`
+        - method: str 'AD' (autodiff of the trunk) or 'FD' (central finite differences of the trunk, up to second order non mixed derivatives)
+        - dxs: step sizes for each input for 'FD'
+        - sdf: function giving the distance to the boundary to limit the FD step size (see `FD_engine()`)
+    '''
+    batch_dim = 1
+    def __init__(self,net,derivatives,method:str = 'AD',dxs:Iterable = None,sdf:Callable = None,**kwargs):
+        super().__init__(net,derivatives,**kwargs)
+        if method not in ('AD','FD'):
+            raise ValueError(f'method must be either \'AD\' or \'FD\'. Got {method} instead')
+        self.method = method
+        self.autodiff_deriv_func = self.compose_autodiff_deriv_func(net.trunk)
+
+        if method == 'FD':
+            assert dxs is not None, 'dxs must be given for the FD method'
+            if self.highest_order > 2:
+                raise ValueError(f'Only upto second order non mixed derivatives are currently supported')
+            self.dxs = torch.tensor(dxs)
+            self.sdf = (lambda x: float('inf')*torch.ones(x.shape[0],device = x.device)) if sdf is None else sdf
+
+    def autodiff(self,x:torch.Tensor) -> Dict[str,torch.Tensor]:
+        '''
+        Derivatives of the trunk embedding. Returns a dict of Tensors of shape (B,p), one for each derivative
+        '''
+        if self.method == 'FD':
+            return self.trunk_finite_diff(x)
+
+        derivs = super().autodiff(x)
+        trunk_derivs = {}
+        for deriv_var,idx in self.derivatives.items():
+            #derivs[j] has shape (B,O,p,D,...,D)
+            trunk_derivs[deriv_var] = derivs[len(idx) - 1][(slice(None),idx[0],slice(None)) + idx[1:]]
+        return trunk_derivs
+
+    def trunk_finite_diff(self,x:torch.Tensor) -> Dict[str,torch.Tensor]:
+        B = x.shape[0]
+        stencil,dxs = FD_engine.generate_stencil(x,self.dxs,self.sdf)
+        t = self.net.trunk(x)
+        t_adj = torch.split(self.net.trunk(torch.cat([torch.cat(s,dim = 0) for s in stencil])),B,dim = 0)
+
+        trunk_derivs = {}
+        for deriv_var,idx in self.derivatives.items():
+            o = idx[0]
+            if len(idx) == 1:
+                trunk_derivs[deriv_var] = t[:,o]
+                continue
+            j = idx[1]
+            assert all(k == j for k in idx[1:]), 'Mixed derivatives are not supported by the FD method'
+            t1,t2,t3 = t_adj[2*j][:,o],t[:,o],t_adj[2*j+1][:,o]
+            h = dxs[j].unsqueeze(-1)
+            if len(idx) == 2:
+                trunk_derivs[deriv_var] = FD_engine.first_derivative(t1,t2,t3,h)
+            else:
+                trunk_derivs[deriv_var] = FD_engine.second_derivative(t1,t2,t3,h)
+        return trunk_derivs
+
+    def assign_derivs(self,trunk_derivs:Dict[str,torch.Tensor]) -> Dict[str,torch.Tensor]:
+        b = self.net.branch_embedding
+        assert b is not None, 'No branch embedding is cached. Call net.set_branch(u) first'
+        output = {}
+        for deriv_var,idx in self.derivatives.items():
+            output[deriv_var] = b[:,idx[0]] @ trunk_derivs[deriv_var].T
+            #Only the network evaluation has the bias
+            if len(idx) == 1 and getattr(self.net,'bias',None) is not None:
+                output[deriv_var] = output[deriv_var] + self.net.bias[idx[0]]
+        return output
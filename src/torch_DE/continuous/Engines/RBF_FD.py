@@ -0,0 +1,229 @@
+from typing import Dict,Union,List,Tuple
+from itertools import combinations_with_replacement
+from torch_DE.continuous.Engines import engine
+from torch_DE.utils.data import PINN_dict,PINN_group
+from scipy.spatial import cKDTree
+import torch
+from torch import Tensor
+
+
+def monomial_exponents(dims:int,degree:int) -> Tensor:
+    '''
+    Exponents of all monomials in `dims` variables with total degree <= degree. Returns a Tensor of shape (M,dims)
+    '''
+    exponents = []
+    for d in range(degree+1):
+        for combo in combinations_with_replacement(range(dims),d):
+            e = [0]*dims
+            for i in combo:
+                e[i] += 1
+            exponents.append(e)
+    return torch.tensor(exponents)
+
+
+class RBF_FD_engine(engine):
+    def __init__(self,net:torch.nn.Module,derivatives:Dict,k:int = None,phi_degree:int = 3,poly_degree:int = 2,chunk_size:int = 8192,**kwargs) -> None:
+        '''
+        Meshless derivative engine using radial basis function generated finite differences (RBF-FD).
+
+        For a static set of scattered points (e.g. from `generate_points_from_triangles()`), the k nearest neighbours of every point and the RBF-FD
+        weights of every derivative are computed once with `build()`. The weights use a polyharmonic spline `r^phi_degree` augmented with polynomials
+        up to `poly_degree` and are stored as sparse matrices. Derivatives are then a sparse matmul over the network outputs of the neighbours so
+        each batch needs a single forward pass and no autodiff with respect to the inputs.
+
+        inputs:
+            - net: network
+            - derivatives: dict of derivatives from `DE_Getter()`
+            - k: int stencil size. Default is `2*M+1` where M is the number of polynomial terms
+            - phi_degree: int odd power of the polyharmonic spline. Default 3
+            - poly_degree: int degree of the polynomial augmentation. Must be >= highest derivative order. Default 2
+            - chunk_size: int number of stencils solved at once when building
+
+        Batches are matched to the built point set via a batchable kwarg `point_index` holding the index of each point (see `point_index()`).
+        Groups without it must be full batch and unshuffled.
+        '''
+        super().__init__()
+        self.net = net
+        self.derivatives = derivatives
+        self.output_vars = self.get_output_vars(derivatives)
+        self.highest_order = self.find_highest_order(derivatives)
+        assert self.highest_order <= 2, 'RBF_FD_engine supports upto second order derivatives'
+        assert poly_degree >= self.highest_order, 'poly_degree must be atleast the highest derivative order'
+        assert phi_degree % 2 == 1, 'phi_degree must be odd'
+        self.k = k
+        self.phi_degree = phi_degree
+        self.poly_degree = poly_degree
+        self.chunk_size = chunk_size
+
+        self.points:Dict[str,Tensor] = {}
+        self.neighbours:Dict[str,Tensor] = {}
+        self.weights:Dict[str,Dict[str,Tensor]] = {}
+        self.operators:Dict[str,Dict[str,Tensor]] = {}
+
+    @staticmethod
+    def point_index(N:int) -> Dict[str,Tensor]:
+        '''
+        Batchable kwargs to pass to `PINN_dataset.add_group()` so batches can be matched with the stencils e.g.
+        `dataset.add_group('col',points,RBF_FD_engine.point_index(len(points)),batch_size = 2000,shuffle = True)`
+        '''
+        return {'point_index':torch.arange(N)}
+
+    def build(self,name:str,points:Tensor) -> None:
+        '''
+        Build the neighbour index and RBF-FD weights for the group `name` with the full set of points of shape (N,D). Only needs to be called once for a
+        static point set
+        '''
+        device = points.device
+        X = points.detach().cpu().to(torch.float64)
+        N,D = X.shape
+        exponents = monomial_exponents(D,self.poly_degree)
+        M = len(exponents)
+        k = 2*M + 1 if self.k is None else self.k
+        assert k > M, f'stencil size {k} must be greater than the number of polynomial terms {M}'
+        assert k <= N, f'stencil size {k} is larger than the number of points {N}'
+
+        _,nbrs = cKDTree(X.numpy()).query(X.numpy(),k = k)
+        nbrs = torch.as_tensor(nbrs,dtype = torch.int64)
+
+        ops = {deriv:tuple(sorted(idx[1:])) for deriv,idx in self.derivatives.items() if len(idx) > 1}
+        unique_ops = sorted(set(ops.values()))
+        weights = {op:torch.empty(N,k,dtype = torch.float64) for op in unique_ops}
+
+        for start in range(0,N,self.chunk_size):
+            end = min(start + self.chunk_size,N)
+            w = self.stencil_weights(X[nbrs[start:end]] - X[start:end].unsqueeze(1),exponents,unique_ops)
+            for op in unique_ops:
+                weights[op][start:end] = w[op]
+
+        rows = torch.arange(N).repeat_interleave(k)
+        self.points[name] = points.detach().to(device)
+        self.neighbours[name] = nbrs.to(device)
+        self.weights[name] = {}
+        self.operators[name] = {}
+        for deriv,op in ops.items():
+            w = weights[op].to(device = device,dtype = points.dtype)
+            self.weights[name][deriv] = w
+            self.operators[name][deriv] = torch.sparse_coo_tensor(torch.stack([rows.to(device),nbrs.flatten().to(device)]),w.flatten(),(N,N)).coalesce()
+
+    def build_from_dataset(self,dataset,*group_names:str) -> None:
+        '''
+        Build stencils for the given groups of a `PINN_dataset()`
+        '''
+        for name in group_names:
+            self.build(name,dataset.groups[name].batchables['input'])
+
+    def stencil_weights(self,Y:Tensor,exponents:Tensor,ops:List[tuple]) -> Dict[tuple,Tensor]:
+        '''
+        Solve the augmented RBF system of each stencil. Y has shape (B,k,D) and holds the neighbours relative to the stencil centre
+        '''
+        B,k,D = Y.shape
+        M = len(exponents)
+        m = self.phi_degree
+        #Scale each stencil to unit size for conditioning
+        h = Y.norm(dim = -1).amax(dim = -1).clamp_min(1e-300)
+        Y = Y/h[:,None,None]
+
+        r = torch.cdist(Y,Y)
+        P = torch.prod(Y.unsqueeze(-2).pow(exponents.to(Y)),dim = -1)
+        A = torch.zeros(B,k+M,k+M,dtype = Y.dtype)
+        A[:,:k,:k] = r.pow(m)
+        A[:,:k,k:] = P
+        A[:,k:,:k] = P.transpose(1,2)
+
+        r0 = Y.norm(dim = -1)
+        safe_r = torch.where(r0 > 0,r0,torch.ones_like(r0))
+        rhs = torch.zeros(B,k+M,len(ops),dtype = Y.dtype)
+        for c,op in enumerate(ops):
+            #Operator applied to phi(|y - y_j|) at the centre y = 0
+            if len(op) == 1:
+                a = op[0]
+                L_phi = -m*safe_r.pow(m-2)*Y[...,a]
+            elif op[0] == op[1]:
+                a = op[0]
+                L_phi = m*(m-2)*safe_r.pow(m-4)*Y[...,a]**2 + m*safe_r.pow(m-2)
+            else:
+                a,b = op
+                L_phi = m*(m-2)*safe_r.pow(m-4)*Y[...,a]*Y[...,b]
+            rhs[:,:k,c] = torch.where(r0 > 0,L_phi,torch.zeros_like(L_phi))
+
+            #Operator applied to the monomials at the centre. Only the monomial matching the operator is non zero
+            target = torch.zeros(D,dtype = exponents.dtype)
+            for a in op:
+                target[a] += 1
+            match = (exponents == target).all(dim = -1)
+            rhs[:,k:,c] = match.to(Y.dtype)*(2. if len(op) == 2 and op[0] == op[1] else 1.)
+
+        w = torch.linalg.solve(A,rhs)[:,:k]
+        return {op:w[...,c]/h[:,None].pow(len(op)) for c,op in enumerate(ops)}
+
+    def batch_index(self,group:PINN_group) -> Union[Tensor,None]:
+        if 'point_index' in group.batchables_vars:
+            return group.batchables['point_index'].to(torch.int64)
+        assert len(group) == len(self.points[group.name]), f'group {group.name} has no point_index batchable kwarg so it must be full batch'
+        return None
+
+    def calculate(self,x:Union[Tensor,PINN_dict],target_groups:Union[str,List,None] = None,**kwargs) -> Dict[str,Dict[str,Tensor]]:
+        '''
+        Calculate derivatives using the prebuilt RBF-FD stencils
+
+        Input:
+            x: PINN_dict of groups
+            target group: str | list (default None) The groups to differentiate. If None all groups that have been built are differentiated
+
+        Returns
+            Output_dict: Dict
+        '''
+        if isinstance(x,Tensor):
+            raise TypeError('RBF_FD_engine needs group names to find the stencils. Pass a PINN_dict instead of a tensor')
+
+        if target_groups is None:
+            target_groups = [name for name in x.keys() if name in self.weights]
+        elif isinstance(target_groups,str):
+            target_groups = [target_groups]
+        for name in target_groups:
+            if name not in self.weights:
+                raise KeyError(f'No RBF-FD stencils for group {name}. Call build() first')
+        plain_groups = [name for name in x.keys() if name not in target_groups]
+
+        #Work out which points each group needs so the network is called once
+        inputs,plan = [],[]
+        for name in target_groups:
+            pid = self.batch_index(x[name])
+            if pid is None:
+                inputs.append(self.points[name])
+                plan.append((name,'full',None))
+            else:
+                pid = pid.to(self.neighbours[name].device)
+                cols,inverse = torch.unique(self.neighbours[name][pid],return_inverse = True)
+                inputs.append(self.points[name][cols])
+                plan.append((name,'batch',(pid,cols,inverse)))
+        for name in plain_groups:
+            inputs.append(x[name].inputs['input'])
+            plan.append((name,'plain',None))
+
+        u_all = torch.split(self.net(torch.cat(inputs)),[len(t) for t in inputs],dim = 0)
+        output = {}
+        for (name,mode,info),u in zip(plan,u_all):
+            if mode == 'plain':
+                output[name] = {output_var: u[:,i] for output_var,i in self.output_vars.items()}
+            elif mode == 'full':
+                output[name] = self.full_derivs(name,u)
+            else:
+                output[name] = self.batch_derivs(name,u,*info)
+        return output
+
+    def full_derivs(self,name:str,u:Tensor) -> Dict[str,Tensor]:
+        out = {}
+        for deriv,idx in self.derivatives.items():
+            i = idx[0]
+            out[deriv] = u[:,i] if len(idx) == 1 else torch.sparse.mm(self.operators[name][deriv],u[:,i:i+1]).squeeze(-1)
+        return out
+
+    def batch_derivs(self,name:str,u:Tensor,pid:Tensor,cols:Tensor,inverse:Tensor) -> Dict[str,Tensor]:
+        u_nbrs = u[inverse]
+        centre = u[torch.searchsorted(cols,pid)]
+        out = {}
+        for deriv,idx in self.derivatives.items():
+            i = idx[0]
+            out[deriv] = centre[:,i] if len(idx) == 1 else (self.weights[name][deriv][pid]*u_nbrs[...,i]).sum(-1)
+        return out
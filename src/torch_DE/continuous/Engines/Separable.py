@@ -0,0 +1,96 @@
+import torch
+from torch.func import jvp
+from torch_DE.continuous.Engines import engine
+from torch_DE.utils.data import PINN_dict
+from typing import Union,Dict,List,Tuple
+
+
+class Separable_engine(engine):
+    '''
+    Derivative engine for `Separable_Net()`. Each derivative of u = sum_r prod_d f_d(x_d) is a sum of products of derivatives of the 1D axis networks:
+
+        u_xxt = sum_r f_x''(x)*f_y(y)*f_t'(t)
+
+    The derivatives of each axis network are taken with forward mode AD (`torch.func.jvp`) up to the highest order needed along that axis.
+
+    Grid groups (batches of `PINN_grid_group()` which carry their `block_axes`) only evaluate the axis networks on the N_1 + ... + N_D axis points
+    and assemble every output with an outer product. All other groups are treated as scattered points and combined element wise.
+    The output has the same format as the other engines.
+    '''
+    def __init__(self,net,derivatives,**kwargs):
+        super().__init__()
+        self.net = net
+        self.derivatives = derivatives
+        self.output_vars = self.get_output_vars(derivatives)
+        self.highest_order = self.find_highest_order(derivatives)
+        self.dims = net.in_features
+        #Number of times each derivative is taken along every axis e.g. u_xxt -> (2,0,1) for inputs (x,y,t)
+        self.axis_counts = {deriv_var:tuple(idx[1:].count(d) for d in range(self.dims)) for deriv_var,idx in derivatives.items()}
+        self.axis_orders = [max(counts[d] for counts in self.axis_counts.values()) for d in range(self.dims)]
+
+    def axis_derivatives(self,d:int,x_d:torch.Tensor) -> Tuple[torch.Tensor]:
+        '''
+        Features of axis d and their derivatives up to `axis_orders[d]`. x_d has shape (N,1). Returns a tuple of Tensors of shape (N,O,R)
+        '''
+        func = lambda x: (self.net.axis_features(d,x),)
+        for _ in range(self.axis_orders[d]):
+            #jvp of (f,...,f^(k)) gives (f',...,f^(k+1)) as the tangents. The networks act on each point separately so a tangent of ones gives
+            #the derivative at every point
+            func = (lambda inner: lambda x: (lambda primals,tangents: primals + (tangents[-1],))(*jvp(inner,(x,),(torch.ones_like(x),))))(func)
+        return func(x_d)
+
+    def features(self,axis_points:List[torch.Tensor]) -> List[Tuple[torch.Tensor]]:
+        return [self.axis_derivatives(d,x_d.reshape(-1,1)) for d,x_d in enumerate(axis_points)]
+
+    def grid_output(self,axes:List[torch.Tensor]) -> Dict[str,torch.Tensor]:
+        #block_axes is a list so it is not moved with the batch
+        param = next(self.net.parameters())
+        feats = self.features([axis.to(device = param.device,dtype = param.dtype) for axis in axes])
+        output = {}
+        for deriv_var,idx in self.derivatives.items():
+            counts = self.axis_counts[deriv_var]
+            output[deriv_var] = self.net.outer([feats[d][counts[d]][:,idx[0]:idx[0]+1] for d in range(self.dims)])[:,0]
+        return output
+
+    def scattered_output(self,x:torch.Tensor) -> Dict[str,torch.Tensor]:
+        feats = self.features([x[:,d] for d in range(self.dims)])
+        output = {}
+        for deriv_var,idx in self.derivatives.items():
+            counts = self.axis_counts[deriv_var]
+            u = feats[0][counts[0]][:,idx[0]]
+            for d in range(1,self.dims):
+                u = u*feats[d][counts[d]][:,idx[0]]
+            output[deriv_var] = u.sum(-1)
+        return output
+
+    def calculate(self,x:Union[torch.Tensor,PINN_dict],**kwargs) -> Dict[str,Dict[str,torch.Tensor]]:
+        '''
+        Calculate derivatives with forward mode AD of the axis networks
+
+        Input:
+            x: Union[torch.Tensor,PINN_dict]: either a tensor of scattered points or a PINN_dict of groups
+
+        Returns
+            Output_dict: Dict
+        '''
+        if isinstance(x,torch.Tensor):
+            return {'all':self.scattered_output(x)}
+
+        output = {}
+        scattered = PINN_dict()
+        for name,group in x.items():
+            axes = group.unbatchables.get('block_axes') if hasattr(group,'unbatchables') else None
+            if axes is not None:
+                output[name] = self.grid_output(axes)
+            else:
+                scattered[name] = group
+
+        if len(scattered) > 0:
+            #All scattered groups go through the networks together
+            x_s,groups,group_sizes = self.dict_to_tensor(scattered)
+            all_output = self.scattered_output(x_s)
+            start = 0
+            for name,size in zip(groups,group_sizes):
+                output[name] = {deriv_var:deriv[start:start+size] for deriv_var,deriv in all_output.items()}
+                start += size
+        return output
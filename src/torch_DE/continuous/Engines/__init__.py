@@ -1,4 +1,9 @@
-__all__ = ['AD_engine','engine','FD_engine']
+__all__ = ['AD_engine','engine','FD_engine','Grid_FD_engine','RBF_FD_engine','Ensemble_AD_engine','Operator_engine','Separable_engine']
 from .base import engine
 from .AD import AD_engine
-from .FD import FD_engine
\ No newline at end of file
+from .FD import FD_engine
+from .Grid_FD import Grid_FD_engine
+from .RBF_FD import RBF_FD_engine
+from .Ensemble_AD import Ensemble_AD_engine
+from .Operator import Operator_engine
+from .Separable import Separable_engine
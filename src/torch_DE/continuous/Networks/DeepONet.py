@@ -1,26 +1,86 @@
+import torch
 import torch.nn as nn
-class Operator_Module(nn.Module):
+from abc import ABC,abstractmethod
+
+
+class Operator_Module(nn.Module,ABC):
+    '''
+    Base class of operator networks G(u)(x). The embedding of the input functions u is calculated once with `set_branch()` and cached,
+    so every query point x only needs the trunk network. Subclasses must implement `set_branch()` and `query()`
+    '''
     def __init__(self):
-        super().__init__(self)
-        pass
+        super().__init__()
+        self.branch_embedding = None
 
+    @abstractmethod
+    def set_branch(self,u):
+        '''
+        Evaluate the branch for the input functions u and cache it in `branch_embedding`
+        '''
 
-class DeepONet(Operator_Module):
-    def __init__(self,branch_net : nn.Module, trunk_net:nn.Module):
-        super().__init__(self)
+    def clear_branch(self):
+        self.branch_embedding = None
 
-        self.branch_net = branch_net
-        self.trunk_net = trunk_net
+    @abstractmethod
+    def query(self,x):
+        '''
+        Evaluate the operator at the points x with the cached branch embedding
+        '''
 
+    def forward(self,x,u = None):
+        '''
+        Evaluate the operator at the points x. If u is given the branch embedding is updated first otherwise the cached embedding is used
+        '''
+        if u is not None:
+            self.set_branch(u)
+        assert self.branch_embedding is not None, 'No branch embedding is cached. Call set_branch(u) first'
+        return self.query(x)
 
-    def set_branch(self,x):
-        self.b = self.branch_net(x)
 
-    def query(self,x):
-        self.b*self
+class DeepONet(Operator_Module):
+    def __init__(self,branch_net : nn.Module, trunk_net:nn.Module,num_outputs:int = 1,bias:bool = True):
+        '''
+        Deep Operator Network G(u)(x)_o = sum_p b_op(u)*t_op(x) + bias_o (Lu et al. 2021).
+
+        inputs:
+            - branch_net: nn.Module taking the input functions (e.g. sensor values) of shape (F,M) and returning (F,num_outputs*p)
+            - trunk_net: nn.Module taking the query points of shape (B,D) and returning (B,num_outputs*p)
+            - num_outputs: int number of output variables
+            - bias: bool add a trainable bias to each output
 
+        Call `set_branch(u)` once per optimizer step (the embedding is part of the graph so it must be recomputed after the parameters change).
+        A plain `backward()` frees the branch graph, so a step with several backward passes must use `retain_graph = True` for all but the last
+        (`streamed_backward()` does this automatically).
+        `forward(x)` then returns (F,B,num_outputs) for all F functions at all B points with a single einsum.
 
-    def forward(self,x):
-        pass
+        With `DE_Getter()` the derivatives are only taken through the trunk (see `Operator_engine()`) and have shape (F,B):
 
+            net = DeepONet(MLP(100,2*64,128,3),MLP(2,2*64,128,3),num_outputs = 2)
+            PINN = DE_Getter(net,['x','t'],['u','v'],['u_x','u_tt'])
+            net.set_branch(sensors)
+            out = PINN(batch)
+        '''
+        super().__init__()
+        self.branch_net = branch_net
+        self.trunk_net = trunk_net
+        self.num_outputs = num_outputs
+        self.bias = nn.Parameter(torch.zeros(num_outputs)) if bias else None
 
+    def set_branch(self,u):
+        '''
+        Evaluate the branch network for the input functions u of shape (F,M) and cache the embedding of shape (F,num_outputs,p)
+        '''
+        b = self.branch_net(u)
+        self.branch_embedding = b.reshape(b.shape[0],self.num_outputs,-1)
+        return self.branch_embedding
+
+    def trunk(self,x):
+        '''
+        Trunk embedding of shape (...,num_outputs,p). x can be a single point of shape (D) (e.g. under vmap)
+        '''
+        t = self.trunk_net(x)
+        return t.reshape(*t.shape[:-1],self.num_outputs,-1)
+
+    def query(self,x):
+        out = torch.einsum('fop,...op->f...o',self.branch_embedding,self.trunk(x))
+        return out + self.bias if self.bias is not None else out
@@ -1,5 +1,8 @@
 import torch
 import torch.nn as nn
+import copy
+from itertools import product
+from torch.func import stack_module_state,functional_call,vmap
 
 def get_activation_function(activation):
     if isinstance(activation,str):
@@ -76,29 +79,49 @@ class Fourier_Embedding(nn.Module):
 
 
 class Periodic_embedding(nn.Module):
-    def __init__(self,args) -> None:
-        super().__init__() 
-
-
-        self.params = nn.ModuleList()
-        self.funcs = []
-
-        for param,state in args:
-            if param is None:
-                p = nn.Identity()
-                self.funcs.append(p)
-                self.params.append(p)
-            elif state == 'train':
-                p = nn.Parameter(torch.tensor([param]))
-                self.params.append(param)
-                self.funcs.append(lambda x :torch.stack([torch.sin(2*torch.pi/p * x),torch.cos(2*torch.pi/p * x)]))
-            elif state == 'fixed':
-                self.funcs.append(lambda x :torch.stack([torch.sin(2*torch.pi/param * x),torch.cos(2*torch.pi/param * x)])) 
-        
-        
+    def __init__(self,periods:list,harmonics:int = 1) -> None:
+        '''
+        Periodic features sin(2*pi*k*x/P),cos(2*pi*k*x/P) (k = 1..harmonics) for the periodic input columns. Non periodic columns are passed through.
+        The output is exactly periodic so periodic boundary conditions do not need boundary groups or `Loss_handler.add_periodic()`.
+        Use it in front of another network with `out_features` as its number of inputs:
+
+            embedding = Periodic_embedding([2.,None])           # x is periodic with period 2, t is not
+            net = nn.Sequential(embedding,Fourier_Net(embedding.out_features,1,100,4))
+
+        inputs:
+            - periods: list with an entry for each input column. Either None (not periodic), a float period (fixed) or a tuple (period,'fixed'|'train')
+            - harmonics: int number of frequencies per periodic column
+        '''
+        super().__init__()
+        periodic,passthrough,values,trainable = [],[],[],[]
+        for i,entry in enumerate(periods):
+            if entry is None:
+                passthrough.append(i)
+                continue
+            period,state = entry if isinstance(entry,(tuple,list)) else (entry,'fixed')
+            if state not in ('fixed','train'):
+                raise ValueError(f'period state must be either \'fixed\' or \'train\'. Got {state} instead')
+            periodic.append(i)
+            values.append(float(period))
+            trainable.append(state == 'train')
+
+        assert len(periodic) > 0, 'At least one input column must be periodic'
+        self.in_features = len(periods)
+        self.harmonics = harmonics
+        self.out_features = len(passthrough) + 2*harmonics*len(periodic)
+        self.register_buffer('periodic_idx',torch.tensor(periodic,dtype = torch.long))
+        self.register_buffer('passthrough_idx',torch.tensor(passthrough,dtype = torch.long))
+        self.register_buffer('trainable',torch.tensor(trainable,dtype = torch.bool))
+        self.register_buffer('k',torch.arange(1,harmonics + 1,dtype = torch.float32))
+        #A single parameter for all periods. Fixed periods are detached in forward
+        self.periods = nn.Parameter(torch.tensor(values,dtype = torch.float32),requires_grad = any(trainable))
+
     def forward(self,x):
-        return torch.cat([encode(x) for encode in self.funcs])
-        
+        periods = torch.where(self.trainable,self.periods,self.periods.detach())
+        #(...,P,1)*(H) -> (...,P*H)
+        angle = (2*torch.pi*x[...,self.periodic_idx]/periods).unsqueeze(-1)*self.k
+        angle = angle.flatten(-2)
+        return torch.cat([x[...,self.passthrough_idx],torch.sin(angle),torch.cos(angle)],dim = -1)
 
 
 class Fourier_Net(DE_Module):
@@ -261,6 +284,294 @@ class Siren_Net(DE_Module):
 
 
 
+class Hard_BC_Net(DE_Module):
+    def __init__(self,net:nn.Module,distance:nn.Module,boundary_value = None,outputs = None) -> None:
+        '''
+        Exactly imposes Dirichlet boundary conditions with the ansatz u = g(x) + phi(x)*N(x) where phi is a smooth distance function that is
+        zero on the boundary. The boundary groups (e.g. 'no slip' and 'inlet') can then be dropped from the dataset and the `Loss_handler()`.
+        Works with both the AD and FD engines.
+
+        inputs:
+            - net: nn.Module the network N(x)
+            - distance: nn.Module | function phi(x) returning shape (N). See `torch_DE.geometry.distance` e.g. `Segment_distance()` or `Cubic_grid_SDF()`
+            - boundary_value: function g(x) returning shape (N,out_features), float or list of floats (one per output). Default 0
+            - outputs: list of output indices that are constrained. The other outputs are returned unchanged. Default all outputs
+        '''
+        super().__init__()
+        self.net = net
+        self.distance = distance
+        self.boundary_value = boundary_value if boundary_value is None or callable(boundary_value) else torch.as_tensor(boundary_value,dtype = torch.float32)
+        self.outputs = outputs
+
+    def forward(self,x):
+        #The AD engine uses vmap so x can be a single point of shape (D)
+        single = x.dim() == 1
+        if single:
+            x = x.unsqueeze(0)
+
+        N = self.net(x)
+        phi = self.distance(x).unsqueeze(-1)
+        if self.boundary_value is None:
+            g = 0.
+        elif callable(self.boundary_value):
+            g = self.boundary_value(x)
+        else:
+            g = self.boundary_value.to(device = x.device,dtype = x.dtype)
+        u = g + phi*N
+
+        if self.outputs is not None:
+            mask = torch.zeros(N.shape[-1],dtype = torch.bool,device = x.device)
+            mask[self.outputs] = True
+            u = torch.where(mask,u,N)
+        return u.squeeze(0) if single else u
+
+
+
+class Ensemble(DE_Module):
+    def __init__(self,models:list) -> None:
+        '''
+        K independent networks of the same architecture (e.g. different seeds or `MLP`/`Fourier_Net`/`Wang_Net` ablations with the same sizes) evaluated
+        with a single `vmap` over the stacked parameters. The output has shape (K,N,out_features).
+
+        The stacked parameters are the parameters of this module, so a single optimizer such as `torch.optim.Adam(ensemble.parameters())` updates
+        all members in one vectorised step. Element-wise optimizers (SGD, Adam, ...) are equivalent to training each member on its own. Optimizers or
+        gradient clipping that use norms over all parameters (LBFGS, clip_grad_norm_) couple the members.
+
+        `DE_Getter()` uses `Ensemble_AD_engine()` for ensembles so every output and derivative has shape (K,B). Use `Loss.member_losses()` for the
+        loss of each member.
+
+        inputs:
+            - models: list of nn.Module with identical parameter names and shapes
+        '''
+        super().__init__()
+        assert len(models) > 0, 'An ensemble needs at least one model'
+        params,buffers = stack_module_state(models)
+        self.num_models = len(models)
+        self.param_names = list(params.keys())
+        self.buffer_names = list(buffers.keys())
+        self.stacked_params = nn.ParameterList([nn.Parameter(params[name].detach().clone()) for name in self.param_names])
+        for i,name in enumerate(self.buffer_names):
+            self.register_buffer(f'stacked_buffer_{i}',buffers[name])
+        #Stateless copy of the architecture. Kept out of the submodules so it is not part of parameters() or state_dict()
+        self.__dict__['base'] = copy.deepcopy(models[0]).to('meta')
+
+    @staticmethod
+    def from_factory(factory,num_models:int,seed:int = None) -> 'Ensemble':
+        '''
+        Build an ensemble from a function `factory()` that returns a new network. If seed is given member k is initialised with seed + k
+        '''
+        models = []
+        for k in range(num_models):
+            if seed is not None:
+                torch.manual_seed(seed + k)
+            models.append(factory())
+        return Ensemble(models)
+
+    def stacked_state(self):
+        '''
+        Dictionaries of the stacked parameters and buffers (leading dimension K) for `functional_forward()`
+        '''
+        params = dict(zip(self.param_names,self.stacked_params))
+        buffers = {name:getattr(self,f'stacked_buffer_{i}') for i,name in enumerate(self.buffer_names)}
+        return params,buffers
+
+    def functional_forward(self,params:dict,buffers:dict,x):
+        '''
+        Forward pass of a single member with parameters params and buffers buffers
+        '''
+        return functional_call(self.base,(params,buffers),(x,))
+
+    def forward(self,x):
+        params,buffers = self.stacked_state()
+        return vmap(self.functional_forward,in_dims = (0,0,None))(params,buffers,x)
+
+    def member(self,k:int) -> nn.Module:
+        '''
+        Copy of member k as a regular network (e.g. for evaluation or saving)
+        '''
+        params,buffers = self.stacked_state()
+        device = self.stacked_params[0].device
+        net = copy.deepcopy(self.base).to_empty(device = device)
+        net.load_state_dict({name:value[k].detach() for name,value in {**params,**buffers}.items()})
+        return net
+
+    def __len__(self):
+        return self.num_models
+
+
+
+class Separable_Net(DE_Module):
+    def __init__(self,in_features:int,out_features:int,hidden_features:int,num_hidden_layers:int,rank:int = 32,activation = 'tanh',RWF:bool = False) -> None:
+        '''
+        Separable PINN (Cho et al. 2023). Each input has its own MLP f_d: R -> R^(out_features*rank) and the outputs are joined with
+
+            u_o(x_1,...,x_D) = sum_r prod_d f_d(x_d)_or
+
+        On a tensor product grid of N_1 x ... x N_D points only N_1 + ... + N_D points go through the networks and the full grid is an outer product
+        (see `forward_grid()`). `Separable_engine()` uses this to take all derivatives with forward mode AD of the 1D networks.
+
+        inputs:
+            - in_features: int number of inputs (one MLP each)
+            - out_features: int number of outputs
+            - hidden_features,num_hidden_layers,activation,RWF: see `MLP()`
+            - rank: int number of separable terms per output
+        '''
+        super().__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        self.rank = rank
+        self.axis_nets = nn.ModuleList([MLP(1,out_features*rank,hidden_features,num_hidden_layers,activation,RWF) for _ in range(in_features)])
+
+    def axis_features(self,d:int,x_d):
+        '''
+        Features of input d. x_d has shape (N,1) and the output has shape (N,out_features,rank)
+        '''
+        f = self.axis_nets[d](x_d)
+        return f.reshape(*f.shape[:-1],self.out_features,self.rank)
+
+    def forward(self,x):
+        #Scattered points (...,D). Works for single points of shape (D) under vmap
+        u = self.axis_features(0,x[...,0:1])
+        for d in range(1,self.in_features):
+            u = u*self.axis_features(d,x[...,d:d+1])
+        return u.sum(-1)
+
+    @staticmethod
+    def outer(features:list):
+        '''
+        Outer product of the per axis features [(N_1,O,R),...,(N_D,O,R)] summed over the rank. Returns (N_1*...*N_D,O) in row-major grid order
+        '''
+        letters = 'abcdefghijklmn'[:len(features)]
+        u = torch.einsum(','.join(f'{l}or' for l in letters) + f'->{letters}o',*features)
+        return u.reshape(-1,u.shape[-1])
+
+    def forward_grid(self,axes:list):
+        '''
+        Evaluate on the tensor product of the 1D Tensors in axes. Returns (N_1*...*N_D,out_features) in the order of `torch.meshgrid(indexing = 'ij')`
+        '''
+        return self.outer([self.axis_features(d,axis.reshape(-1,1)) for d,axis in enumerate(axes)])
+
+
+
+def smootherstep(t):
+    '''
+    Quintic interpolation weight 6t^5 - 15t^4 + 10t^3. Its first and second derivatives are zero at t = 0 and t = 1 so interpolation with it is C2
+    '''
+    return t*t*t*(t*(6*t - 15) + 10)
+
+
+class Hash_Grid_Encoding(nn.Module):
+    #Primes of the spatial hash (Teschner et al. 2003) for up to 4 inputs (e.g. x,y,z,t)
+    primes = (1,2654435761,805459861,3674653429)
+    def __init__(self,in_features:int,bounds:list,num_levels:int = 16,features_per_level:int = 2,log2_hashmap_size:int = 19,
+                 base_resolution:int = 16,finest_resolution:int = 512,interpolation:str = 'smootherstep',offset:float = 0.5) -> None:
+        '''
+        Multiresolution hash grid encoding (Muller et al. 2022). Each level is a grid of trainable feature vectors that is interpolated at the input.
+        Coarse levels with (resolution + 1)^D <= 2^log2_hashmap_size vertices are stored densely, finer levels are hashed into a table of that size.
+
+        The default 'smootherstep' interpolation is twice continuously differentiable so the encoding can be used with `AD_engine()` for second
+        order PDEs. 'linear' is the usual (multi)linear interpolation which has zero second derivatives inside each cell.
+
+        The smootherstep weights have zero first and second derivatives at every grid vertex. Each level's grid is therefore shifted by `offset` cells
+        (as in Instant-NGP) so its vertices do not lie on the edges of `bounds`. With offset = 0 every level has a vertex on the boundary and the encoding
+        has zero spatial derivatives there, so Neumann and flux conditions get no signal through it. Inputs outside `bounds` are clamped and also have
+        zero derivatives. `Hash_Grid_Net(include_input = True)` keeps a path with nonzero derivatives everywhere.
+
+        inputs:
+            - in_features: int number of inputs (1 to 4)
+            - bounds: list of (min,max) for each input. Inputs are scaled to [0,1] with these
+            - num_levels: int number of grid levels
+            - features_per_level: int number of features of each level. The output has num_levels*features_per_level features
+            - log2_hashmap_size: int log2 of the number of entries of each level's table
+            - base_resolution,finest_resolution: int resolution of the coarsest and finest level. The resolutions grow geometrically
+            - interpolation: str 'smootherstep' or 'linear'
+            - offset: float shift of every level's grid in cells, in [0,1). Default 0.5
+        '''
+        super().__init__()
+        assert 1 <= in_features <= len(self.primes), f'in_features must be between 1 and {len(self.primes)}'
+        assert 0 <= offset < 1, 'offset must be in [0,1)'
+        if interpolation not in ('smootherstep','linear'):
+            raise ValueError(f'interpolation must be either \'smootherstep\' or \'linear\'. Got {interpolation} instead')
+        self.in_features = in_features
+        self.num_levels = num_levels
+        self.features_per_level = features_per_level
+        self.out_features = num_levels*features_per_level
+        self.table_size = 2**log2_hashmap_size
+        self.interpolation = interpolation
+        self.offset = offset
+
+        growth = math.exp((math.log(finest_resolution) - math.log(base_resolution))/max(num_levels - 1,1))
+        resolutions = torch.tensor([math.floor(base_resolution*growth**l) for l in range(num_levels)],dtype = torch.int64)
+        bounds = torch.tensor(bounds,dtype = torch.float32)
+        assert bounds.shape == (in_features,2), 'bounds must have a (min,max) pair for each input'
+        self.register_buffer('lower',bounds[:,0])
+        self.register_buffer('width',bounds[:,1] - bounds[:,0])
+        self.register_buffer('resolutions',resolutions)
+        #A shifted grid needs one more vertex along each input to cover [0,1]
+        vertices = resolutions + 1 + (offset > 0)
+        self.register_buffer('max_cell',vertices - 2)
+        self.register_buffer('dense',vertices**in_features <= self.table_size)
+        self.register_buffer('strides',vertices.unsqueeze(-1)**torch.arange(in_features))                           #(L,D)
+        self.register_buffer('hash_primes',torch.tensor(self.primes[:in_features],dtype = torch.int64))
+        self.register_buffer('corners',torch.tensor(list(product((0,1),repeat = in_features)),dtype = torch.int64))   #(2^D,D)
+        self.register_buffer('level_offsets',torch.arange(num_levels,dtype = torch.int64)*self.table_size)
+
+        self.table = nn.Parameter(torch.empty(num_levels*self.table_size,features_per_level).uniform_(-1e-4,1e-4))
+
+    def vertex_index(self,vertices):
+        '''
+        Row of the table of each vertex. vertices has shape (...,L,C,D) and the output has shape (...,L,C)
+        '''
+        dense_idx = (vertices*self.strides.unsqueeze(-2)).sum(-1)
+        hashed = vertices*self.hash_primes
+        hash_idx = hashed[...,0]
+        for d in range(1,self.in_features):
+            hash_idx = torch.bitwise_xor(hash_idx,hashed[...,d])
+        idx = torch.where(self.dense.unsqueeze(-1),dense_idx,hash_idx) % self.table_size
+        return idx + self.level_offsets.unsqueeze(-1)
+
+    def forward(self,x):
+        #Works for (N,D) and single points (D) under vmap
+        u = (x - self.lower)/self.width
+        #clamp() has zero gradient at exactly 0 and 1 so only clamp points outside the bounds
+        u = torch.where((u >= 0) & (u <= 1),u,u.clamp(0,1))
+        pos = u.unsqueeze(-2)*self.resolutions.unsqueeze(-1).to(u.dtype) + self.offset    #(...,L,D)
+        cell = torch.floor(pos).detach().clamp(max = self.max_cell.unsqueeze(-1).to(u.dtype))
+        t = pos - cell
+        w = smootherstep(t) if self.interpolation == 'smootherstep' else t
+
+        vertices = cell.long().unsqueeze(-2) + self.corners                        #(...,L,C,D)
+        #Weight of each corner is the product of w or 1-w along each input
+        weights = torch.where(self.corners.bool(),w.unsqueeze(-2),1 - w.unsqueeze(-2)).prod(-1)   #(...,L,C)
+        features = self.table[self.vertex_index(vertices)]                        #(...,L,C,F)
+        features = (weights.unsqueeze(-1)*features.to(x.dtype)).sum(-2)           #(...,L,F)
+        return features.flatten(-2)
+
+
+class Hash_Grid_Net(DE_Module):
+    def __init__(self,in_features:int,out_features:int,bounds:list,hidden_features:int = 64,num_hidden_layers:int = 2,activation = 'tanh',
+                 include_input:bool = True,**encoding_kwargs) -> None:
+        '''
+        `Hash_Grid_Encoding()` followed by a small MLP. If include_input the scaled inputs are passed to the MLP alongside the encoding which helps
+        with the low frequency part of the solution. encoding_kwargs are passed to `Hash_Grid_Encoding()`.
+
+        The hash tables usually need a larger learning rate than the MLP e.g.
+
+            optimizer = torch.optim.Adam([{'params':net.encoding.parameters(),'lr':1e-2},{'params':net.mlp.parameters(),'lr':1e-3}])
+        '''
+        super().__init__()
+        self.include_input = include_input
+        self.encoding = Hash_Grid_Encoding(in_features,bounds,**encoding_kwargs)
+        self.mlp = MLP(self.encoding.out_features + (in_features if include_input else 0),out_features,hidden_features,num_hidden_layers,activation)
+
+    def forward(self,x):
+        features = self.encoding(x)
+        if self.include_input:
+            features = torch.cat([(x - self.encoding.lower)/self.encoding.width,features],dim = -1)
+        return self.mlp(features)
+
+
+
 if __name__ == '__main__':
     net = Fourier_Net(3,3,10,5,5)
     net = Modified_Fourier_Net(3,3,10,5,5)
@@ -0,0 +1,123 @@
+import torch
+import torch.nn as nn
+from typing import List,Tuple,Union
+from torch import Tensor
+
+'''
+Smooth approximate distance functions for the exact imposition of boundary conditions (Sukumar and Srivastava 2022). Every function takes points of
+shape (N,2) and is differentiable to any order (away from the boundary corners) so they can be used with both the AD and FD engines.
+'''
+
+
+def segment_distance(x:Tensor,p0:Tensor,p1:Tensor) -> Tensor:
+    '''
+    Normalised distance from points x (N,2) to the line segments p0 -> p1 of shape (S,2). Zero on the segment and smooth everywhere else.
+    Returns a Tensor of shape (N,S)
+    '''
+    d = p1 - p0                                        #(S,2)
+    L = d.norm(dim = -1)                               #(S)
+    centre = (p0 + p1)/2
+    rel = x.unsqueeze(-2) - p0                         #(N,S,2)
+    #Signed distance to the infinite line and trimming function that is positive on the segment
+    f = (rel[...,0]*d[:,1] - rel[...,1]*d[:,0])/L
+    t = ((L/2)**2 - (x.unsqueeze(-2) - centre).pow(2).sum(-1))/L
+    varphi = torch.sqrt(t**2 + f**4)
+    return torch.sqrt(f**2 + ((varphi - t)/2)**2)
+
+
+def circle_distance(x:Tensor,centre:Tuple[float,float],r:float) -> Tensor:
+    '''
+    Normalised distance to a circle. Positive outside the circle (e.g. a cylinder removed from the domain). Returns a Tensor of shape (N)
+    '''
+    c = torch.as_tensor(centre,dtype = x.dtype,device = x.device)
+    return ((x - c).pow(2).sum(-1) - r**2)/(2*r)
+
+
+def r_equivalence(*phis:Tensor,m:int = 1) -> Tensor:
+    '''
+    Join distance functions so the result is zero on every boundary: (sum phi_i^-m)^(-1/m). phis can also be a single Tensor of shape (N,S)
+    '''
+    phi = torch.stack(phis,dim = -1) if len(phis) > 1 else phis[0]
+    if phi.dim() == 1:
+        return phi
+    #phi^-m blows up on the boundary so use the equivalent product form
+    return torch.exp(-torch.logsumexp(-m*torch.log(phi.abs().clamp_min(1e-30)),dim = -1)/m)
+
+
+def r_conjunction(a:Tensor,b:Tensor) -> Tensor:
+    '''
+    R-function intersection of two domains with positive interiors
+    '''
+    return a + b - torch.sqrt(a**2 + b**2)
+
+
+def r_disjunction(a:Tensor,b:Tensor) -> Tensor:
+    '''
+    R-function union of two domains with positive interiors
+    '''
+    return a + b + torch.sqrt(a**2 + b**2)
+
+
+class Segment_distance(nn.Module):
+    def __init__(self,segments:Tensor,m:int = 1) -> None:
+        '''
+        Distance function that is zero on a set of line segments (S,2,2), joined with `r_equivalence()`. Use `from_lines()` or `from_domain()` to build it
+        from shapely lines or the boundary groups of a `Domain2D()`
+        '''
+        super().__init__()
+        self.register_buffer('p0',torch.as_tensor(segments[:,0],dtype = torch.float32))
+        self.register_buffer('p1',torch.as_tensor(segments[:,1],dtype = torch.float32))
+        self.m = m
+
+    @staticmethod
+    def from_lines(*lines,m:int = 1) -> 'Segment_distance':
+        from torch_DE.geometry.quadrature import line_segments
+        segments = [torch.stack([torch.as_tensor(a),torch.as_tensor(b)]) for line in lines for a,b in line_segments(line)]
+        return Segment_distance(torch.stack(segments).to(torch.float32),m)
+
+    @staticmethod
+    def from_domain(domain,boundaries:List[str],m:int = 1) -> 'Segment_distance':
+        '''
+        Distance function of the boundary groups `boundaries` of a `Domain2D()` e.g. ['inlet','no slip']
+        '''
+        return Segment_distance.from_lines(*[domain.boundary_groups[name][0] for name in boundaries],m = m)
+
+    def forward(self,x:Tensor) -> Tensor:
+        return r_equivalence(segment_distance(x[...,:2],self.p0.to(x.dtype),self.p1.to(x.dtype)),m = self.m)
+
+
+class Cubic_grid_SDF(nn.Module):
+    def __init__(self,x_axis:Tensor,y_axis:Tensor,values:Tensor) -> None:
+        '''
+        Differentiable cubic (Catmull-Rom) interpolation of a distance field on a regular grid. Unlike `RegularGridInterpolator()` it is
+        differentiable with continuous first derivatives, so it can be used as the distance function of `Hard_BC_Net()`.
+        Build it from a domain with `from_domain()`. The field is zero on every boundary of the domain, use `Segment_distance()` when only some of the
+        boundaries are Dirichlet (e.g. not the outlet)
+        '''
+        super().__init__()
+        self.register_buffer('origin',torch.tensor([float(x_axis[0]),float(y_axis[0])]))
+        self.register_buffer('spacing',torch.tensor([float(x_axis[1] - x_axis[0]),float(y_axis[1] - y_axis[0])]))
+        self.register_buffer('values',torch.as_tensor(values,dtype = torch.float32))
+
+    @staticmethod
+    def from_domain(domain,resolution:int = 256,scale_factor = 1.) -> 'Cubic_grid_SDF':
+        return Cubic_grid_SDF(*domain.sdf_grid(resolution,scale_factor))
+
+    @staticmethod
+    def kernel(s:Tensor) -> Tensor:
+        #Catmull-Rom weights for the 4 neighbours at offsets -1,0,1,2 with fractional position s
+        s2,s3 = s*s,s*s*s
+        return torch.stack([-0.5*s3 + s2 - 0.5*s,1.5*s3 - 2.5*s2 + 1,-1.5*s3 + 2*s2 + 0.5*s,0.5*s3 - 0.5*s2],dim = -1)
+
+    def forward(self,x:Tensor) -> Tensor:
+        nx,ny = self.values.shape
+        u = (x[...,:2] - self.origin.to(x.dtype))/self.spacing.to(x.dtype)
+        i0 = torch.floor(u).detach().long()
+        i0 = torch.stack([i0[...,0].clamp(1,nx - 3),i0[...,1].clamp(1,ny - 3)],dim = -1)
+        s = u - i0
+        wx,wy = self.kernel(s[...,0]),self.kernel(s[...,1])               #(N,4)
+        offsets = torch.arange(-1,3,device = x.device)
+        ix = (i0[...,0:1] + offsets).clamp(0,nx - 1)                     #(N,4)
+        iy = (i0[...,1:2] + offsets).clamp(0,ny - 1)
+        V = self.values.to(x.dtype)[ix.unsqueeze(-1),iy.unsqueeze(-2)]   #(N,4,4)
+        return torch.einsum('...i,...ij,...j->...',wx,V,wy)
@@ -0,0 +1,79 @@
+import numpy as np
+import torch
+from shapely.geometry import Point,LineString,MultiLineString
+from typing import Dict,Tuple,Union,List
+from torch import Tensor
+
+
+def gauss_legendre(n:int) -> Tuple[np.ndarray,np.ndarray]:
+    '''
+    Gauss-Legendre nodes and weights of order n on [-1,1]
+    '''
+    return np.polynomial.legendre.leggauss(n)
+
+
+def line_segments(line) -> List[Tuple[np.ndarray,np.ndarray]]:
+    '''
+    Split a LineString, MultiLineString or LinearRing into its straight segments. Returns a list of (start,end) points
+    '''
+    if isinstance(line,MultiLineString) or hasattr(line,'geoms'):
+        return [segment for part in line.geoms for segment in line_segments(part)]
+    coords = np.asarray(line.coords)
+    return [(coords[i],coords[i+1]) for i in range(len(coords)-1) if np.any(coords[i] != coords[i+1])]
+
+
+def line_quadrature(line,n_points:int = 4,domain = None,direction:Tuple[float,float] = None,dtype = torch.float32) -> Dict[str,Tensor]:
+    '''
+    Gauss-Legendre quadrature of a line integral over every straight segment of a line. Curves are treated as the polyline of their coordinates.
+
+    inputs:
+        - line: shapely LineString | MultiLineString
+        - n_points: int number of Gauss-Legendre nodes per segment
+        - domain: shapely Polygon. If given the normals point out of the domain (use for boundaries)
+        - direction: (dx,dy). If given the normals are flipped so they point along this direction (use for partitions inside the domain).
+            If domain and direction are None the normals are the segment directions rotated clockwise
+        - dtype: torch dtype of the output
+
+    Returns a dict with keys
+        - 'points': Tensor (M,2) of quadrature nodes
+        - 'weights': Tensor (M) quadrature weights so that sum(weights*f(points)) approximates the line integral of f
+        - 'normals': Tensor (M,2) unit normal at each node
+    '''
+    xi,w = gauss_legendre(n_points)
+    points,weights,normals = [],[],[]
+    for p0,p1 in line_segments(line):
+        d = p1 - p0
+        length = np.linalg.norm(d)
+        n = np.array([d[1],-d[0]])/length
+        mid = (p0 + p1)/2
+        if domain is not None:
+            #Move a small step along the normal. If it is still inside the domain the normal is pointing inward
+            step = 1e-6*max(length,1.)
+            if domain.contains(Point(*(mid + step*n))):
+                n = -n
+        elif direction is not None and np.dot(n,direction) < 0:
+            n = -n
+
+        points.append(mid + np.outer(xi,d)/2)
+        weights.append(w*length/2)
+        normals.append(np.repeat(n[None],n_points,axis = 0))
+
+    return {'points':torch.tensor(np.concatenate(points),dtype = dtype),
+            'weights':torch.tensor(np.concatenate(weights),dtype = dtype),
+            'normals':torch.tensor(np.concatenate(normals),dtype = dtype)}
+
+
+def quadrature_kwargs(quadrature:Dict[str,Tensor]) -> Dict[str,Tensor]:
+    '''
+    Batchable kwargs of a quadrature group for `PINN_dataset.add_group()`: `quad_weight`, `normal_x` and `normal_y`
+    '''
+    return {'quad_weight':quadrature['weights'],'normal_x':quadrature['normals'][:,0],'normal_y':quadrature['normals'][:,1]}
+
+
+def add_quadrature_group(dataset,name:str,quadrature:Dict[str,Tensor]) -> None:
+    '''
+    Add the quadrature nodes as a static (full batch, unshuffled) group of a `PINN_dataset()`. The weights and normals are stored as the batchable kwargs
+    `quad_weight`, `normal_x` and `normal_y` so they can be used by `Loss_handler.add_integral()`
+    '''
+    points = quadrature['points']
+    dataset.add_group(name,points,quadrature_kwargs(quadrature),batch_size = len(points),shuffle = False,unbatched_kwargs = {'full_batch':True})
@@ -1,5 +1,7 @@
 from shapely.geometry import Polygon,Point, LineString
 from .sampling import *
+from .quadrature import line_quadrature
+from .weak_form import Weak_form,refine_triangulation
 from scipy.spatial import Delaunay
 
 from typing import Callable
@@ -107,6 +109,18 @@ class Domain2D():
         Output:
             SDF func(xy) where xy is a tensor of shape (N,2). The output of this function is a tensor of size (N) of the signed distances of each point.
         '''
+        x,y,distance = self.sdf_grid(resolution,scale_factor)
+        distance = distance.to(device = device)
+        self.sdf = RegularGridInterpolator((x,y),distance)
+        self.sdf.set_device(device)
+
+        return self.sdf
+
+    def sdf_grid(self,resolution:int = 256,scale_factor = 1.):
+        '''
+        Distance to the boundary on a (resolution,resolution) grid over the bounds of the domain. Points outside the domain are set to zero.
+        Returns the x axis, y axis and the distance grid. see `create_sdf()`
+        '''
         #We use a brute force method for SDF. Points outside the domain are set to zero. This is good enough for PINN applications
         xmin,ymin,xmax,ymax = self.Domain.bounds
         x,y = [torch.linspace(xmin,xmax,resolution),torch.linspace(ymin,ymax,resolution)]
@@ -118,13 +132,10 @@ class Domain2D():
         distance = torch.tensor(self.Domain.boundary.distance(points))
         distance[~self.contains(points)] *= 0
         
-        distance = distance.reshape((resolution,resolution)).to(device = device)
+        distance = distance.reshape((resolution,resolution))
 
         distance = distance/distance.max() if scale_factor == 'normalize' or scale_factor == 'normalise' else distance*scale_factor
-        self.sdf = RegularGridInterpolator((x,y),distance)
-        self.sdf.set_device(device)
-
-        return self.sdf
+        return x,y,distance
 
     def plot_sdf(self):
         if self.sdf is None:
@@ -217,6 +228,22 @@ class Domain2D():
 
 
 
+    def weak_form(self,refine:int = 3,order:int = 2,shapeID:str = None) -> Weak_form:
+        '''
+        Create a `Weak_form()` from the triangulation of the domain (or the shape `shapeID`) uniformly refined `refine` times
+        see `torch_DE.geometry.weak_form.Weak_form()`
+        '''
+        shape = self.Domain if shapeID is None else self.operations[shapeID]
+        points,triangles = triangulate_shape(shape)
+        return Weak_form(*refine_triangulation(points,triangles,refine),order = order)
+
+    def boundary_quadrature(self,boundary:str,n_points:int = 4):
+        '''
+        Gauss-Legendre quadrature nodes, weights and outward normals of a boundary group. see `torch_DE.geometry.quadrature.line_quadrature()`
+        '''
+        line,_ = self.boundary_groups[boundary]
+        return line_quadrature(line,n_points,domain = self.Domain)
+
     def generate_boundary_points(self,num_points = 100, random = False,time_interval = None,time_sampling = 'random interval'):
         return   {name:self.generate_points_from_boundary(name,num_points,random,time_interval,time_sampling) for name in self.boundary_groups.keys()} 
 
@@ -380,3 +407,11 @@ class Partition_Group(dict):
 
     def generate_points(self,num_points=100,random = False):
         return {k: self._gen_points(k,num_points,random) for k in self.keys()}
+
+    def quadrature(self,partition_name,n_points:int = 4,direction = None):
+        '''
+        Gauss-Legendre quadrature nodes, weights and normals of a partition. The normals point along `direction` (dx,dy) if given
+        see `torch_DE.geometry.quadrature.line_quadrature()`
+        '''
+        line,_ = self[partition_name]
+        return line_quadrature(line,n_points,direction = direction)
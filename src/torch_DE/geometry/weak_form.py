@@ -0,0 +1,157 @@
+import numpy as np
+import torch
+from typing import Dict,Callable,Union,List,Tuple
+from torch import Tensor
+
+#Symmetric quadrature rules on the reference triangle. Barycentric coordinates (Q,3) and weights (Q) that sum to 1
+_a,_b = 0.445948490915965,0.108103018168070
+_c,_d = 0.091576213509771,0.816847572980459
+TRIANGLE_RULES = {
+    1:(np.array([[1/3,1/3,1/3]]),np.array([1.])),
+    2:(np.array([[2/3,1/6,1/6],[1/6,2/3,1/6],[1/6,1/6,2/3]]),np.array([1/3,1/3,1/3])),
+    4:(np.array([[_a,_a,_b],[_a,_b,_a],[_b,_a,_a],[_c,_c,_d],[_c,_d,_c],[_d,_c,_c]]),
+       np.array([0.223381589678011]*3 + [0.109951743655322]*3)),
+}
+
+
+def triangle_quadrature(order:int = 2) -> Tuple[np.ndarray,np.ndarray]:
+    '''
+    Quadrature rule on a triangle that is exact for polynomials up to degree `order` (1, 2 or 4). Returns barycentric coordinates (Q,3) and weights (Q)
+    '''
+    if order not in TRIANGLE_RULES:
+        raise ValueError(f'order must be one of {list(TRIANGLE_RULES.keys())}. Got {order} instead')
+    return TRIANGLE_RULES[order]
+
+
+def refine_triangulation(points:np.ndarray,triangles:np.ndarray,levels:int = 1) -> Tuple[np.ndarray,np.ndarray]:
+    '''
+    Uniformly refine a triangulation by splitting every triangle into 4 through its edge midpoints. Repeated `levels` times
+    '''
+    points,triangles = np.asarray(points,dtype = np.float64),np.asarray(triangles,dtype = np.int64)
+    for _ in range(levels):
+        edges = np.sort(np.concatenate([triangles[:,[0,1]],triangles[:,[1,2]],triangles[:,[2,0]]]),axis = 1)
+        unique_edges,inverse = np.unique(edges,axis = 0,return_inverse = True)
+        inverse = inverse.reshape(-1)
+        mid_idx = len(points) + inverse.reshape(3,-1).T
+        points = np.concatenate([points,points[unique_edges].mean(axis = 1)])
+        m01,m12,m20 = mid_idx[:,0],mid_idx[:,1],mid_idx[:,2]
+        p0,p1,p2 = triangles[:,0],triangles[:,1],triangles[:,2]
+        triangles = np.concatenate([np.stack([p0,m01,m20],1),np.stack([m01,p1,m12],1),np.stack([m20,m12,p2],1),np.stack([m01,m12,m20],1)])
+    return points,triangles
+
+
+def boundary_nodes(triangles:np.ndarray) -> np.ndarray:
+    '''
+    Indices of the nodes on the boundary of a triangulation (nodes of edges that belong to only one triangle)
+    '''
+    edges = np.sort(np.concatenate([triangles[:,[0,1]],triangles[:,[1,2]],triangles[:,[2,0]]]),axis = 1)
+    unique_edges,counts = np.unique(edges,axis = 0,return_counts = True)
+    return np.unique(unique_edges[counts == 1])
+
+
+class Weak_form():
+    def __init__(self,points:np.ndarray,triangles:np.ndarray,order:int = 2,test_nodes:np.ndarray = None,dtype = torch.float32) -> None:
+        '''
+        Weak (variational) form of `-div(F) + s = 0` on a triangulation with piecewise linear (P1 hat) test functions phi_i:
+
+            R_i = sum_q w_q*(F(x_q).grad(phi_i)(x_q) + s(x_q)*phi_i(x_q))
+
+        The boundary term vanishes as the test functions are zero on the boundary. The network is only evaluated at the quadrature points
+        and only first derivatives are needed (F is normally a function of u and grad(u)). The assembly of R is a single sparse matrix
+        product with a matrix built once from the triangulation.
+
+        inputs:
+            - points: (N,2) array of triangulation nodes e.g. from `triangulate_shape()` and `refine_triangulation()`
+            - triangles: (T,3) array of node indices of each triangle
+            - order: int quadrature order (1,2 or 4)
+            - test_nodes: indices of the nodes whose hat function is a test function. Default all nodes not on the boundary
+            - dtype: torch dtype
+
+        Example for the Poisson equation -laplacian(u) = f:
+
+            weak = Weak_form(*refine_triangulation(*triangulate_shape(domain),levels = 3))
+            weak.add_to_dataset(dataset,'weak')
+            losses.add_weak_residual('weak',weak,flux = ['u_x','u_y'],source = DE_func(lambda x,y,**kwargs: -f(x,y)))
+        '''
+        points,triangles = np.asarray(points,dtype = np.float64),np.asarray(triangles,dtype = np.int64)
+        bary,w = triangle_quadrature(order)
+        T,Q = len(triangles),len(w)
+        self.points = points
+        self.triangles = triangles
+        self.test_nodes = np.setdiff1d(np.arange(len(points)),boundary_nodes(triangles)) if test_nodes is None else np.asarray(test_nodes)
+
+        P = points[triangles]                               #(T,3,2)
+        J = np.stack([P[:,1] - P[:,0],P[:,2] - P[:,0]],axis = -1)   #(T,2,2) columns are the edges
+        area = np.abs(np.linalg.det(J))/2
+        J_inv = np.linalg.inv(J)                            #rows are grad(lambda_1),grad(lambda_2)
+        grad_lambda = np.concatenate([-J_inv.sum(axis = 1,keepdims = True),J_inv],axis = 1)   #(T,3,2)
+
+        self.quadrature_points = torch.tensor(np.einsum('qk,tkd->tqd',bary,P).reshape(-1,2),dtype = dtype)
+        self.quadrature_weights = torch.tensor((area[:,None]*w[None]).reshape(-1),dtype = dtype)
+
+        #Assembly matrix rows: test nodes. columns: [F_x at all q | F_y at all q | s at all q]
+        row_of_node = -np.ones(len(points),dtype = np.int64)
+        row_of_node[self.test_nodes] = np.arange(len(self.test_nodes))
+        q_idx = np.arange(T*Q).reshape(T,Q)
+        wq = area[:,None]*w[None]                           #(T,Q)
+
+        rows,cols,vals = [],[],[]
+        for k in range(3):
+            r = row_of_node[triangles[:,k]]                 #(T)
+            keep = r >= 0
+            r_tq = np.repeat(r[keep],Q)
+            q_tq = q_idx[keep].reshape(-1)
+            w_tq = wq[keep].reshape(-1)
+            for d in range(2):
+                rows.append(r_tq)
+                cols.append(d*T*Q + q_tq)
+                vals.append(w_tq*np.repeat(grad_lambda[keep,k,d],Q))
+            rows.append(r_tq)
+            cols.append(2*T*Q + q_tq)
+            vals.append(w_tq*np.tile(bary[:,k],keep.sum()))
+
+        indices = torch.tensor(np.stack([np.concatenate(rows),np.concatenate(cols)]))
+        self.assembly = torch.sparse_coo_tensor(indices,torch.tensor(np.concatenate(vals),dtype = dtype),(len(self.test_nodes),3*T*Q)).coalesce()
+        self._device_assembly = {}
+
+    def __len__(self):
+        return len(self.test_nodes)
+
+    def add_to_dataset(self,dataset,name:str,time:float = None) -> None:
+        '''
+        Add the quadrature points as a static (full batch, unshuffled) group of a `PINN_dataset()`
+        '''
+        x = self.quadrature_points
+        if time is not None:
+            x = torch.cat([x,torch.full((len(x),1),time,dtype = x.dtype)],dim = 1)
+        dataset.add_group(name,x,batch_size = len(x),shuffle = False,unbatched_kwargs = {'full_batch':True})
+
+    def assemble(self,flux_x:Tensor,flux_y:Tensor,source:Union[Tensor,None] = None) -> Tensor:
+        '''
+        Weak residual of each test function from the flux components and source evaluated at the quadrature points
+        '''
+        A = self._device_assembly.get((flux_x.device,flux_x.dtype))
+        if A is None:
+            A = self._device_assembly[(flux_x.device,flux_x.dtype)] = self.assembly.to(device = flux_x.device,dtype = flux_x.dtype)
+        source = torch.zeros_like(flux_x) if source is None else source*torch.ones_like(flux_x)
+        return torch.sparse.mm(A,torch.cat([flux_x,flux_y,source]).unsqueeze(-1)).squeeze(-1)
+
+    def residual(self,flux:Union[List[Union[str,Callable]],Tuple],source:Union[Callable,None] = None) -> Callable:
+        '''
+        Residual function f(group_input,group_output) for `Loss_handler()`.
+
+        inputs:
+            - flux: two output names (e.g. ['u_x','u_y']) or functions f(group_input,group_output) giving the flux components F_x,F_y
+            - source: function f(group_input,group_output) for the source s. Default None (no source)
+        '''
+        assert len(flux) == 2, 'flux must have an x and y component'
+        def component(f):
+            if isinstance(f,str):
+                return lambda group_input,group_output: group_output[f]
+            return f
+        flux_x,flux_y = component(flux[0]),component(flux[1])
+
+        def weak_residual(group_input,group_output):
+            s = None if source is None else source(group_input,group_output)
+            return self.assemble(flux_x(group_input,group_output),flux_y(group_input,group_output),s)
+        return weak_residual
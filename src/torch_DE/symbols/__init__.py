@@ -1,3 +1,4 @@
 from .DE_Symbols import Deriv,derivs,Variable_dict,to_Symbol,to_String,Variable_list
+from .compiler import Symbolic_equations,compile_equations
 
-__all__ = ['Deriv','derivs','Variable_dict','to_String','to_Symbol','Variable_list']
\ No newline at end of file
+__all__ = ['Deriv','derivs','Variable_dict','to_String','to_Symbol','Variable_list','Symbolic_equations','compile_equations']
\ No newline at end of file
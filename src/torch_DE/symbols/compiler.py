@@ -0,0 +1,135 @@
+import math
+import torch
+from sympy import Symbol,Basic,lambdify,sympify
+from typing import Dict,List,Union,Callable,Tuple
+from torch import Tensor
+from torch_DE.symbols.DE_Symbols import Deriv,to_String
+
+#Maps the function names printed by sympy to torch functions
+TORCH_FUNCTIONS = {
+    'sin':torch.sin,'cos':torch.cos,'tan':torch.tan,
+    'asin':torch.asin,'acos':torch.acos,'atan':torch.atan,'atan2':torch.atan2,
+    'sinh':torch.sinh,'cosh':torch.cosh,'tanh':torch.tanh,
+    'asinh':torch.asinh,'acosh':torch.acosh,'atanh':torch.atanh,
+    'exp':torch.exp,'log':torch.log,'sqrt':torch.sqrt,'Abs':torch.abs,'sign':torch.sign,
+    'erf':torch.erf,'Max':torch.maximum,'Min':torch.minimum,
+    'pi':math.pi,'E':math.e,
+}
+
+
+def normalise_symbols(expr:Basic) -> Basic:
+    '''
+    Replace `Deriv()` and other Symbol subclasses with plain Symbols of the same name so symbols are matched by name only
+    '''
+    return expr.xreplace({s:Symbol(s.name) for s in expr.free_symbols if type(s) is not Symbol})
+
+
+class Symbolic_equations():
+    def __init__(self,equations:Dict[str,Basic],params:Dict[str,float] = None,modules:Dict[str,Callable] = None) -> None:
+        '''
+        Compile a set of sympy equations of one group into a single torch function. Common subexpressions across all the equations
+        (e.g. `u*u_x + v*u_y` in the NavierStokes equations) are only evaluated once.
+
+        inputs:
+            - equations: dict of name: sympy expression. Symbols can be output variables, derivatives (`Deriv()` or names like `u_xx`), input variables,
+                batchable kwargs and unbatched kwargs of the group
+            - params: dict of constants (e.g. {'Re':100}) substituted before compilation
+            - modules: dict of additional function names to torch functions, see `TORCH_FUNCTIONS`
+
+        Where each symbol comes from is worked out on the first call of every group and then reused. All equations are evaluated together and
+        the result is cached for the current batch so `term()` functions of the same batch only evaluate the equations once.
+        `Loss_handler.calculate()` clears the cache after the group's terms so it does not hold on to the group's graph.
+        '''
+        params = {} if params is None else {Symbol(to_String(key)):value for key,value in params.items()}
+        self.names = list(equations.keys())
+        self.exprs = {name:normalise_symbols(sympify(expr)).subs(params) for name,expr in equations.items()}
+        symbols = set().union(*[expr.free_symbols for expr in self.exprs.values()])
+        self.symbols:List[Symbol] = sorted(symbols,key = lambda s: s.name)
+        self.arg_names:List[str] = [s.name for s in self.symbols]
+
+        functions = TORCH_FUNCTIONS if modules is None else {**TORCH_FUNCTIONS,**modules}
+        self.func = lambdify(self.symbols,[self.exprs[name] for name in self.names],modules = [functions],cse = True)
+
+        self.bindings:Dict[str,List[Tuple[str,str]]] = {}
+        self._last = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def bind(self,group_input,group_output:Dict[str,Tensor]) -> List[Tuple[str,str]]:
+        '''
+        Find where every symbol is stored. Outputs and derivatives take priority over batchables which take priority over unbatched kwargs
+        '''
+        binding = []
+        for name in self.arg_names:
+            if name in group_output:
+                binding.append(('output',name))
+            elif name in group_input.batchables.keys():
+                binding.append(('batchables',name))
+            elif name in group_input.unbatchables:
+                binding.append(('unbatchables',name))
+            else:
+                raise KeyError(f'symbol {name} of the equations {self.names} was not found in the network output or the inputs of group {group_input.name}')
+        return binding
+
+    def __call__(self,group_input,group_output:Dict[str,Tensor]) -> Dict[str,Tensor]:
+        '''
+        Evaluate all equations. Returns a dict of name: residual
+        '''
+        last = self._last
+        if last is not None and last[0] is group_input and last[1] is group_output:
+            return last[2]
+
+        binding = self.bindings.get(group_input.name)
+        if binding is None:
+            binding = self.bindings[group_input.name] = self.bind(group_input,group_output)
+
+        sources = {'output':group_output,'batchables':group_input.batchables,'unbatchables':group_input.unbatchables}
+        values = self.func(*[sources[source][name] for source,name in binding])
+        out = dict(zip(self.names,values))
+        self._last = (group_input,group_output,out)
+        return out
+
+    def term(self,name:str) -> Callable:
+        '''
+        Residual function f(group_input,group_output) of a single equation for `Loss_handler()`
+        '''
+        assert name in self.names, f'{name} is not one of the compiled equations {self.names}'
+        def symbolic_term(group_input,group_output):
+            return self(group_input,group_output)[name]
+        symbolic_term.equations = self
+        #Called by `Loss_handler.calculate()` once every term of the group has been evaluated
+        symbolic_term.clear_cache = self.clear_cache
+        return symbolic_term
+
+    def terms(self) -> Dict[str,Callable]:
+        return {name:self.term(name) for name in self.names}
+
+    def clear_cache(self):
+        self._last = None
+
+
+def compile_equations(equations:Dict[str,Basic],params:Dict[str,float] = None,modules:Dict[str,Callable] = None) -> Dict[str,Callable]:
+    '''
+    Compile sympy equations into residual functions that can be passed directly to `Loss_handler.add_residual()`. See `Symbolic_equations()`
+    '''
+    return Symbolic_equations(equations,params,modules).terms()
+
+
+def symbolic_derivatives(expr:Basic,input_vars:List[str],output_vars:List[str]) -> set:
+    '''
+    Exact set of derivative names an expression depends on. `Deriv()` symbols are used directly, other symbols are parsed as `{output_var}_{input_vars}`
+    '''
+    input_vars,output_vars = [to_String(v) for v in input_vars],[to_String(v) for v in output_vars]
+    derivs = set()
+    for s in sympify(expr).free_symbols:
+        if isinstance(s,Deriv):
+            if s.output_var in output_vars and all(v in input_vars for v in s.list_input_vars()):
+                derivs.add(s.name)
+            continue
+        parts = s.name.split('_')
+        if len(parts) != 2 or parts[0] not in output_vars or parts[1] == '':
+            continue
+        if all(v in input_vars for v in parts[1]):
+            derivs.add(s.name)
+    return derivs
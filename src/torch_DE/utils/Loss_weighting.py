@@ -1,26 +1,54 @@
 import torch
+from typing import List,Sequence,Union,Dict,Callable,Tuple
 
 class Loss_Weighting():
-    def __init__(self,global_scheme = None,local_scheme = None) -> None:
-        
-        if isinstance(global_scheme,str):
+    def __init__(self,global_scheme = None,local_scheme = None,update_interval:int = 1,**scheme_kwargs) -> None:
+        '''
+        Global loss weighting scheme. Call `global_weighting()` every step, the weights are only updated every `update_interval` steps.
+
+        inputs:
+            - global_scheme: str | Callable. Either 'identity', 'gradNorm', 'gradNorm_batched', 'NTK' or a function f(weights,*args,**kwargs) that returns new weights
+            - update_interval: int number of steps between weight updates
+            - **scheme_kwargs: kwargs passed to the scheme e.g. alpha or max_weight
+
+        Schemes are called with `global_weighting(weights,net,*losses)` for gradNorm or `global_weighting(weights,net,loss)` for NTK where loss is a `Loss()` object
+        '''
+        self.update_interval = update_interval
+        self.scheme_kwargs = scheme_kwargs
+        self.step = 0
+        if global_scheme is None:
+            self.global_weight_function = 'identity'
+        elif isinstance(global_scheme,str):
+            if global_scheme not in ('identity','gradNorm','gradNorm_batched','NTK'):
+                raise ValueError(f'global_scheme must be one of identity, gradNorm, gradNorm_batched or NTK. Got {global_scheme} instead')
             self.global_weight_function = global_scheme
         elif callable(global_scheme):
             self.global_weight_function = 'custom'
             self.custom_global_weighting(global_scheme)
+        else:
+            raise TypeError(f'global_scheme must be a string or callable. Got {type(global_scheme)} instead')
 
 
 
     def global_weighting(self,weights,*args,**kwargs):
-        return getattr(self,self.global_weight_function)
+        if self.step % self.update_interval == 0:
+            weights = getattr(self,self.global_weight_function)(weights,*args,**{**self.scheme_kwargs,**kwargs})
+        self.step += 1
+        return weights
 
 
     def identity(self,weights,*args,**kwargs):
         return weights
 
 
-    def gradNorm(self,*args,**kwargs):
-        return GradNorm(*args,**kwargs)
+    def gradNorm(self,weights,net,*losses,**kwargs):
+        return GradNorm(net,weights,*losses,**kwargs)
+
+    def gradNorm_batched(self,weights,net,*losses,**kwargs):
+        return GradNorm_batched(net,weights,*losses,**kwargs)
+
+    def NTK(self,weights,net,loss,**kwargs):
+        return NTK_weighting(net,weights,loss,**kwargs)
 
     def custom_global_weighting(self,func):
         self.custom = func
@@ -50,6 +78,175 @@ def GradNorm(net:torch.nn.Module,global_weights:torch.Tensor,*losses:torch.Tenso
         return alpha*global_weights + (1-alpha)*new_weights
 
 
+def last_layer_parameters(net:torch.nn.Module) -> List[torch.Tensor]:
+    '''
+    Parameters of the last module in `net` that directly owns parameters (normally the output layer)
+    '''
+    modules = [m for m in net.modules() if len(list(m.parameters(recurse = False))) > 0]
+    assert len(modules) > 0, 'network has no parameters'
+    return list(modules[-1].parameters(recurse = False))
+
+
+def term_gradients(net:torch.nn.Module,losses:Union[torch.Tensor,Sequence[torch.Tensor]],last_layer:bool = False,batched:bool = True) -> List[torch.Tensor]:
+    '''
+    Gradient of each loss with respect to the network parameters. Returns a list with a Tensor of shape (number of losses,parameter size) for each parameter.
+
+    If batched, all gradients are calculated in one backward pass with `is_grads_batched` and an identity cotangent (vmap over the backward pass).
+    Falls back to one backward pass per loss if the graph does not support batched gradients. If last_layer only the parameters of the output layer
+    are used which is much cheaper
+    '''
+    L = losses if isinstance(losses,torch.Tensor) else torch.stack(list(losses))
+    params = last_layer_parameters(net) if last_layer else [p for p in net.parameters() if p.requires_grad]
+    n = L.shape[0]
+
+    if batched:
+        try:
+            eye = torch.eye(n,device = L.device,dtype = L.dtype)
+            grads = torch.autograd.grad(L,params,eye,retain_graph = True,allow_unused = True,is_grads_batched = True)
+            return [g.reshape(n,-1) if g is not None else torch.zeros(n,p.numel(),device = p.device,dtype = p.dtype) for g,p in zip(grads,params)]
+        except RuntimeError:
+            pass
+
+    grads = [torch.autograd.grad(l,params,retain_graph = True,allow_unused = True) for l in L.unbind(0)]
+    #(n,P) per parameter so the result is the same as the batched version
+    return [torch.stack([g[j].flatten() if g[j] is not None else torch.zeros_like(p).flatten() for g in grads])
+            for j,p in enumerate(params)]
+
+
+def gradient_norms(net:torch.nn.Module,losses:Union[torch.Tensor,Sequence[torch.Tensor]],last_layer:bool = False,batched:bool = True) -> torch.Tensor:
+    '''
+    L2 norm of the gradient of each loss with respect to the network parameters. Returns a Tensor of size (number of losses) on the same device as the losses.
+    See `term_gradients()`
+    '''
+    grads = term_gradients(net,losses,last_layer,batched)
+    with torch.no_grad():
+        return torch.sqrt(sum(g.pow(2).sum(1) for g in grads))
+
+
+def weights_from_norms(grad_norms:torch.Tensor,global_weights:torch.Tensor,alpha:float = 0.9,max_weight:float = None,eps:float = 1e-5) -> torch.Tensor:
+    '''
+    GradNorm weight update from the gradient norms of each loss. Calculated on device without any host transfer
+    '''
+    with torch.no_grad():
+        grad_norms = grad_norms.to(global_weights)
+        new_weights = grad_norms.sum()/grad_norms.clamp_min(eps)
+        new_weights = torch.where(grad_norms > eps,new_weights,global_weights)
+        if max_weight is not None:
+            new_weights = new_weights.clamp(max = max_weight)
+        return alpha*global_weights + (1-alpha)*new_weights
+
+
+def GradNorm_batched(net:torch.nn.Module,global_weights:torch.Tensor,*losses:torch.Tensor,alpha:float = 0.9,max_weight = None,eps = 1e-5,
+                     last_layer:bool = False,batched:bool = True) -> torch.Tensor:
+    '''
+    Same as `GradNorm()` but the gradients of all losses are calculated in a single batched backward pass and the weights are updated on device.
+    See `gradient_norms()` and `weights_from_norms()`
+
+    inputs:
+        - net: network
+        - global_weights: Tensor of the current weights
+        - *losses: the individual losses e.g. `*loss.individual_losses()`
+        - alpha: float moving average factor
+        - max_weight: float maximum weight. Default None (no maximum)
+        - eps: float gradient norms below eps keep their current weight
+        - last_layer: bool only use the output layer parameters for the gradient norms
+        - batched: bool use a single batched backward pass
+    '''
+    assert isinstance(global_weights,torch.Tensor),f'global_weights needs to be of type Torch.Tensor!!! Got {type(global_weights)} type instead'
+    assert len(global_weights) == len(losses) , f'the number of weights {len(global_weights)} given do not match the number of losses ({len(losses)})'
+    grad_norms = gradient_norms(net,losses,last_layer,batched)
+    return weights_from_norms(grad_norms,global_weights,alpha,max_weight,eps)
+
+
+def ntk_traces(net:torch.nn.Module,residuals:Sequence[torch.Tensor],num_probes:int = 4,sample_size:int = 512,batched:bool = True) -> torch.Tensor:
+    '''
+    Randomised (Hutchinson) estimate of the mean diagonal of the neural tangent kernel K_i = J_i J_i^T of each residual, where J_i is the jacobian of
+    the residual points with respect to the network parameters. For a Rademacher probe v, E[||J_i^T v||^2] = Tr(K_i), so each probe only needs a VJP
+    instead of the full jacobian.
+
+    At most `sample_size` points of each residual are used. All probes of all residuals are stacked into a block cotangent so every VJP is calculated in a
+    single batched backward pass. Returns a Tensor of size (number of residuals)
+    '''
+    params = [p for p in net.parameters() if p.requires_grad]
+    flat = []
+    for r in residuals:
+        r = r.reshape(-1)
+        if len(r) > sample_size:
+            r = r[torch.randperm(len(r),device = r.device)[:sample_size]]
+        flat.append(r)
+    sizes = [len(r) for r in flat]
+    R = torch.cat(flat)
+    n = len(flat)
+
+    #Block cotangent: row i*num_probes + p is a probe of residual i and is zero outside of its block
+    V = torch.zeros(n*num_probes,len(R),device = R.device,dtype = R.dtype)
+    start = 0
+    for i,size in enumerate(sizes):
+        V[i*num_probes:(i+1)*num_probes,start:start+size] = torch.randint(0,2,(num_probes,size),device = R.device).to(R.dtype)*2 - 1
+        start += size
+
+    sq_norms = None
+    if batched:
+        try:
+            grads = torch.autograd.grad(R,params,V,retain_graph = True,allow_unused = True,is_grads_batched = True)
+            sq_norms = sum(g.reshape(len(V),-1).pow(2).sum(1) for g in grads if g is not None)
+        except RuntimeError:
+            sq_norms = None
+    if sq_norms is None:
+        sq_norms = torch.stack([sum(g.pow(2).sum() for g in torch.autograd.grad(R,params,v,retain_graph = True,allow_unused = True) if g is not None)
+                                for v in V])
+
+    with torch.no_grad():
+        traces = sq_norms.reshape(n,num_probes).mean(1)
+        return traces/torch.tensor(sizes,device = traces.device,dtype = traces.dtype)
+
+
+def NTK_weighting(net:torch.nn.Module,global_weights:torch.Tensor,loss,num_probes:int = 4,sample_size:int = 512,alpha:float = 0.9,max_weight:float = None,
+                  eps:float = 1e-8,batched:bool = True) -> torch.Tensor:
+    '''
+    NTK based weighting by Wang et al. Each weight is the sum of the NTK traces over all terms divided by the trace of the term, so terms that
+    converge slowly get larger weights. The traces are estimated with `ntk_traces()`.
+
+    inputs:
+        - net: network
+        - global_weights: Tensor of the current weights
+        - loss: `Loss()` object or list of residual Tensors. For a cheaper update calculate the loss on a small batch from `subsample_batch()`
+        - num_probes: int number of random probes per term
+        - sample_size: int maximum number of points per term used in the estimate
+        - alpha: float moving average factor
+        - max_weight: float maximum weight. Default None (no maximum)
+        - eps: float traces below eps keep their current weight
+        - batched: bool calculate all probes in a single batched backward pass
+    '''
+    residuals = loss.residuals if hasattr(loss,'residuals') else loss
+    assert len(global_weights) == len(residuals), f'the number of weights {len(global_weights)} given do not match the number of losses ({len(residuals)})'
+    traces = ntk_traces(net,residuals,num_probes,sample_size,batched)
+    with torch.no_grad():
+        traces = traces.to(global_weights)
+        new_weights = traces.sum()/traces.clamp_min(eps)
+        new_weights = torch.where(traces > eps,new_weights,global_weights)
+        if max_weight is not None:
+            new_weights = new_weights.clamp(max = max_weight)
+        return alpha*global_weights + (1-alpha)*new_weights
+
+
+def subsample_batch(batch:dict,sample_size:int) -> dict:
+    '''
+    Random subset of at most `sample_size` points of every group of a batch (a `PINN_dict` of `PINN_group`). Used to estimate weights on fewer points
+    '''
+    from torch_DE.utils.data import PINN_group
+    sub = type(batch)()
+    for name,group in batch.items():
+        N = len(group)
+        if N <= sample_size:
+            sub[name] = group
+            continue
+        idx = torch.randperm(N,device = group.batchables['input'].device)[:sample_size]
+        sub[name] = PINN_group(name,group.batchables['input'][idx],sample_size,group.input_vars,batchable_kwargs = group.batchable_kwargs[idx],
+                               unbatched_kwargs = group.unbatchables,shuffle = group.shuffle)
+    return sub
+
+
 def Causal_weighting(loss,eps=1.0):
     '''
     Causal training algorithim by _ et al.
@@ -65,3 +262,95 @@ def Causal_weighting(loss,eps=1.0):
         causal_weights = torch.exp(-eps*res_cumsum)
         causal_weights[0] = 1
     return causal_weights
+
+
+
+class Causal_binned_weighting():
+    def __init__(self,time_interval:Tuple[float,float],num_bins:int = 32,eps:float = 1.0,time_var:str = 't',power:int = 2) -> None:
+        '''
+        Causal training (Wang et al.) over M time bins. Works with shuffled batches as the points do not need to be sorted in time.
+
+        The point errors |R|^power (averaged over the residual terms) are scatter added into `num_bins` bins of `time_interval` by the time of each point.
+        The weight of bin i is `exp(-eps*sum_{k<i} L_k)` where L_k is the mean error of bin k, so later times are only trained once earlier times
+        have a small error. The weight of each point is then gathered from its bin. Everything is O(N) and stays on device.
+
+        inputs:
+            - time_interval: (t0,t1) time interval of the problem
+            - num_bins: int number of time bins M
+            - eps: float causality parameter
+            - time_var: str name of the time input variable
+            - power: int power the residuals are raised to
+
+        Usage as a weighting function of `Loss_handler.add_residual()`:
+
+            causal = Causal_binned_weighting((0,1),num_bins = 32)
+            losses.add_residual('collocation points',causal.residual_functions({'AllenCahn':AllenCahn}),weighting = causal)
+
+        `residual_functions()` shares the residual evaluation between the loss terms and the weighting so residuals are only calculated once.
+        The weights can also be calculated from a `Loss()` object with `from_loss()`
+        '''
+        self.time_interval = time_interval
+        self.num_bins = num_bins
+        self.eps = eps
+        self.time_var = time_var
+        self.power = power
+        self.residuals:Dict[str,Callable] = {}
+        self.bin_weights = None
+        self._last = None
+
+    def time_bins(self,t:torch.Tensor) -> torch.Tensor:
+        a,b = self.time_interval
+        return ((t - a)/(b - a)*self.num_bins).long().clamp(0,self.num_bins - 1)
+
+    def weights_from_residuals(self,t:torch.Tensor,*residuals:torch.Tensor) -> torch.Tensor:
+        '''
+        Per point causal weights from the time of each point and the residuals
+        '''
+        with torch.no_grad():
+            L = sum(r.reshape(-1).abs().pow(self.power) for r in residuals)/len(residuals)
+            bins = self.time_bins(t.reshape(-1))
+            sums = torch.zeros(self.num_bins,device = L.device,dtype = L.dtype).scatter_add_(0,bins,L)
+            counts = torch.zeros(self.num_bins,device = L.device,dtype = L.dtype).scatter_add_(0,bins,torch.ones_like(L))
+            bin_loss = sums/counts.clamp_min(1)
+            #Exclusive cumsum so the first bin always has weight 1
+            self.bin_weights = torch.exp(-self.eps*(torch.cumsum(bin_loss,0) - bin_loss))
+            return self.bin_weights[bins]
+
+    def residual_functions(self,residuals:Dict[str,Callable]) -> Dict[str,Callable]:
+        '''
+        Wrap the residual functions of a group so they are evaluated once per batch and shared with the weighting
+        '''
+        self.residuals = residuals
+        def shared_residual(name):
+            def causal_residual(group_input,group_output):
+                return self.evaluate(group_input,group_output)[0][name]
+            causal_residual.clear_cache = self.clear_cache
+            return causal_residual
+        return {name:shared_residual(name) for name in residuals}
+
+    def evaluate(self,group_input,group_output) -> Tuple[Dict[str,torch.Tensor],torch.Tensor]:
+        last = self._last
+        if last is not None and last[0] is group_input and last[1] is group_output:
+            return last[2],last[3]
+        assert len(self.residuals) > 0, 'No residual functions. Use residual_functions() to add them'
+        res = {name:func(group_input,group_output) for name,func in self.residuals.items()}
+        weights = self.weights_from_residuals(group_input.batchables[self.time_var],*res.values())
+        self._last = (group_input,group_output,res,weights)
+        return res,weights
+
+    def __call__(self,group_input,group_output) -> torch.Tensor:
+        return self.evaluate(group_input,group_output)[1]
+
+    def clear_cache(self):
+        '''
+        Drop the residuals of the last batch. Called by `Loss_handler.calculate()` after the group's terms so the group's graph is not kept alive
+        '''
+        self._last = None
+
+    def from_loss(self,loss,batch:dict,group:str) -> torch.Tensor:
+        '''
+        Causal weights of `group` from the residual terms of a `Loss()` object and the batch it was calculated from
+        '''
+        residuals = [r for term,r in zip(loss.terms,loss.residuals) if term.group == group and term.loss_type == 'residual']
+        assert len(residuals) > 0, f'No residual terms found for group {group}'
+        return self.weights_from_residuals(batch[group].batchables[self.time_var],*residuals)
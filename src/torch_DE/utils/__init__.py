@@ -1,7 +1,9 @@
 from .loss import Loss_handler
 from .sampling import R3_sampler,sample_from_tensor
 from .GridInterpolator import RegularGridInterpolator
-from .loss_weighting import GradNorm
+from .loss_weighting import GradNorm,GradNorm_batched,Causal_binned_weighting
 from .time import add_time,set_time
-__all__ = ['sample_from_tensor','set_time','Loss_handler','R3_sampler','RegularGridInterpolator','GradNorm','add_time']
+from .grf import GRF
+from .time_marching import TimeMarchingTrainer
+__all__ = ['sample_from_tensor','set_time','Loss_handler','R3_sampler','RegularGridInterpolator','GradNorm','GradNorm_batched','Causal_binned_weighting','add_time','GRF','TimeMarchingTrainer']
 
@@ -5,6 +5,7 @@ import numpy as np
 import warnings
 from typing import Dict,List,Tuple,Union,Iterator
 import inspect
+import math
 from torch_DE.utils.time import add_time
 from torch_DE.symbols import Variable_dict
 from torch import Tensor
@@ -111,6 +112,13 @@ class PINN_group():
 
         return PINN_group(self.name,inputs,self.batch_size,batchable_kwargs=batchable_kwargs,input_vars=self.input_vars,shuffle=self.shuffle,unbatched_kwargs=self.unbatchables)
 
+    def split(self,size:int) -> list:
+        '''
+        Split the group into consecutive `PINN_group` of at most `size` points. Used for micro-batching a batch
+        '''
+        return [PINN_group(self.name,self.batchables['input'][i:i+size],min(size,self.N - i),self.input_vars,batchable_kwargs = self.batchable_kwargs[i:i+size],
+                           unbatched_kwargs = self.unbatchables,shuffle = self.shuffle) for i in range(0,self.N,size)]
+
 
 class PINN_dataset(Dataset):
     '''
@@ -138,6 +146,14 @@ class PINN_dataset(Dataset):
         '''
         self.groups[name] = PINN_group(name,inputs,batch_size,batchable_kwargs = batchable_kwargs,input_vars=self.input_vars,shuffle=shuffle,unbatched_kwargs=unbatched_kwargs)
 
+    def register_group(self,group:PINN_group):
+        '''
+        Add an already constructed group to the dataset. Use this for group types other than `PINN_group()` e.g. `PINN_memmap_group()`.
+        The group must use the same input variables as the dataset
+        '''
+        assert list(group.input_vars) == list(self.input_vars), f'group input vars {group.input_vars} do not match the dataset input vars {self.input_vars}'
+        self.groups[group.name] = group
+
     def update_group(self,name,**kwargs):
         '''
         Update PINN_Group Attributes
@@ -146,20 +162,56 @@ class PINN_dataset(Dataset):
             - name: str Name of group
         
         Optional Keywords (args found in `PINN_Group()`):
-            - inputs: Tensor or List|Tuple inputs of group. This represents inputs to the network. For multiple inputs, use a tuple or list
+            - inputs: Tensor inputs of group. This represents inputs to the network.
+            - batchable_kwargs: dict of Tensors. Only the given keys are replaced, the other batchable kwargs are kept. `targets` is an alias
+            - unbatched_kwargs: dict of kwargs that are not batched
             - batch_size: int size of batch size to use for that group. 
-            - targets: Tensor or None. Target output that matches with the input. Use this for data driven conditions
             - shuffle: bool. Shuffles the data if true. Default is False
 
-        If multiple inputs are provided then it is assumed that the first dim size is the same across all inputs
+        If the new inputs and batchable kwargs have the same shapes as the current ones they are copied in place, so existing samplers, loaders
+        and prefetchers keep working. Otherwise the group is rebuilt and any loader must be recreated
         '''
         assert name in self.groups.keys(), 'Could not find the Pinn Group. Perhaps you misspelt it?'
 
         group = self.groups[name]
+        if 'targets' in kwargs:
+            kwargs['batchable_kwargs'] = {**kwargs.get('batchable_kwargs',{}),**kwargs.pop('targets')}
+        inputs = kwargs.pop('inputs',None)
+        batchable_kwargs = kwargs.pop('batchable_kwargs',None)
+        if 'unbatched_kwargs' in kwargs:
+            group.is_dict_OR_none(kwargs['unbatched_kwargs'])
+            group.unbatchables = kwargs.pop('unbatched_kwargs') or {}
+
         for attr,value in kwargs.items():
             assert hasattr(group,attr)
             setattr(group,attr,value)
 
+        if inputs is None and batchable_kwargs is None:
+            return
+        if type(group) is not PINN_group:
+            raise TypeError(f'inputs and batchable_kwargs can only be updated for PINN_group. Got {type(group)} instead')
+
+        batchable_kwargs = {} if batchable_kwargs is None else dict(batchable_kwargs)
+        same_shape = (inputs is None or tuple(inputs.shape) == tuple(group.batchables['input'].shape)) and \
+                     all(key in group.batchables_vars and tuple(value.shape) == tuple(group.batchables[key].shape) for key,value in batchable_kwargs.items())
+        if same_shape:
+            with torch.no_grad():
+                if inputs is not None:
+                    group.batchables['input'].copy_(inputs)
+                    for i,input_var in enumerate(group.input_vars):
+                        group.batchables[input_var].copy_(inputs[:,i])
+                for key,value in batchable_kwargs.items():
+                    group.batchables[key].copy_(value)
+            return
+
+        inputs = group.batchables['input'] if inputs is None else inputs
+        merged = {key:group.batchables[key] for key in group.batchables_vars if key not in batchable_kwargs}
+        merged.update(batchable_kwargs)
+        if len(merged) > 0:
+            group.same_size_values(merged,len(inputs))
+        self.groups[name] = PINN_group(name,inputs,min(group.batch_size,len(inputs)),group.input_vars,batchable_kwargs = merged or None,
+                                       unbatched_kwargs = group.unbatchables,shuffle = group.shuffle)
+
 
 
     def __len__(self) -> int: 
@@ -179,6 +231,22 @@ class PINN_dataset(Dataset):
         Return keys of groups
         '''
         return list(self.groups.keys())
+
+    def save(self,path:str):
+        '''
+        Save the dataset (group tensors, batchable and unbatched kwargs, batch sizes and shuffle flags) to a single binary file.
+        See `torch_DE.utils.dataset_io` for the format
+        '''
+        from torch_DE.utils.dataset_io import save_dataset
+        save_dataset(self,path)
+
+    @staticmethod
+    def load(path:str,mmap:bool = True) -> 'PINN_dataset':
+        '''
+        Load a dataset saved with `PINN_dataset.save()`. If mmap is True the tensors are memory mapped from the file rather than read into memory
+        '''
+        from torch_DE.utils.dataset_io import load_dataset
+        return load_dataset(path,mmap = mmap)
     
     def add_time(self,time_type,time_interval:Union[list,tuple] = None,point:float = None,dim:int = -1):
         '''
@@ -224,6 +292,10 @@ class PINN_sampler(Sampler):
         max_batches = max(num_batches.values())
 
         for group in groups.values():
+            if hasattr(group,'make_indices'):
+                #Group types that are too large to index explicitly generate their indices lazily
+                indices[group.name] = group.make_indices(max_batches*group.batch_size)
+                continue
             repeats = max_batches//num_batches[group.name]
             remainder = max_batches % num_batches[group.name]
             idx = torch.randperm(len(group)).repeat(repeats) if group.shuffle else torch.arange(len(group)).repeat(repeats)
@@ -255,6 +327,53 @@ class PINN_sampler(Sampler):
             yield batch
 
 
+class Lazy_permutation():
+    def __init__(self,N:int,length:int,shuffle:bool = True,rounds:int = 4) -> None:
+        '''
+        Indices for a group of N points evaluated lazily when sliced. Position k maps to a keyed Feistel network over `2*half_bits` bits (the smallest
+        even number of bits that covers N). Values outside `range(N)` are encrypted again (cycle walking) so the map is a random permutation of
+        `range(N)`. If shuffle is False the indices are in order. Only the sliced batch is ever stored in memory.
+
+        inputs:
+            - N: int number of points in group
+            - length: int total number of indices to generate (positions beyond N wrap around)
+            - shuffle: bool. If True the round keys are drawn randomly
+            - rounds: int number of Feistel rounds
+        '''
+        self.N = N
+        self.length = length
+        self.half_bits = max(1,math.ceil(math.log2(max(N,2))/2))
+        self.mask = (1 << self.half_bits) - 1
+        self.keys = [int(torch.randint(0,2**31 - 1,(1,))) for _ in range(rounds)] if shuffle and N > 1 else None
+
+    def __len__(self) -> int:
+        return self.length
+
+    def round_function(self,r:Tensor,key:int) -> Tensor:
+        #Integer hash of the right half. Intermediates are kept to 31 bits so the products fit in int64
+        x = ((r ^ key)*0x45d9f3b) & 0x7fffffff
+        x = ((x ^ (x >> 15))*0x2c1b3c6d) & 0x7fffffff
+        return (x ^ (x >> 13)) & self.mask
+
+    def encrypt(self,x:Tensor) -> Tensor:
+        left,right = x >> self.half_bits,x & self.mask
+        for key in self.keys:
+            left,right = right,left ^ self.round_function(right,key)
+        return (left << self.half_bits) | right
+
+    def __getitem__(self,idx:slice) -> Tensor:
+        assert isinstance(idx,slice), 'Lazy_permutation only supports slicing'
+        k = torch.arange(*idx.indices(self.length),dtype = torch.int64) % self.N
+        if self.keys is None:
+            return k
+        out = self.encrypt(k)
+        outside = out >= self.N
+        while outside.any():
+            out[outside] = self.encrypt(out[outside])
+            outside = out >= self.N
+        return out
+
+
 def PINN_Dataloader(dataset:PINN_dataset,**kwargs) -> DataLoader:
     '''
     Returns a native Pytorch Dataloader for PINN training in Torch_DE. Due to the way PINN dataset works the following keywords are not available for the DataLoader:
@@ -270,6 +389,9 @@ def PINN_Dataloader(dataset:PINN_dataset,**kwargs) -> DataLoader:
         - **kwargs: any sort of keywords for the Dataloader not found above
     Output:
         - Dataloader Object from Pytorch e.g torch.utils.data.Dataloader
+
+    Setting `num_workers > 0` pickles every batch of `PINN_group` objects through a queue. For multi-worker loading use
+    `torch_DE.utils.prefetch.PINN_Prefetcher()` instead which gathers batches straight into shared memory buffers.
     '''
     for kwarg in kwargs:
         if kwarg in ['batch_size','shuffle','sampler','batch_sampler','drop_last']:
@@ -0,0 +1,258 @@
+import torch
+import numpy as np
+import json
+import struct
+import hashlib
+import inspect
+import os
+from typing import Callable,Dict,Union,Any
+from torch import Tensor
+from torch_DE.utils.data import PINN_dataset,PINN_group
+from torch_DE.utils.memmap import PINN_memmap_group,Memmap_reader
+from torch_DE.utils.factorised import PINN_factorised_group
+
+'''
+Binary format for `PINN_dataset()`
+
+    magic (8 bytes) | version (uint32) | header length (uint64) | JSON header | tensor data
+
+Every tensor is stored contiguously and aligned to `ALIGNMENT` bytes. The header records the offset, dtype and shape of each tensor as well as the
+group batch sizes, shuffle flags and input variables. Loading with `mmap = True` maps the tensors straight from the file (copy on write)
+so no data is read until it is used.
+'''
+
+MAGIC = b'TORCHDE\x00'
+VERSION = 1
+ALIGNMENT = 64
+JSON_TYPES = (int,float,str,bool,type(None))
+
+
+def _numpy_dtype(dtype:torch.dtype) -> str:
+    name = str(dtype).replace('torch.','')
+    try:
+        np.dtype(name)
+    except TypeError:
+        raise TypeError(f'tensors of dtype {dtype} cannot be saved')
+    return name
+
+
+def _pad(f):
+    f.write(b'\x00'*(-f.tell() % ALIGNMENT))
+
+
+class _Blob_writer():
+    '''
+    Collects tensors while the header is built. The data offsets are relative to the start of the data section
+    '''
+    def __init__(self) -> None:
+        self.tensors = []
+        self.size = 0
+
+    def add(self,tensor:Tensor) -> dict:
+        array = tensor.detach().cpu().contiguous().numpy()
+        self.size += -self.size % ALIGNMENT
+        blob = {'offset':self.size,'dtype':_numpy_dtype(tensor.dtype),'shape':list(array.shape)}
+        self.tensors.append((self.size,array))
+        self.size += array.nbytes
+        return blob
+
+    def write(self,f,start:int):
+        for offset,array in self.tensors:
+            f.write(b'\x00'*(start + offset - f.tell()))
+            f.write(array.tobytes())
+
+
+def _save_value(value:Any,blobs:_Blob_writer) -> dict:
+    if isinstance(value,Tensor):
+        return {'tensor':blobs.add(value)}
+    elif isinstance(value,JSON_TYPES) or (isinstance(value,(list,tuple)) and all(isinstance(v,JSON_TYPES) for v in value)):
+        return {'value':value}
+    raise TypeError(f'unbatched kwargs can only be saved if they are tensors or JSON serialisable values. Got {type(value)} instead')
+
+
+def _group_header(group:PINN_group,blobs:_Blob_writer) -> dict:
+    header = {'name':group.name,'batch_size':group.batch_size,'shuffle':group.shuffle,'input_vars':list(group.input_vars),
+              'unbatched_kwargs':{key:_save_value(value,blobs) for key,value in group.unbatchables.items()}}
+
+    if type(group) is PINN_group:
+        header['type'] = 'tensor'
+        header['input'] = blobs.add(group.batchables['input'])
+        header['batchable_kwargs'] = {key:blobs.add(group.batchables[key]) for key in group.batchables_vars}
+    elif isinstance(group,PINN_memmap_group):
+        #The data already lives on disk so only store where to find it
+        reader = group.reader
+        header['type'] = 'memmap'
+        header['reader'] = {'path':os.path.abspath(reader.path),'dtype':None if reader.dtype is None else np.dtype(reader.dtype).str,
+                            'shape':None if reader.shape is None else list(reader.shape),'offset':reader.offset,
+                            'cache_pages':reader.cache_pages,'page_size':reader.page_size}
+        header['input_cols'] = group.input_cols
+        header['batchable_cols'] = group.batchable_cols
+        header['dtype'] = str(group.dtype).replace('torch.','')
+    elif isinstance(group,PINN_factorised_group):
+        header['type'] = 'factorised'
+        header['space_points'] = blobs.add(group.space_points)
+        header['time_points'] = None if group.time_points is None else blobs.add(group.time_points)
+        header['batchable_kwargs'] = {key:blobs.add(value) for key,value in group.batchable_kwargs.items()}
+        header['time_interval'] = None if group.time_interval is None else list(group.time_interval)
+        header['num_time'] = group.Nt
+        header['time_sampling'] = group.time_sampling
+        header['time_col'] = group.time_col
+    else:
+        raise TypeError(f'groups of type {type(group).__name__} cannot be saved')
+    return header
+
+
+def save_dataset(dataset:PINN_dataset,path:str) -> None:
+    '''
+    Save a `PINN_dataset()` to a single binary file. See `load_dataset()` to load it again.
+
+    Saved per group: inputs, batchable kwargs, unbatched kwargs (tensors or JSON serialisable values), batch size and shuffle flag
+    '''
+    blobs = _Blob_writer()
+    header = {'version':VERSION,'input_vars':list(dataset.input_vars),'groups':[_group_header(group,blobs) for group in dataset.groups.values()]}
+    header = json.dumps(header).encode('utf-8')
+
+    with open(path,'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<IQ',VERSION,len(header)))
+        f.write(header)
+        _pad(f)
+        blobs.write(f,f.tell())
+
+
+def _load_tensor(path:str,blob:dict,start:int,mmap:bool) -> Tensor:
+    dtype,shape = np.dtype(blob['dtype']),tuple(blob['shape'])
+    count = int(np.prod(shape))
+    if count == 0:
+        return torch.from_numpy(np.empty(shape,dtype = dtype))
+    if mmap:
+        array = np.memmap(path,dtype = dtype,mode = 'c',offset = start + blob['offset'],shape = shape)
+    else:
+        array = np.fromfile(path,dtype = dtype,count = count,offset = start + blob['offset']).reshape(shape)
+    return torch.from_numpy(array)
+
+
+def _load_value(path,value:dict,start:int,mmap:bool):
+    if 'tensor' in value:
+        return _load_tensor(path,value['tensor'],start,mmap)
+    return value['value']
+
+
+def load_dataset(path:str,mmap:bool = True) -> PINN_dataset:
+    '''
+    Load a `PINN_dataset()` saved with `save_dataset()` or `PINN_dataset.save()`
+
+    inputs:
+        - path: str path to file
+        - mmap: bool. If True the tensors are memory mapped from the file (zero copy, copy on write). Otherwise they are read into memory
+    '''
+    with open(path,'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a torch_DE dataset file')
+        version,header_len = struct.unpack('<IQ',f.read(12))
+        if version > VERSION:
+            raise ValueError(f'dataset file version {version} is newer than the supported version {VERSION}')
+        header = json.loads(f.read(header_len).decode('utf-8'))
+        start = f.tell() + (-f.tell() % ALIGNMENT)
+
+    dataset = PINN_dataset(header['input_vars'])
+    for g in header['groups']:
+        unbatched = {key:_load_value(path,value,start,mmap) for key,value in g['unbatched_kwargs'].items()}
+        if g['type'] == 'tensor':
+            inputs = _load_tensor(path,g['input'],start,mmap)
+            batchable_kwargs = {key:_load_tensor(path,blob,start,mmap) for key,blob in g['batchable_kwargs'].items()}
+            dataset.groups[g['name']] = PINN_group(g['name'],inputs,g['batch_size'],g['input_vars'],batchable_kwargs = batchable_kwargs or None,
+                                                   unbatched_kwargs = unbatched,shuffle = g['shuffle'])
+        elif g['type'] == 'memmap':
+            r = g['reader']
+            reader = Memmap_reader(r['path'],dtype = r['dtype'],shape = r['shape'],offset = r['offset'],cache_pages = r['cache_pages'],page_size = r['page_size'])
+            dataset.groups[g['name']] = PINN_memmap_group(g['name'],reader,g['batch_size'],g['input_vars'],input_cols = g['input_cols'],
+                                                          batchable_cols = g['batchable_cols'],unbatched_kwargs = unbatched,
+                                                          shuffle = g['shuffle'],dtype = getattr(torch,g['dtype']))
+        elif g['type'] == 'factorised':
+            time_points = None if g['time_points'] is None else _load_tensor(path,g['time_points'],start,mmap)
+            batchable_kwargs = {key:_load_tensor(path,blob,start,mmap) for key,blob in g['batchable_kwargs'].items()}
+            dataset.groups[g['name']] = PINN_factorised_group(g['name'],_load_tensor(path,g['space_points'],start,mmap),g['batch_size'],g['input_vars'],
+                                                              time_points = time_points,batchable_kwargs = batchable_kwargs,unbatched_kwargs = unbatched,
+                                                              time_interval = g['time_interval'],num_time = g['num_time'],time_sampling = g['time_sampling'],
+                                                              time_col = g['time_col'],shuffle = g['shuffle'])
+        else:
+            raise ValueError(f'Unknown group type {g["type"]} in {path}')
+    return dataset
+
+
+def _hash_update(h,obj):
+    '''
+    Feed a canonical byte representation of obj into the hash
+    '''
+    from torch_DE.geometry.shapes import Domain2D
+    h.update(type(obj).__name__.encode())
+    if isinstance(obj,Domain2D):
+        _hash_update(h,obj.Domain)
+        _hash_update(h,{name:(line,line_type) for name,(line,line_type) in obj.boundary_groups.items()})
+        _hash_update(h,{name:(line,line_type) for name,(line,line_type) in obj.partitions.items()})
+    elif hasattr(obj,'wkb'):
+        #shapely geometry
+        h.update(obj.wkb)
+    elif isinstance(obj,Tensor):
+        obj = obj.detach().cpu().contiguous()
+        h.update(f'{obj.dtype}{tuple(obj.shape)}'.encode())
+        h.update(obj.numpy().tobytes())
+    elif isinstance(obj,np.ndarray):
+        h.update(f'{obj.dtype}{obj.shape}'.encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj,dict):
+        for key in sorted(obj.keys(),key = str):
+            _hash_update(h,key)
+            _hash_update(h,obj[key])
+    elif isinstance(obj,(list,tuple)):
+        for o in obj:
+            _hash_update(h,o)
+    elif callable(obj):
+        h.update(getattr(obj,'__qualname__',repr(obj)).encode())
+        try:
+            h.update(inspect.getsource(obj).encode())
+        except (OSError,TypeError):
+            pass
+    else:
+        h.update(repr(obj).encode())
+
+
+def dataset_hash(*objects,**params) -> str:
+    '''
+    Hash of geometry and sampling parameters used as the key of the dataset cache. Understands `Domain2D()`, shapely geometry, tensors,
+    numpy arrays, containers, functions (by name and source) and anything with a stable `repr()`.
+    '''
+    h = hashlib.sha256()
+    h.update(f'torch_DE dataset v{VERSION}'.encode())
+    _hash_update(h,objects)
+    _hash_update(h,params)
+    return h.hexdigest()
+
+
+def cached_dataset(build:Callable[[],PINN_dataset],*key_objects,cache_dir:str = '.torch_DE_cache',mmap:bool = True,rebuild:bool = False,**key_params) -> PINN_dataset:
+    '''
+    Return a dataset from the cache or build and cache it.
+
+    inputs:
+        - build: function with no arguments that builds the `PINN_dataset()`
+        - *key_objects,**key_params: geometry (e.g. `Domain2D()`) and sampling parameters that determine the dataset. These are hashed with
+            `dataset_hash()` to create the cache key. Include the random seed if the dataset is built from random samples
+        - cache_dir: str directory to store the cached datasets in
+        - mmap: bool memory map the cached dataset. see `load_dataset()`
+        - rebuild: bool ignore and overwrite any existing cache entry
+
+    Example:
+        dataset = cached_dataset(lambda: make_dataset(domain,n),domain,n = 500_000,seed = 1234)
+    '''
+    os.makedirs(cache_dir,exist_ok = True)
+    path = os.path.join(cache_dir,f'{dataset_hash(*key_objects,**key_params)}.tde')
+    if os.path.exists(path) and not rebuild:
+        return load_dataset(path,mmap = mmap)
+
+    dataset = build()
+    #Write to a temporary file first so an interrupted save never leaves a corrupt cache entry
+    tmp_path = path + '.tmp'
+    save_dataset(dataset,tmp_path)
+    os.replace(tmp_path,path)
+    return dataset
@@ -0,0 +1,407 @@
+import math
+import traceback
+import torch
+import torch.multiprocessing as mp
+import shapely
+from shapely.geometry import LineString,MultiLineString,Polygon
+from shapely.ops import split,linemerge
+from typing import Dict,List,Tuple,Union,Callable
+from torch import Tensor
+from torch_DE.geometry.shapes import Domain2D
+from torch_DE.utils.data import PINN_Dataloader,PINN_dict
+
+'''
+Spatial domain decomposition (XPINN style). A `Domain2D()` is cut along its partitions into subdomains, each with its own network, dataset and
+optimizer. Neighbouring subdomains share interface points. Every `exchange_every` steps the workers send their interface values to the trainer,
+which averages both sides and writes the averages back in place as the targets of each worker's interface groups.
+The subdomains train in parallel worker processes so wall clock time scales with the number of cores.
+'''
+
+
+def line_pieces(geometry) -> List[LineString]:
+    '''
+    The LineStrings of a LineString, MultiLineString or GeometryCollection merged where they join. Points and empty geometries are dropped
+    '''
+    def collect(g):
+        if g.is_empty:
+            return []
+        if isinstance(g,LineString):
+            return [g] if g.length > 0 else []
+        return [line for part in getattr(g,'geoms',[]) for line in collect(part)]
+
+    lines = collect(geometry)
+    if len(lines) == 0:
+        return []
+    merged = linemerge(lines)
+    return list(merged.geoms) if isinstance(merged,MultiLineString) else [merged]
+
+
+def split_domain(domain:Domain2D,partitions:List[str] = None) -> List[Polygon]:
+    '''
+    Cut the domain with its partition lines (all partitions by default). The pieces are sorted by the x then y coordinate of their centroid
+    '''
+    pieces = [domain.Domain]
+    names = list(domain.partitions.keys()) if partitions is None else partitions
+    for name in names:
+        line,_ = domain.partitions[name]
+        cutter = MultiLineString(line_pieces(line))
+        pieces = [p for piece in pieces for p in split(piece,cutter).geoms if isinstance(p,Polygon) and p.area > 0]
+    return sorted(pieces,key = lambda p: (p.centroid.x,p.centroid.y))
+
+
+class Subdomain():
+    def __init__(self,index:int,polygon:Polygon,boundary_groups:Dict[str,tuple],interfaces:Dict[int,Tensor]) -> None:
+        '''
+        A piece of a decomposed domain. Passed to the problem factory of `Domain_decomposition_trainer()`
+
+        Attributes:
+            - index: int position of the subdomain
+            - name: str 'subdomain_{index}'
+            - polygon: shapely Polygon of the subdomain
+            - boundary_groups: dict of the original boundary groups clipped to the subdomain (same format as `Domain2D.boundary_groups`).
+                Groups that are split into several pieces are named '{name}_{k}'
+            - interfaces: dict neighbour index -> Tensor (M,2) of interface points. Both neighbours have the same points in the same order
+        '''
+        self.index = index
+        self.name = f'subdomain_{index}'
+        self.polygon = polygon
+        self.boundary_groups = boundary_groups
+        self.interfaces = interfaces
+
+    def domain(self) -> Domain2D:
+        '''
+        `Domain2D()` of the subdomain with the clipped boundary groups, use it to sample points
+        '''
+        domain = Domain2D(base = Polygon(self.polygon.exterior))
+        if len(self.polygon.interiors) > 0:
+            domain.remove(*[Polygon(hole) for hole in self.polygon.interiors])
+        domain.boundary_groups = dict(self.boundary_groups)
+        return domain
+
+
+def decompose(domain:Domain2D,partitions:List[str] = None,interface_points:int = 100) -> List[Subdomain]:
+    '''
+    Split a domain into `Subdomain()` objects along its partitions. interface_points is the number of points on each interface
+    (split between its pieces by length)
+    '''
+    polygons = split_domain(domain,partitions)
+    boundary_groups = [{} for _ in polygons]
+    for name,(line,line_type) in domain.boundary_groups.items():
+        for i,polygon in enumerate(polygons):
+            pieces = line_pieces(line.intersection(polygon))
+            for k,piece in enumerate(pieces):
+                boundary_groups[i][name if len(pieces) == 1 else f'{name}_{k}'] = (piece,line_type)
+
+    interfaces = [{} for _ in polygons]
+    for i in range(len(polygons)):
+        for j in range(i+1,len(polygons)):
+            pieces = line_pieces(polygons[i].boundary.intersection(polygons[j].boundary))
+            if len(pieces) == 0:
+                continue
+            total = sum(piece.length for piece in pieces)
+            points = torch.cat([Domain2D.generate_points_from_line(piece,max(2,round(interface_points*piece.length/total)),random = False)
+                                for piece in pieces]).to(torch.float32)
+            interfaces[i][j] = points
+            interfaces[j][i] = points
+
+    return [Subdomain(i,polygon,groups,links) for i,(polygon,groups,links) in enumerate(zip(polygons,boundary_groups,interfaces))]
+
+
+class Subdomain_worker():
+    def __init__(self,subdomain:Subdomain,factory:Callable,interface_vars:List[str],interface_weighting:float = 1.,time_points:Tensor = None,
+                 device = 'cpu',num_threads:int = None) -> None:
+        '''
+        Trains the problem of a single subdomain. Used by `Domain_decomposition_trainer()` either in a worker process or in the main process
+        '''
+        self.subdomain = subdomain
+        self.factory = factory
+        self.interface_vars = list(interface_vars)
+        self.interface_weighting = interface_weighting
+        self.time_points = time_points
+        self.device = device
+        self.num_threads = num_threads
+        self.history = []
+        #Interface terms are switched on after the first exchange
+        self.active = False
+
+    def interface_group(self,j:int) -> str:
+        return f'interface_{j}'
+
+    def interface_inputs(self,points:Tensor) -> Tensor:
+        if self.time_points is None:
+            return points
+        #Every interface point at every time point
+        t = self.time_points.to(points.dtype)
+        return torch.cat([points.repeat_interleave(len(t),dim = 0),t.repeat(len(points)).unsqueeze(-1)],dim = 1)
+
+    def setup(self) -> None:
+        if self.num_threads is not None:
+            torch.set_num_threads(self.num_threads)
+        problem = self.factory(self.subdomain)
+        for key in ('net','PINN','dataset','losses','optimizer'):
+            assert key in problem, f'The problem factory must return a dict with the key {key}'
+        self.net,self.PINN,self.dataset,self.losses,self.optimizer = [problem[key] for key in ('net','PINN','dataset','losses','optimizer')]
+        self.scheduler = problem.get('scheduler')
+        self.net.to(self.device)
+
+        for j,points in self.subdomain.interfaces.items():
+            inputs = self.interface_inputs(points)
+            targets = {f'{var}_target':torch.zeros(len(inputs)) for var in self.interface_vars}
+            self.dataset.add_group(self.interface_group(j),inputs,targets,batch_size = len(inputs),shuffle = False)
+        self.losses.update_dataset(self.dataset)
+        for j in self.subdomain.interfaces.keys():
+            self.losses.set_terms('interface',self.interface_group(j),{var:self.interface_residual(var) for var in self.interface_vars},
+                                  weighting = self.weighting)
+
+        self.loader = PINN_Dataloader(self.dataset)
+        self.iterator = iter(self.loader)
+
+    @staticmethod
+    def interface_residual(var:str) -> Callable:
+        def residual(group_input,group_output):
+            return group_output[var] - group_input.batchables[f'{var}_target']
+        return residual
+
+    def weighting(self,group_input,group_output) -> float:
+        return self.interface_weighting if self.active else 0.
+
+    def next_batch(self) -> PINN_dict:
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            self.iterator = iter(self.loader)
+            return next(self.iterator)
+
+    def train(self,num_steps:int) -> List[float]:
+        self.net.train()
+        for _ in range(num_steps):
+            batch = self.next_batch().to(self.device)
+            loss = self.losses(batch,self.PINN(batch))
+            loss.backward()
+            self.optimizer.step()
+            self.optimizer.zero_grad()
+            if self.scheduler is not None:
+                self.scheduler.step()
+        #Only the last loss of the round is synchronised
+        self.history.append(float(loss.sum().detach()))
+        return self.history[-1]
+
+    def interface_values(self) -> Dict[int,Dict[str,Tensor]]:
+        '''
+        Current values of the interface variables on every interface
+        '''
+        names = {j:self.interface_group(j) for j in self.subdomain.interfaces.keys()}
+        if len(names) == 0:
+            return {}
+        #subgroup copies the group so the dataset is not moved to the device
+        batch = PINN_dict({name:self.dataset.groups[name].subgroup(torch.arange(len(self.dataset.groups[name]))) for name in names.values()}).to(self.device)
+        output = self.PINN(batch)
+        return {j:{var:output[name][var].detach().cpu() for var in self.interface_vars} for j,name in names.items()}
+
+    def set_targets(self,targets:Dict[int,Dict[str,Tensor]]) -> None:
+        '''
+        Write the averaged interface values into the interface groups in place
+        '''
+        for j,values in targets.items():
+            group = self.dataset.groups[self.interface_group(j)]
+            for var,value in values.items():
+                target = group.batchables[f'{var}_target']
+                target.copy_(value.to(device = target.device,dtype = target.dtype))
+        self.active = True
+
+    def state(self) -> dict:
+        return {'net':self.net.cpu(),'history':self.history}
+
+
+class _Remote_traceback(Exception):
+    #Cause of errors raised in a worker so the worker's traceback is shown with them (same as concurrent.futures)
+    def __init__(self,trace:str) -> None:
+        self.trace = trace
+
+    def __str__(self) -> str:
+        return self.trace
+
+
+def _worker_loop(worker:Subdomain_worker,conn) -> None:
+    '''
+    Every reply is ('ok',value) or ('error',(exception,traceback)) so an error in the worker (e.g. in the user factory) is raised in the trainer
+    '''
+    try:
+        worker.setup()
+        conn.send(('ok',None))
+        while True:
+            command,arg = conn.recv()
+            if command == 'close':
+                break
+            elif command == 'train':
+                value = worker.train(arg)
+            elif command == 'values':
+                value = worker.interface_values()
+            elif command == 'targets':
+                value = worker.set_targets(arg)
+            elif command == 'state':
+                value = worker.state()
+            else:
+                raise ValueError(f'Unknown command {command}')
+            conn.send(('ok',value))
+    except Exception as e:
+        trace = traceback.format_exc()
+        try:
+            conn.send(('error',(e,trace)))
+        except Exception:
+            #The exception could not be pickled
+            conn.send(('error',(RuntimeError(repr(e)),trace)))
+    finally:
+        conn.close()
+
+
+def _receive(conn):
+    '''
+    Reply of a worker. Errors in the worker are raised here
+    '''
+    try:
+        status,value = conn.recv()
+    except EOFError:
+        raise RuntimeError('A subdomain worker exited without replying') from None
+    if status == 'error':
+        error,trace = value
+        raise error from _Remote_traceback(trace)
+    return value
+
+
+class Domain_decomposition_trainer():
+    def __init__(self,domain:Domain2D,factory:Callable,interface_vars:List[str] = ('u',),partitions:List[str] = None,interface_points:int = 100,
+                 exchange_every:int = 100,interface_weighting:float = 1.,time_points:Tensor = None,parallel:bool = True,num_threads:int = None,
+                 device = 'cpu') -> None:
+        '''
+        Train one network per subdomain of a domain cut by its partitions (see `Domain2D.partition_2points()`).
+
+        inputs:
+            - domain: `Domain2D()` with partitions
+            - factory: function factory(subdomain) -> dict with keys 'net', 'PINN', 'dataset', 'losses', 'optimizer' and optionally 'scheduler'.
+                It builds the problem of a `Subdomain()` e.g. samples points with `subdomain.domain()` and adds the boundary conditions of
+                `subdomain.boundary_groups`. The factory must be picklable (a module level function) when parallel is True
+            - interface_vars: list of outputs or derivatives (e.g. ['u','v','p','u_x']) made continuous across the interfaces. The PINN of every
+                subdomain must return them
+            - partitions: list of partition names to cut along. Default all partitions
+            - interface_points: int number of points on each interface
+            - exchange_every: int number of training steps between interface exchanges
+            - interface_weighting: float weight of the interface terms
+            - time_points: Tensor of time values. If given every interface point is repeated at every time (for unsteady problems with time as the last input)
+            - parallel: bool train each subdomain in its own process. Otherwise the subdomains are trained one after another in this process
+            - num_threads: int torch threads per worker. Default cpu count/number of subdomains when parallel
+            - device: device of the networks
+
+        The interface groups are named 'interface_{j}' (j the neighbour index) and have the loss type 'interface'. Their targets are the averages
+        of both sides' values and are updated in place after every exchange.
+        '''
+        self.domain = domain
+        self.factory = factory
+        self.interface_vars = list(interface_vars)
+        self.exchange_every = exchange_every
+        self.parallel = parallel
+        self.subdomains = decompose(domain,partitions,interface_points)
+        if num_threads is None and parallel:
+            num_threads = max(1,mp.cpu_count()//len(self.subdomains))
+        self.workers = [Subdomain_worker(subdomain,factory,self.interface_vars,interface_weighting,time_points,device,num_threads)
+                        for subdomain in self.subdomains]
+        self.results = None
+
+    def __len__(self):
+        return len(self.subdomains)
+
+    def average_targets(self,values:List[Dict[int,Dict[str,Tensor]]]) -> List[Dict[int,Dict[str,Tensor]]]:
+        '''
+        Average of both sides of every interface for every subdomain
+        '''
+        return [{j:{var:(values[i][j][var] + values[j][i][var])/2 for var in self.interface_vars} for j in subdomain.interfaces.keys()}
+                for i,subdomain in enumerate(self.subdomains)]
+
+    def train(self,num_steps:int) -> Dict[str,dict]:
+        '''
+        Train every subdomain for num_steps steps with an interface exchange every `exchange_every` steps.
+        Returns a dict subdomain name -> {'net':trained network,'history': total loss at the end of each round}
+        '''
+        rounds = [min(self.exchange_every,num_steps - start) for start in range(0,num_steps,self.exchange_every)]
+        if not self.parallel:
+            for worker in self.workers:
+                worker.setup()
+            for steps in rounds:
+                for worker in self.workers:
+                    worker.train(steps)
+                targets = self.average_targets([worker.interface_values() for worker in self.workers])
+                for worker,target in zip(self.workers,targets):
+                    worker.set_targets(target)
+            self.results = {subdomain.name:worker.state() for subdomain,worker in zip(self.subdomains,self.workers)}
+            return self.results
+
+        ctx = mp.get_context('spawn')
+        connections,processes = [],[]
+        closed = False
+        try:
+            for worker in self.workers:
+                parent_conn,child_conn = ctx.Pipe()
+                process = ctx.Process(target = _worker_loop,args = (worker,child_conn),daemon = True)
+                process.start()
+                #Only the worker holds its end so recv() raises EOFError if the worker dies
+                child_conn.close()
+                connections.append(parent_conn)
+                processes.append(process)
+            for conn in connections:
+                _receive(conn)
+
+            for steps in rounds:
+                #Send to every worker before waiting so the subdomains train at the same time
+                for conn in connections:
+                    conn.send(('train',steps))
+                for conn in connections:
+                    _receive(conn)
+                for conn in connections:
+                    conn.send(('values',None))
+                targets = self.average_targets([_receive(conn) for conn in connections])
+                for conn,target in zip(connections,targets):
+                    conn.send(('targets',target))
+                for conn in connections:
+                    _receive(conn)
+
+            for conn in connections:
+                conn.send(('state',None))
+            self.results = {subdomain.name:_receive(conn) for subdomain,conn in zip(self.subdomains,connections)}
+            for conn in connections:
+                conn.send(('close',None))
+            closed = True
+        finally:
+            #After an error the other workers may still be waiting for a command so they are terminated
+            for conn,process in zip(connections,processes):
+                if not closed and process.is_alive():
+                    process.terminate()
+                process.join()
+                conn.close()
+        return self.results
+
+    def subdomain_index(self,xy:Tensor) -> Tensor:
+        '''
+        Index of the subdomain containing each point (N,2). Points on an interface go to the first subdomain. Points outside every subdomain get -1
+        '''
+        x,y = xy[:,0].detach().cpu().numpy(),xy[:,1].detach().cpu().numpy()
+        index = torch.full((len(xy),),-1,dtype = torch.int64)
+        for i,subdomain in enumerate(self.subdomains):
+            inside = torch.from_numpy(shapely.contains_xy(subdomain.polygon.buffer(1e-9),x,y))
+            index[(index == -1) & inside] = i
+        return index
+
+    def predict(self,x:Tensor) -> Tensor:
+        '''
+        Evaluate the trained networks, each point with the network of its subdomain
+        '''
+        assert self.results is not None, 'Call train() first'
+        index = self.subdomain_index(x[:,:2])
+        out = None
+        for i,subdomain in enumerate(self.subdomains):
+            mask = (index == i).to(x.device)
+            if mask.any():
+                u = self.results[subdomain.name]['net'].to(x.device)(x[mask])
+                if out is None:
+                    out = torch.full((len(x),u.shape[-1]),float('nan'),dtype = u.dtype,device = x.device)
+                out[mask] = u
+        return out
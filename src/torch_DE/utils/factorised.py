@@ -0,0 +1,171 @@
+import torch
+from typing import Dict,List,Union,Tuple
+from torch import Tensor
+from torch_DE.utils.data import PINN_group,Lazy_permutation
+
+
+def factorised_inputs(space:Tensor,t:Tensor,time_col:int = -1) -> Tensor:
+    '''
+    Join spatial points of shape (B,D-1) and time values of shape (B) into network inputs of shape (B,D) with the time in column `time_col`
+    '''
+    D = space.shape[1] + 1
+    col = time_col % D
+    return torch.cat([space[:,:col],t.unsqueeze(-1),space[:,col:]],dim = 1)
+
+
+class Factorised_sampler():
+    '''
+    Index arithmetic shared by `PINN_factorised_group()` and its prefetch source. Flat index k maps to space point `k % Ns` and time slab `k // Ns`
+    '''
+    def __init__(self,space:Tensor,times:Tensor,time_interval:Union[Tuple,None],time_sampling:str,time_col:int) -> None:
+        self.space = space
+        self.times = times
+        self.time_interval = time_interval
+        self.time_sampling = time_sampling
+        self.time_col = time_col
+        self.Ns = space.shape[0]
+        self.Nt = times.shape[0] if times is not None else None
+
+    def time_values(self,t_idx:Tensor) -> Tensor:
+        if self.time_sampling == 'grid':
+            return self.times[t_idx]
+        #Stratified: a uniform random time inside each slab
+        a,b = self.time_interval
+        U = torch.rand(t_idx.shape,device = t_idx.device,dtype = self.space.dtype)
+        return a + (t_idx.to(self.space.dtype) + U)*(b-a)/self.Nt
+
+    def split(self,idx:Tensor) -> Tuple[Tensor,Tensor]:
+        return idx % self.Ns,idx // self.Ns
+
+    def inputs(self,idx:Tensor) -> Tensor:
+        s_idx,t_idx = self.split(idx.to(self.space.device))
+        return factorised_inputs(self.space[s_idx],self.time_values(t_idx),self.time_col)
+
+
+class Factorised_source():
+    '''
+    Prefetch source for `PINN_factorised_group()` see `torch_DE.utils.prefetch.PINN_Prefetcher()`. Only the spatial points and time slabs are
+    shared with the workers, the batch is materialised in the worker
+    '''
+    def __init__(self,sampler:Factorised_sampler,batchable_kwargs:Dict[str,Tensor]) -> None:
+        self.sampler = sampler
+        self.batchable_kwargs = batchable_kwargs
+        for tensor in [sampler.space,*batchable_kwargs.values()] + ([sampler.times] if sampler.times is not None else []):
+            tensor.share_memory_()
+
+    def buffer_spec(self):
+        D = self.sampler.space.shape[1] + 1
+        spec = {'input':((D,),self.sampler.space.dtype)}
+        spec.update({key:(tuple(value.shape[1:]),value.dtype) for key,value in self.batchable_kwargs.items()})
+        return spec
+
+    def gather(self,idx:Tensor,out:Dict[str,Tensor]) -> None:
+        out['input'].copy_(self.sampler.inputs(idx))
+        s_idx,_ = self.sampler.split(idx)
+        for key,value in self.batchable_kwargs.items():
+            torch.index_select(value,0,s_idx,out = out[key])
+
+
+class PINN_factorised_group(PINN_group):
+    def __init__(self,name:str,space_points:Tensor,batch_size:int,input_vars:List[str],time_points:Tensor = None,batchable_kwargs:dict = None,
+                 unbatched_kwargs:dict = None,*,time_interval:Union[List,Tuple] = None,num_time:int = None,time_sampling:str = 'grid',
+                 time_col:int = -1,shuffle:bool = False) -> None:
+        '''
+        Tensor product (factorised) space x time group. Stores `Ns` spatial points and `Nt` time points separately and represents all
+        `Ns*Nt` (x,y,t) points without storing them. Batches are materialised from index arithmetic when the group is sliced, so memory scales with
+        `Ns + Nt` rather than `Ns*Nt`. Use this in place of `add_time()` and repeating initial/boundary points for every time sample.
+
+        inputs:
+            - name: str name of group
+            - space_points: Tensor of shape (Ns,D-1) of spatial points
+            - batch_size: int batch size
+            - input_vars: list[str] names of all input variables including time. Must be the same as the `PINN_dataset()`
+            - time_points: Tensor of shape (Nt) of time points. Only used with `time_sampling = 'grid'`.
+                If None then `num_time` evenly spaced points in `time_interval` are used
+            - batchable_kwargs: dict of tensors of length Ns. These are per spatial point and are shared across time (e.g. targets that do not change in time)
+            - unbatched_kwargs: dict of kwargs that are not batched
+            - time_interval: (a,b) time interval. Required for `time_sampling = 'stratified'`
+            - num_time: int number of time points or time slabs Nt
+            - time_sampling: str
+                - 'grid': use the fixed time points
+                - 'stratified': split `time_interval` into `num_time` slabs. Every time a point is batched, a new time is drawn uniformly inside its slab
+            - time_col: int the column of the time variable in the network input. Default -1 (last)
+            - shuffle: bool. Shuffles the data if true. Default is False
+
+        Add to a dataset with `PINN_dataset.register_group()`. `PINN_sampler()` generates this group's indices lazily so no `Ns*Nt` index tensor
+        is ever created.
+        '''
+        assert time_sampling in ('grid','stratified'), f'time_sampling must be either grid or stratified. Got {time_sampling} instead'
+        if time_sampling == 'grid' and time_points is None:
+            assert time_interval is not None and num_time is not None, 'time_points or both time_interval and num_time must be given'
+            time_points = torch.linspace(*time_interval,num_time,dtype = space_points.dtype,device = space_points.device)
+        if time_sampling == 'stratified':
+            assert time_interval is not None and num_time is not None, 'time_interval and num_time must be given for stratified time sampling'
+            time_points = None
+
+        self.name:str = name
+        self.batch_size:int = batch_size
+        self.input_vars:list[str] = input_vars
+        self.shuffle = shuffle
+        self.time_col = time_col
+        self.time_sampling = time_sampling
+        self.time_interval = time_interval
+
+        self.Ns = space_points.shape[0]
+        self.Nt = time_points.shape[0] if time_points is not None else num_time
+        self.N,self.D = self.Ns*self.Nt,space_points.shape[1] + 1
+        self.sampler = Factorised_sampler(space_points,time_points,time_interval,time_sampling,time_col)
+
+        self.is_dict_OR_none(batchable_kwargs)
+        batchable_kwargs = {} if batchable_kwargs is None else dict(batchable_kwargs)
+        self.shared_keys_check(dict.fromkeys(list(input_vars) + ['input']),batchable_kwargs)
+        self.same_size_values(batchable_kwargs,self.Ns)
+        self.batchable_kwargs = batchable_kwargs
+        self.batchables_vars:list[str] = list(batchable_kwargs.keys())
+        self.is_dict_OR_none(unbatched_kwargs)
+        self.unbatchables = unbatched_kwargs if isinstance(unbatched_kwargs,dict) else {}
+        self.checks()
+
+    @property
+    def space_points(self) -> Tensor:
+        return self.sampler.space
+
+    @property
+    def time_points(self) -> Union[Tensor,None]:
+        return self.sampler.times
+
+    def checks(self):
+        assert self.batch_size <= self.__len__()
+        assert len(self.input_vars) == self.D
+
+    def to(self,*args,**kwargs):
+        for key,x in self.unbatchables.items():
+            if hasattr(x,'to'):
+                self.unbatchables[key] = x.to(*args,**kwargs)
+        self.batchable_kwargs = {key:x.to(*args,**kwargs) for key,x in self.batchable_kwargs.items()}
+        self.sampler.space = self.sampler.space.to(*args,**kwargs)
+        if self.sampler.times is not None:
+            self.sampler.times = self.sampler.times.to(*args,**kwargs)
+        return self
+
+    def make_indices(self,length:int) -> Lazy_permutation:
+        '''
+        Called by `PINN_sampler()`. Returns lazily evaluated indices
+        '''
+        return Lazy_permutation(self.N,length,self.shuffle)
+
+    def subgroup(self,idx) -> PINN_group:
+        '''
+        Materialise the (x,y,t) points of `idx` and return a regular `PINN_group` holding the batch
+        '''
+        idx = torch.as_tensor(idx)
+        inputs = self.sampler.inputs(idx)
+        s_idx,_ = self.sampler.split(idx.to(inputs.device))
+        batchable_kwargs = {key:value[s_idx] for key,value in self.batchable_kwargs.items()}
+        return PINN_group(self.name,inputs,self.batch_size,self.input_vars,batchable_kwargs = batchable_kwargs or None,
+                          unbatched_kwargs = self.unbatchables,shuffle = self.shuffle)
+
+    def prefetch_source(self) -> Factorised_source:
+        sampler = Factorised_sampler(self.sampler.space.detach().cpu(),None if self.sampler.times is None else self.sampler.times.detach().cpu(),
+                                     self.time_interval,self.time_sampling,self.time_col)
+        return Factorised_source(sampler,{key:value.detach().cpu() for key,value in self.batchable_kwargs.items()})
@@ -0,0 +1,189 @@
+import torch
+import math
+from collections import OrderedDict
+from itertools import product
+from typing import Tuple,List,Union,Dict
+from torch import Tensor
+from torch_DE.utils.GridInterpolator import RegularGridInterpolator
+
+'''
+Gaussian random fields (GRF) on regular grids for operator learning e.g. random initial conditions or forcing fields for `DeepONet()`.
+The grids are the same as `RegularGridInterpolator()`: a tuple of 1D axes.
+'''
+
+#Decompositions are expensive (KL is an eigendecomposition of an (N,N) covariance) so they are shared by every GRF with the same covariance and grid.
+#Each one can hold an (N,num_modes) basis so only the MAX_CACHED_DECOMPOSITIONS most recently used are kept
+MAX_CACHED_DECOMPOSITIONS = 8
+_decomposition_cache:Dict[tuple,Tensor] = OrderedDict()
+
+
+def covariance_kernel(r:Tensor,kernel:str = 'rbf',length_scale:float = 0.1,variance:float = 1.,nu:float = 2.5) -> Tensor:
+    '''
+    Stationary covariance as a function of the distance r.
+
+    inputs:
+        - kernel: str 'rbf' (squared exponential) or 'matern'
+        - length_scale: float
+        - variance: float
+        - nu: float smoothness of the matern kernel. One of 0.5, 1.5 or 2.5
+    '''
+    s = r/length_scale
+    if kernel == 'rbf':
+        return variance*torch.exp(-0.5*s**2)
+    elif kernel == 'matern':
+        if nu == 0.5:
+            return variance*torch.exp(-s)
+        elif nu == 1.5:
+            return variance*(1 + math.sqrt(3)*s)*torch.exp(-math.sqrt(3)*s)
+        elif nu == 2.5:
+            return variance*(1 + math.sqrt(5)*s + 5/3*s**2)*torch.exp(-math.sqrt(5)*s)
+        raise ValueError(f'nu must be one of 0.5, 1.5 or 2.5. Got {nu} instead')
+    raise ValueError(f'kernel must be either \'rbf\' or \'matern\'. Got {kernel} instead')
+
+
+class GRF():
+    def __init__(self,axes:Union[Tuple[Tensor],List[Tensor]],kernel:str = 'rbf',length_scale:float = 0.1,variance:float = 1.,nu:float = 2.5,
+                 method:str = 'KL',num_modes:int = None,energy:float = 0.9999,device = 'cpu',dtype = torch.float32) -> None:
+        '''
+        Generator of zero mean Gaussian random fields on a regular grid.
+
+        inputs:
+            - axes: tuple of 1D Tensors. The grid points along each dimension (e.g. `(torch.linspace(0,1,128),)`)
+            - kernel,length_scale,variance,nu: covariance of the field, see `covariance_kernel()`
+            - method: str
+                - 'KL': Karhunen-Loeve expansion. The covariance matrix of all grid points is eigendecomposed once. Works for any grid
+                - 'FFT': spectral sampling with circulant embedding. The fields are periodic over the grid (period = number of points*spacing).
+                    Needs uniformly spaced axes but scales to large grids
+            - num_modes: int number of KL modes to keep. Default the smallest number of modes containing `energy` of the variance
+            - energy: float fraction of the variance kept when num_modes is None
+            - device,dtype: device and dtype of the samples
+
+        Use `sample()` for a batch of fields, `sensors()` for the branch input of an operator network and `add_to_dataset()` to add
+        a group with the sensor values and the field values at the group's points.
+        '''
+        if method not in ('KL','FFT'):
+            raise ValueError(f'method must be either \'KL\' or \'FFT\'. Got {method} instead')
+        self.axes = tuple(torch.as_tensor(a,dtype = torch.float64).cpu() for a in axes)
+        self.shape = tuple(len(a) for a in self.axes)
+        self.dims = len(self.axes)
+        self.kernel = dict(kernel = kernel,length_scale = length_scale,variance = variance,nu = nu)
+        self.method = method
+        self.device = device
+        self.dtype = dtype
+
+        key = (method,kernel,length_scale,variance,nu,num_modes,energy,tuple(tuple(a.tolist()) for a in self.axes))
+        if key in _decomposition_cache:
+            _decomposition_cache.move_to_end(key)
+        else:
+            _decomposition_cache[key] = self.KL_basis(num_modes,energy) if method == 'KL' else self.FFT_spectrum()
+            while len(_decomposition_cache) > MAX_CACHED_DECOMPOSITIONS:
+                _decomposition_cache.popitem(last = False)
+        self.decomposition = _decomposition_cache[key].to(device = device,dtype = dtype)
+
+    def grid_points(self) -> Tensor:
+        '''
+        All grid points as a Tensor of shape (N,dims) in the same order as the flattened fields
+        '''
+        return torch.stack(torch.meshgrid(*self.axes,indexing = 'ij'),dim = -1).reshape(-1,self.dims)
+
+    def KL_basis(self,num_modes:int = None,energy:float = 0.9999) -> Tensor:
+        '''
+        Scaled eigenvectors sqrt(lambda_k)*phi_k of the covariance matrix of the grid points. Returns a Tensor of shape (N,num_modes)
+        '''
+        x = self.grid_points()
+        C = covariance_kernel(torch.cdist(x,x),**self.kernel)
+        eigvals,eigvecs = torch.linalg.eigh(C)
+        eigvals,eigvecs = eigvals.flip(0).clamp_min(0),eigvecs.flip(1)
+        if num_modes is None:
+            num_modes = int(torch.searchsorted(torch.cumsum(eigvals,0)/eigvals.sum(),torch.tensor(energy,dtype = eigvals.dtype))) + 1
+        num_modes = min(num_modes,len(eigvals))
+        return eigvecs[:,:num_modes]*eigvals[:num_modes].sqrt()
+
+    def FFT_spectrum(self) -> Tensor:
+        '''
+        Square root of the eigenvalues of the periodic (circulant) covariance of the grid. Returns a Tensor of shape rfftn(grid)
+        '''
+        lags = []
+        for a in self.axes:
+            n,h = len(a),float(a[1] - a[0]) if len(a) > 1 else 1.
+            #Axes are often float32 linspaces so allow for their rounding
+            assert torch.allclose(a[1:] - a[:-1],torch.tensor(h,dtype = a.dtype),rtol = 1e-3,atol = 0.), 'FFT sampling needs uniformly spaced axes'
+            k = torch.arange(n,dtype = torch.float64)
+            lags.append(torch.minimum(k,n - k)*h)
+        r = torch.stack(torch.meshgrid(*lags,indexing = 'ij'),dim = 0).pow(2).sum(0).sqrt()
+        c = covariance_kernel(r,**self.kernel)
+        return torch.fft.rfftn(c).real.clamp_min(0).sqrt()
+
+    @property
+    def num_modes(self) -> int:
+        return self.decomposition.shape[-1] if self.method == 'KL' else math.prod(self.shape)
+
+    def sample(self,num_functions:int,generator:torch.Generator = None) -> Tensor:
+        '''
+        Sample num_functions fields. Returns a Tensor of shape (num_functions,*grid shape)
+        '''
+        if self.method == 'KL':
+            z = torch.randn(num_functions,self.num_modes,generator = generator,device = self.device,dtype = self.dtype)
+            return (z @ self.decomposition.T).reshape(num_functions,*self.shape)
+
+        w = torch.randn(num_functions,*self.shape,generator = generator,device = self.device,dtype = self.dtype)
+        dims = tuple(range(1,self.dims + 1))
+        return torch.fft.irfftn(self.decomposition*torch.fft.rfftn(w,dim = dims),s = self.shape,dim = dims)
+
+    @staticmethod
+    def sensors(values:Tensor) -> Tensor:
+        '''
+        Flatten fields of shape (F,*grid shape) to the sensor values (F,N) used as the branch input of an operator network
+        '''
+        return values.reshape(values.shape[0],-1)
+
+    def interpolate(self,values:Tensor,x:Tensor) -> Tensor:
+        '''
+        Multilinear interpolation of F fields (F,*grid shape) at the points x (B,dims) in one batched gather. Returns a Tensor of shape (F,B).
+        Points outside the grid are clamped to the edge cells
+        '''
+        idx,t = [],[]
+        for i,a in enumerate(self.axes):
+            a = a.to(device = x.device,dtype = x.dtype)
+            j = (torch.searchsorted(a,x[:,i].contiguous()) - 1).clamp(0,len(a) - 2)
+            idx.append(j)
+            t.append(((x[:,i] - a[j])/(a[j+1] - a[j])).clamp(0,1))
+
+        out = 0.
+        for corner in product((0,1),repeat = self.dims):
+            w = 1.
+            for c,t_i in zip(corner,t):
+                w = w*(t_i if c else 1 - t_i)
+            out = out + w*values[(slice(None),) + tuple(j + c for j,c in zip(idx,corner))]
+        return out
+
+    def interpolators(self,values:Tensor) -> List[RegularGridInterpolator]:
+        '''
+        A `RegularGridInterpolator()` for each field of shape (F,*grid shape)
+        '''
+        axes = tuple(a.to(dtype = values.dtype) for a in self.axes)
+        return [RegularGridInterpolator(axes,v) for v in values]
+
+    def add_to_dataset(self,dataset,name:str,inputs:Tensor,num_functions:int,batch_size:int,shuffle:bool = True,key:str = 'u',
+                       columns:List[int] = None,generator:torch.Generator = None) -> Tensor:
+        '''
+        Sample num_functions fields and add them as a group of a `PINN_dataset()`. The sensor values (F,N) are stored as the unbatched kwarg
+        'sensors' (the branch input) and the field values at the group's points as the batchable kwarg `key` of shape (points,F)
+        so every batch has the target of each function at its points.
+
+        inputs:
+            - dataset: `PINN_dataset()`
+            - name: str name of the group
+            - inputs: Tensor (points,input dims) of the group
+            - columns: list of the input columns that are the grid dimensions. Default the first `dims` columns
+        Returns the sampled fields
+        '''
+        values = self.sample(num_functions,generator)
+        columns = list(range(self.dims)) if columns is None else columns
+        at_points = self.interpolate(values,inputs[:,columns].to(device = values.device,dtype = values.dtype)).T
+        dataset.add_group(name,inputs,{key:at_points},batch_size = batch_size,shuffle = shuffle,unbatched_kwargs = {'sensors':self.sensors(values)})
+        return values
+
+    @staticmethod
+    def clear_cache():
+        _decomposition_cache.clear()
@@ -0,0 +1,175 @@
+import torch
+from typing import Dict,List,Union,Tuple
+from torch import Tensor
+from torch_DE.utils.data import PINN_group
+
+
+def grid_points(axes:List[Tensor]) -> Tensor:
+    '''
+    Flattened (row-major) points of the tensor product of 1D axes. Returns a Tensor of shape (prod(len(axis)),D)
+    '''
+    return torch.stack(torch.meshgrid(*axes,indexing = 'ij'),dim = -1).reshape(-1,len(axes))
+
+
+def tile_corners(grid_shape:Tuple[int],block_shape:Tuple[int],halo:int) -> Tensor:
+    '''
+    Corners (relative to the halo) of blocks that tile the interior of the grid in order. If a block does not divide the interior the last block
+    of each axis is moved back to end on the last interior point so it overlaps its neighbour rather than leaving points unsampled
+    '''
+    tiles = []
+    for n,b in zip(grid_shape,block_shape):
+        high = n - b - 2*halo + 1
+        t = torch.arange(0,high,b)
+        if t[-1] < high - 1:
+            t = torch.cat([t,torch.tensor([high - 1])])
+        tiles.append(t)
+    return grid_points(tiles).to(torch.int64)
+
+
+class Grid_block_indices():
+    def __init__(self,grid_shape:Tuple[int],block_shape:Tuple[int],halo:int,num_batches:int,shuffle:bool) -> None:
+        '''
+        Lazily evaluated indices for `PINN_grid_group()`. Every batch is a sub-block of the grid. The indices of a batch are the flattened (row-major)
+        grid indices of the block. If shuffle the block corners are random otherwise the grid is tiled in order.
+        '''
+        self.grid_shape = grid_shape
+        self.block_shape = block_shape
+        self.batch_size = int(torch.tensor(block_shape).prod())
+        self.length = num_batches*self.batch_size
+
+        #Corners are chosen so the block plus its halo always lies inside the grid
+        high = [n - b - 2*halo + 1 for n,b in zip(grid_shape,block_shape)]
+        if shuffle:
+            corners = torch.stack([torch.randint(0,h,(num_batches,)) for h in high],dim = -1)
+        else:
+            corners = tile_corners(grid_shape,block_shape,halo)
+            corners = corners.repeat(num_batches//len(corners) + 1,1)[:num_batches]
+        self.corners = corners + halo
+
+        strides = [1]
+        for n in reversed(grid_shape[1:]):
+            strides.insert(0,strides[0]*n)
+        self.strides = torch.tensor(strides)
+        self.offsets = (grid_points([torch.arange(b) for b in block_shape]).to(torch.int64)*self.strides).sum(-1)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self,idx:slice) -> Tensor:
+        assert isinstance(idx,slice), 'Grid_block_indices only supports slicing'
+        start,stop,_ = idx.indices(self.length)
+        batches = range(start//self.batch_size,(stop + self.batch_size - 1)//self.batch_size)
+        return torch.cat([(self.corners[i]*self.strides).sum() + self.offsets for i in batches])
+
+
+class PINN_grid_group(PINN_group):
+    def __init__(self,name:str,axes:List[Tensor],block_shape:Tuple[int],input_vars:List[str],batchable_kwargs:dict = None,unbatched_kwargs:dict = None,
+                 *,halo:int = 1,shuffle:bool = False) -> None:
+        '''
+        Collocation group on a regular grid. Each batch is a sub-block of the grid of shape `block_shape` and the batch size is `prod(block_shape)`.
+
+        Along with the block itself, the batch carries the block extended by `halo` points in every direction as the unbatched kwargs
+        `grid_points`, `grid_shape`, `grid_spacing` and `grid_halo`. `Grid_FD_engine()` evaluates the network once on these points and
+        takes all finite differences from neighbouring grid values. This avoids the 2*D extra stencil evaluations of `FD_engine()`.
+        The 1D axes of the block itself are stored as `block_axes`, which `Separable_engine()` uses to evaluate a `Separable_Net()` with
+        an outer product (use halo = 0 for separable networks).
+
+        inputs:
+            - name: str name of group
+            - axes: list of 1D Tensors with evenly spaced coordinates of each input variable (in the same order as input_vars)
+            - block_shape: tuple[int] shape of the block used for each batch
+            - input_vars: list[str] names of the input variables. Must be the same as the `PINN_dataset()`
+            - batchable_kwargs: dict of tensors with the same shape as the grid (or flattened grid)
+            - unbatched_kwargs: dict of kwargs that are not batched
+            - halo: int width of the halo. 1 is enough for second order central differences (including mixed derivatives)
+            - shuffle: bool. If True blocks are placed randomly, otherwise the grid is tiled in order
+
+        Points within `halo` of the grid edge are only ever used as neighbours. Use boundary groups for the grid edges.
+        Add to a dataset with `PINN_dataset.register_group()`.
+        '''
+        assert len(axes) == len(block_shape) == len(input_vars), 'axes, block_shape and input_vars must have the same length'
+        self.name:str = name
+        self.input_vars:list[str] = input_vars
+        self.axes = [torch.as_tensor(axis) for axis in axes]
+        self.grid_shape = tuple(len(axis) for axis in self.axes)
+        self.block_shape = tuple(block_shape)
+        self.halo = halo
+        self.shuffle = shuffle
+        self.batch_size:int = int(torch.tensor(block_shape).prod())
+        self.spacing = []
+        for axis in self.axes:
+            dx = axis[1:] - axis[:-1]
+            assert torch.allclose(dx,dx[0].expand_as(dx)), 'Grid axes must be evenly spaced'
+            self.spacing.append(float(dx[0]))
+        self.spacing = tuple(self.spacing)
+
+        self.N = int(torch.tensor([n - 2*halo for n in self.grid_shape]).prod())
+        self.D = len(axes)
+
+        self.is_dict_OR_none(batchable_kwargs)
+        batchable_kwargs = {} if batchable_kwargs is None else dict(batchable_kwargs)
+        self.shared_keys_check(dict.fromkeys(list(input_vars) + ['input']),batchable_kwargs)
+        grid_size = int(torch.tensor(self.grid_shape).prod())
+        self.batchable_kwargs = {key:value.reshape(grid_size,*value.shape[self.D:]) if value.shape[:self.D] == self.grid_shape else value
+                                 for key,value in batchable_kwargs.items()}
+        self.same_size_values(self.batchable_kwargs,grid_size)
+        self.batchables_vars:list[str] = list(self.batchable_kwargs.keys())
+        self.is_dict_OR_none(unbatched_kwargs)
+        self.unbatchables = unbatched_kwargs if isinstance(unbatched_kwargs,dict) else {}
+        self.checks()
+
+    def __len__(self):
+        #Without shuffling an epoch visits every tile, which can be more than N//batch_size blocks when the last tiles overlap
+        if self.shuffle:
+            return int(self.N)
+        return len(tile_corners(self.grid_shape,self.block_shape,self.halo))*self.batch_size
+
+    def checks(self):
+        for n,b in zip(self.grid_shape,self.block_shape):
+            assert b + 2*self.halo <= n, f'block of size {b} with halo {self.halo} does not fit in a grid axis of size {n}'
+
+    def to(self,*args,**kwargs):
+        for key,x in self.unbatchables.items():
+            if hasattr(x,'to'):
+                self.unbatchables[key] = x.to(*args,**kwargs)
+        self.batchable_kwargs = {key:x.to(*args,**kwargs) for key,x in self.batchable_kwargs.items()}
+        self.axes = [axis.to(*args,**kwargs) for axis in self.axes]
+        return self
+
+    def make_indices(self,length:int) -> Grid_block_indices:
+        '''
+        Called by `PINN_sampler()`. Returns the indices of one block per batch
+        '''
+        return Grid_block_indices(self.grid_shape,self.block_shape,self.halo,length//self.batch_size,self.shuffle)
+
+    def block_corner(self,idx:Tensor) -> List[int]:
+        #The first index of a block is its corner
+        corner,flat = [],int(idx[0])
+        for n in reversed(self.grid_shape):
+            corner.insert(0,flat % n)
+            flat //= n
+        return corner
+
+    def subgroup(self,idx) -> PINN_group:
+        '''
+        Return the block starting at the corner given by `idx` as a regular `PINN_group`. The block with its halo is stored in the unbatched kwargs
+        '''
+        idx = torch.as_tensor(idx)
+        assert len(idx) == self.batch_size, 'grid groups must be indexed one block at a time'
+        corner = self.block_corner(idx)
+        h = self.halo
+        block_axes = [axis[c:c+b] for axis,c,b in zip(self.axes,corner,self.block_shape)]
+        halo_axes = [axis[c-h:c+b+h] for axis,c,b in zip(self.axes,corner,self.block_shape)]
+
+        unbatched_kwargs = {**self.unbatchables,
+                            'grid_points':grid_points(halo_axes),
+                            'grid_shape':tuple(len(axis) for axis in halo_axes),
+                            'grid_spacing':self.spacing,
+                            'grid_halo':h,
+                            'block_axes':block_axes}
+        batchable_kwargs = {key:value[idx.to(value.device)] for key,value in self.batchable_kwargs.items()}
+        return PINN_group(self.name,grid_points(block_axes),self.batch_size,self.input_vars,batchable_kwargs = batchable_kwargs or None,
+                          unbatched_kwargs = unbatched_kwargs,shuffle = self.shuffle)
+
+    def prefetch_source(self):
+        raise TypeError('The halo of grid groups changes with every batch so grid groups cannot be prefetched. Use PINN_Dataloader() instead')
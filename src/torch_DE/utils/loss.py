@@ -7,6 +7,8 @@ import torch.utils.data
 from torch_DE.utils.loss_weighting import GradNorm,Causal_weighting
 from torch_DE.utils.data import PINN_dict,PINN_dataset,PINN_group
 from torch_DE.equations.de_func import DE_func
+from torch_DE.symbols.compiler import compile_equations
+from sympy import Basic
 import pandas as pd
 
 
@@ -15,59 +17,151 @@ from functools import wraps
 from torch import Tensor,TensorType
 
 
+def _reduce_kernel(R:Tensor,W:Tensor,power:Union[int,None],mean:bool) -> Tensor:
+    E = W*(R.abs().pow(power) if power is not None else R)
+    E = E.reshape(E.shape[0],-1)
+    return E.mean(1) if mean else E.sum(1)
+
+_fused_kernel = _reduce_kernel
+
+def compile_fused_reduction(enable:bool = True,**compile_kwargs) -> None:
+    '''
+    Use `torch.compile()` for the fused residual reduction of `Loss()`. `compile_kwargs` are passed to `torch.compile()`.
+    Call with enable = False to go back to eager mode
+    '''
+    global _fused_kernel
+    _fused_kernel = torch.compile(_reduce_kernel,dynamic = True,**compile_kwargs) if enable else _reduce_kernel
+
+
+def fused_reduction(residuals:List[Tensor],weightings:List[Union[float,Tensor]],power:Union[int,None] = 2,aggregation_method:str = 'mean') -> Tensor:
+    '''
+    Calculate `aggregation(w*|R|^power)` for every term with as few kernels as possible. Residuals with the same shape, device and dtype
+    (e.g. all residuals of a collocation group) are stacked into a (n_terms,B) tensor and reduced together. Returns a Tensor of size (number of terms)
+    in the same order as residuals
+    '''
+    buckets:Dict[tuple,List[int]] = {}
+    residuals = [r if isinstance(r,Tensor) else torch.as_tensor(r) for r in residuals]
+    for i,r in enumerate(residuals):
+        buckets.setdefault((tuple(r.shape),r.device,r.dtype),[]).append(i)
+
+    device = residuals[0].device
+    mean = aggregation_method == 'mean'
+    results,order = [],[]
+    for (shape,r_device,dtype),idx in buckets.items():
+        R = torch.stack([residuals[i] for i in idx]) if len(idx) > 1 else residuals[idx[0]].unsqueeze(0)
+        ws = [weightings[i] for i in idx]
+        if all(not isinstance(w,Tensor) for w in ws):
+            #Constant weights only need a (n,1,...) tensor
+            W = torch.tensor([float(w) for w in ws],device = r_device,dtype = dtype).reshape(len(idx),*[1]*len(shape))
+        else:
+            W = torch.stack([torch.as_tensor(w,device = r_device,dtype = dtype).broadcast_to(shape) for w in ws])
+        results.append(_fused_kernel(R,W,power,mean).to(device))
+        order.extend(idx)
+
+    out = torch.cat(results)
+    if order == list(range(len(order))):
+        return out
+    inverse = torch.empty(len(order),dtype = torch.int64,device = device)
+    inverse[torch.tensor(order,device = device)] = torch.arange(len(order),device = device)
+    return out[inverse]
+
+
+class Loss_term():
+    '''
+    Record of a single loss term created by `Loss_handler.set_terms()`. Constant weightings are stored as a value so no function needs to be called for them
+    '''
+    __slots__ = ('loss_type','group','variable','evaluation','weighting','weighting_function','custom','groups')
+    def __init__(self,loss_type:str,group:str,variable:str,evaluation:Callable,weighting:Union[float,Tensor,Callable],custom:bool = False,
+                 groups:Tuple[str] = None) -> None:
+        self.loss_type = loss_type
+        self.group = group
+        self.variable = variable
+        self.evaluation = evaluation
+        self.custom = custom
+        #Dataset groups a custom term needs. None means all groups
+        self.groups = tuple(groups) if groups is not None else None
+        self.weighting_function = weighting if callable(weighting) else None
+        self.weighting = None if callable(weighting) else weighting
+
+    def weight(self,group_input,group_output):
+        return self.weighting if self.weighting_function is None else self.weighting_function(group_input,group_output)
+
+    def name(self) -> str:
+        return f'{self.loss_type}__{self.group}__{self.variable}'
+
+
 class Loss():
-    def __init__(self,loss_df:pd.DataFrame,aggregation_method:str = 'mean',power:Union[int, None] = 2):
+    def __init__(self,terms:List[Loss_term],residuals:List[Tensor],weightings:List[Union[float,Tensor]],aggregation_method:str = 'mean',power:Union[int, None] = 2,indices:List[int] = None,
+                 fused:bool = True):
         '''
         Stores the losses from the loss handler. Provides additional functionality and variables to help calculate variables.
+
+        The residuals and weightings are stored as lists in the same order as `terms`. `indices` gives the position of each term in the `Loss_handler()`
+        (by default all terms in order) so global weights can be matched to `individual_losses()`
+
+        If fused, `aggregated_loss()` uses `fused_reduction()` so residuals of the same shape are reduced together
         '''
-        self.losses = loss_df
+        self.terms = terms
+        self.residuals = residuals
+        self.weightings = weightings
+        self.indices = list(range(len(terms))) if indices is None else list(indices)
         self.aggregation_method = aggregation_method
-        self.error_func = lambda x: torch.abs(x).pow(power) if power is not None else lambda x: x
+        self.power = power
+        self.fused = fused
+        self.error_func = (lambda x: torch.abs(x).pow(power)) if power is not None else (lambda x: x)
         self.aggregation = torch.mean if aggregation_method == 'mean' else torch.sum
-    
 
         self.point_error_ = None
         self.weighted_point_error_ = None
         self.aggregated_loss_ = None
         
-    def point_error(self) -> pd.Series:
+    def point_error(self) -> List[Tensor]:
         '''
         Apply the error function/raise the resiudal to a power.
         '''
         if self.point_error_ is None:
-            self.point_error_ = self.losses['residual'].apply(self.error_func)
-            self.losses['point_error'] = self.point_error_
-
+            self.point_error_ = [self.error_func(r) for r in self.residuals]
         return self.point_error_
     
-    def weighted_point_error(self) -> pd.Series:
+    def weighted_point_error(self) -> List[Tensor]:
         '''
         Apply Weighting to point error
         '''
         if self.weighted_point_error_ is None:
-            self.weighted_point_error_ = self.losses['weighting']*self.point_error()
-            self.losses['weighted_error'] = self.weighted_point_error_
-        
+            self.weighted_point_error_ = [w*e for w,e in zip(self.weightings,self.point_error())]
         return self.weighted_point_error_
-    def aggregated_loss(self) -> pd.Series:
+
+    def aggregated_loss(self) -> Tensor:
         '''
-        Aggregate each of the losses in each group to get the error for the (group,loss_type) combo
+        Aggregate each of the losses in each group to get the error for the (group,loss_type) combo. Returns a Tensor of size (number of terms)
         '''
         if self.aggregated_loss_ is None:
-            self.aggregated_loss_ = self.weighted_point_error().apply(self.aggregation)
-            self.losses['aggregated_loss'] = self.aggregated_loss_
+            if self.weighted_point_error_ is not None:
+                self.aggregated_loss_ = torch.stack([self.aggregation(e) for e in self.weighted_point_error_])
+            elif self.fused and len(self.residuals) > 0:
+                self.aggregated_loss_ = fused_reduction(self.residuals,self.weightings,self.power,self.aggregation_method)
+            else:
+                self.aggregated_loss_ = torch.stack([self.aggregation(w*self.error_func(r)) for r,w in zip(self.residuals,self.weightings)])
         return self.aggregated_loss_
+
     def sum(self) -> Tensor : 
         '''
         Sum up all aggregate losses to get the total loss
         '''
-        return sum(self.aggregated_loss())
+        return self.aggregated_loss().sum()
     
-    def individual_losses(self):
+    def individual_losses(self) -> Tensor:
         '''
         Returns all the losses as a Tensor
         '''
-        return torch.stack(list(self.aggregated_loss()))
+        return self.aggregated_loss()
+
+    def member_losses(self) -> Tensor:
+        '''
+        Loss of every term for every member of an `Ensemble()` network. The residuals must have the members as their first dimension (K,B).
+        Returns a Tensor of size (number of terms,K). Use `member_losses().sum()` for the backward pass so each member gets its own unscaled gradient
+        '''
+        return torch.stack([self.aggregation(e.reshape(e.shape[0],-1),dim = 1) for e in self.weighted_point_error()])
 
     def grouped_losses(self, groupby:str) -> pd.Series:
         '''
@@ -78,21 +172,37 @@ class Loss():
             - group
             - variable
         '''
-        self.aggregated_loss()
-        if groupby in self.losses.columns:
-            return self.losses.groupby(groupby)['aggregated_loss'].sum()
+        if groupby in ('loss_type','group','variable'):
+            return self.get_DataFrame().groupby(groupby)['aggregated_loss'].sum()
         raise ValueError(f'groupby must be one of the following strings: "loss_type", "group" or "variable". Got {groupby} instead')
+
     def backward(self):
         '''
         Calculate total loss and then Call the Backward method. Syntatic sugar
         '''
         self.sum().backward()
 
-    def get_DataFrame(self):
-        return self.losses
+    def get_DataFrame(self) -> pd.DataFrame:
+        '''
+        Build a DataFrame of the losses. This is only created on demand so it does not slow down training
+        '''
+        aggregated = self.aggregated_loss()
+        return pd.DataFrame({
+            'loss_type':[term.loss_type for term in self.terms],
+            'group':[term.group for term in self.terms],
+            'variable':[term.variable for term in self.terms],
+            'evaluation':[term.evaluation for term in self.terms],
+            'weighting_function':[term.weighting_function for term in self.terms],
+            'weighting':self.weightings,
+            'residual':self.residuals,
+            'point_error':self.point_error_,
+            'weighted_error':self.weighted_point_error_,
+            'aggregated_loss':list(aggregated),
+            'custom':[term.custom for term in self.terms],
+        })
     
     def __len__(self):
-        return len(self.losses)
+        return len(self.terms)
 
     def print_Styled_DataFrame(self):
         '''
@@ -100,25 +210,23 @@ class Loss():
         '''
         def tensor_shape_formatter(x):
             if isinstance(x, torch.Tensor):
-                if len(x.shape) == 1 and x.shape[0] == 1:
+                if len(x.shape) == 0 or (len(x.shape) == 1 and x.shape[0] == 1):
                     return f'{float(x):.3E}'
                 else:
                     return f'{x.shape}, device = {x.device}'  # Convert shape to string for display
             return x  # Leave other elements unchanged
 
     # Apply the custom formatting function
-        return self.losses.style.format(tensor_shape_formatter)
+        return self.get_DataFrame().style.format(tensor_shape_formatter)
 
     def print_losses(self,epoch,groupby = 'loss_type'):
         total_loss = self.sum()
-        if groupby in self.losses.columns:
-            losses = self.losses.groupby(groupby)['aggregated_loss'].sum()
+        if groupby in ('loss_type','group','variable'):
+            losses = self.grouped_losses(groupby)
             names = losses.index
-            
-            
-        elif isinstance(groupby,None):
-            names = list(self.losses['loss_type'] + '__' + self.losses['group'] + '__' + self.losses['variable'])
-            losses = self.losses['aggregated_loss']
+        elif groupby is None:
+            names = [term.name() for term in self.terms]
+            losses = self.aggregated_loss()
         else:
             raise ValueError(f'groupby must be either None or string and of the following strings: loss_type, group or variable. Got {groupby} instead')
         loss_strings = '\t'.join([f'{name}: {float(loss):.3E}' for name,loss in zip(names,losses)])
@@ -131,33 +239,22 @@ class Loss():
 
 
 class Loss_handler():
-    def __init__(self,dataset:PINN_dataset) -> None:
+    def __init__(self,dataset:PINN_dataset,fused:bool = True) -> None:
         '''
         Loss_handler is designed to work with PINN_dataholder and DE_Getter()
 
+        If fused the terms are reduced with `fused_reduction()`. See `compile_fused_reduction()` to compile the reduction
+
+        Terms added via `set_terms()` (and the `add_*` methods) are compiled into a static plan: a list of `Loss_term` records per group.
+        `calculate()` then just loops over the plan each step.
         '''
         self.update_dataset(dataset)        
         self.loss_groups = {}
-        self.losses = None
         self.logger = None
-
-        self.df_keys = [
-                'loss_type',
-                'group',
-                'variable',
-                'evaluation',
-                'weighting_function',
-                'weighting',
-                'residual',
-                'point_error',
-                'weighted_error',
-                'aggregated_loss',
-                'custom',
-                'group_input',
-                'group_output']
-
-
-        self.losses: pd.DataFrame = pd.DataFrame(columns = self.df_keys)
+        self.fused = fused
+        self.terms:List[Loss_term] = []
+        self.plan:Dict[str,List[Tuple[int,Loss_term]]] = {}
+        self.custom_plan:List[Tuple[int,Loss_term]] = []
                                                 
 
     def update_dataset(self,dataset:PINN_dataset):
@@ -174,7 +271,7 @@ class Loss_handler():
 
     
     def __len__(self):
-        return len(self.losses)
+        return len(self.terms)
 
 
     def check_groups(self,dataset:PINN_dataset):
@@ -184,36 +281,84 @@ class Loss_handler():
 
         pass
 
-    def calculate(self,batched_input:dict[str,PINN_group],batched_output:dict[str,dict[str,Tensor]],power:int = 2,aggregation_method = 'mean')->Loss:
+    def compile_plan(self):
+        '''
+        Group the terms by dataset group so `calculate()` does not need to search for them
+        '''
+        self.plan = {}
+        self.custom_plan = []
+        for i,term in enumerate(self.terms):
+            if term.custom:
+                self.custom_plan.append((i,term))
+            else:
+                self.plan.setdefault(term.group,[]).append((i,term))
+
+    def get_DataFrame(self) -> pd.DataFrame:
+        '''
+        DataFrame of the terms in the handler
+        '''
+        return pd.DataFrame({'loss_type':[term.loss_type for term in self.terms],
+                             'group':[term.group for term in self.terms],
+                             'variable':[term.variable for term in self.terms],
+                             'evaluation':[term.evaluation for term in self.terms],
+                             'weighting_function':[term.weighting_function for term in self.terms],
+                             'weighting':[term.weighting for term in self.terms],
+                             'custom':[term.custom for term in self.terms]})
+
+    def calculate(self,batched_input:dict[str,PINN_group],batched_output:dict[str,dict[str,Tensor]],power:int = 2,aggregation_method = 'mean',
+                  custom_terms:Union[bool,Iterable] = True)->Loss:
         '''
         Calculate the residuals for each group. Summation and squaring the residuals is done in the loss object itself
+
+        Only the terms of groups found in batched_input are calculated. custom_terms sets which custom terms are calculated: True for all, False for none
+        or the indices of the terms (see `Loss_handler.terms`)
         '''
-        
-        for group in batched_input.keys():
-            group_bool = (self.losses['group'] == group) & (self.losses['custom'] == False)
-            
-            group_output = batched_output[group]
+        indices,terms,residuals,weightings = [],[],[],[]
+        for group,group_terms in self.plan.items():
+            if group not in batched_input:
+                continue
             group_input = batched_input[group]
-            
-            self.losses.loc[group_bool,'residual'] = self.losses.loc[group_bool,'evaluation'].apply(lambda func: func(group_input,group_output))
-            self.losses.loc[group_bool,'weighting'] = self.losses.loc[group_bool,'weighting_function'].apply(lambda func: func(group_input,group_output))
+            group_output = batched_output[group]
+            for i,term in group_terms:
+                indices.append(i)
+                terms.append(term)
+                residuals.append(term.evaluation(group_input,group_output))
+                weightings.append(term.weight(group_input,group_output))
+            #Functions that share work between the terms of a group (e.g. `Symbolic_equations()`) cache it for the group. Release the cache so
+            #it does not keep the graph of this group alive (e.g. across the chunks of `streamed_backward()`)
+            for i,term in group_terms:
+                for func in (term.evaluation,term.weighting_function):
+                    if hasattr(func,'clear_cache'):
+                        func.clear_cache()
 
         #All Custom take in the same 
-        custom_funcs = self.losses['custom'] == True
-        self.losses.loc[custom_funcs,'residual'] = self.losses.loc[custom_funcs,'evaluation'].apply(lambda func: func(batched_input,batched_output))
-        self.losses.loc[custom_funcs,'weighting'] = 1.
+        for i,term in self.custom_plan:
+            if custom_terms is False or (custom_terms is not True and i not in custom_terms):
+                continue
+            indices.append(i)
+            terms.append(term)
+            residuals.append(term.evaluation(batched_input,batched_output))
+            weightings.append(1.)
 
-        return Loss(self.losses,aggregation_method,power)
+        #Terms are evaluated group by group but returned in the order they were added to the handler so global weights (e.g. from GradNorm)
+        #line up with `individual_losses()` however the terms are interleaved
+        order = sorted(range(len(indices)),key = indices.__getitem__)
+        indices,terms,residuals,weightings = [[values[k] for k in order] for values in (indices,terms,residuals,weightings)]
+        return Loss(terms,residuals,weightings,aggregation_method,power,indices = indices,fused = self.fused)
 
 
 
-    def set_terms(self,loss_type,group,var_dict: dict[str,Union[float,Callable]], weighting: Union[float,dict,Callable],custom:bool = False):
+    def set_terms(self,loss_type,group,var_dict: dict[str,Union[float,Callable]], weighting: Union[float,dict,Callable],custom:bool = False,groups = None):
         # The output of DE_Getter is a dictionary [group][vars]
 
-        #Get all the losses associated with the loss_type (e.g. boundary or IC) and group
+        #Custom functions can be placed in any group name
+        if not custom:
+            assert group in self.dataset.group_names(), f'group {group} was not found in the dataset'
+        #Sympy expressions of the same call are compiled together so they share common subexpressions
+        symbolic = {var_name:expr for var_name,expr in var_dict.items() if isinstance(expr,Basic)}
+        if symbolic:
+            var_dict = {**var_dict,**compile_equations(symbolic)}
 
-        assert group in self.dataset.group_names()
-        group_loss_type_df = self.losses[(self.losses['group'] == group)&(self.losses['loss_type'] == loss_type)]
         #We want to match up the weighting to the var_dict
         if not isinstance(weighting,dict):
             weighting = {var_comp: weighting for var_comp in var_dict.keys()}  
@@ -221,25 +366,12 @@ class Loss_handler():
         for (var_name,evaluation_func),(weighting_value) in zip(var_dict.items(),weighting.values()):
 
             #First Check that varible not already added in loss type for group
-            if var_name in group_loss_type_df['variable']:
+            if any(term.group == group and term.loss_type == loss_type and term.variable == var_name for term in self.terms):
                 raise ValueError(f'variable name {var_name} already exists in group {group} as a {loss_type} term')
-            
-            weight_func = (lambda group_input,group_output: weighting_value) if not callable(weighting_value) else weighting_value 
-            
-
-            loss_dict = dict.fromkeys(self.df_keys,None)
-            loss_dict.update({
-                'loss_type': loss_type,
-                'group': group,
-                'variable': var_name,
-                'evaluation': evaluation_func,
-                'weighting_function': weight_func,
-                'custom': custom
-            })
-            
-            loss = pd.DataFrame([loss_dict])
-
-            self.losses = pd.concat([self.losses,loss],ignore_index= True)
+
+            self.terms.append(Loss_term(loss_type,group,var_name,evaluation_func,weighting_value,custom,groups))
+        self.compile_plan()
+
     @staticmethod
     def create_residual_from_rhs(var_name,rhs):
         '''
@@ -276,6 +408,69 @@ class Loss_handler():
         
         self.set_terms(loss_type,group,data_dict,weighting)
 
+    def add_integral(self,group:str,integrand:Union[Callable,List[str],Tuple[str]],target:float = 0.,weighting:float = 1.,name:str = None,
+                     loss_type:str = 'integral'):
+        '''
+        Add a line integral constraint e.g. the mass flow through an outlet. The group must hold quadrature nodes with the batchable kwargs `quad_weight`
+        (and `normal_x`, `normal_y` for fluxes), see `torch_DE.geometry.quadrature.add_quadrature_group()`. The group should be full batch so the
+        integral is over the whole line.
+
+        inputs:
+            - group: str name of the quadrature group
+            - integrand: Callable f(group_input,group_output) (e.g. a `DE_func`) evaluated at the nodes, or a list of output variables (u,v) in which case
+                the integrand is the flux u*normal_x + v*normal_y
+            - target: float value the integral should equal
+            - weighting: float weighting of the term
+            - name: str name of the term. Default 'flux' for fluxes and 'integral' otherwise
+            - loss_type: str loss type of the term
+
+        The residual is the scalar `sum(quad_weight*integrand) - target`
+        '''
+        if isinstance(integrand,(list,tuple)):
+            assert len(integrand) == 2, 'flux integrands need exactly two output variables'
+            u_name,v_name = integrand
+            name = 'flux' if name is None else name
+            def integrand_func(group_input,group_output):
+                return group_output[u_name]*group_input.batchables['normal_x'] + group_output[v_name]*group_input.batchables['normal_y']
+        else:
+            name = 'integral' if name is None else name
+            integrand_func = integrand
+
+        def integral(group_input,group_output):
+            return (group_input.batchables['quad_weight']*integrand_func(group_input,group_output)).sum() - target
+        self.set_full_batch(group)
+        self.set_terms(loss_type,group,{name:integral},weighting)
+
+    def add_weak_residual(self,group:str,weak_form,flux:Union[List,Tuple],source:Callable = None,name:str = 'weak',weighting:float = 1.):
+        '''
+        Add a weak form residual `-div(F) + s = 0` tested with the hat functions of a `torch_DE.geometry.weak_form.Weak_form()`. The group must contain the
+        quadrature points of the weak form in order and be full batch (see `Weak_form.add_to_dataset()`).
+
+        inputs:
+            - group: str name of the quadrature group
+            - weak_form: `Weak_form()` object
+            - flux: two output names (e.g. ['u_x','u_y']) or functions f(group_input,group_output) of the flux components
+            - source: function f(group_input,group_output) of the source term. Default None
+            - name: str name of the term
+            - weighting: float weighting of the term
+
+        Only first derivatives are needed so `DE_Getter()` only has to extract first order derivatives for this group
+        '''
+        self.set_full_batch(group)
+        self.set_terms('weak residual',group,{name:weak_form.residual(flux,source)},weighting)
+
+    def set_full_batch(self,group:str):
+        '''
+        Mark a group as full batch with the unbatched kwarg `full_batch` so it is never split into micro batches (see `torch_DE.utils.training.streamed_backward()`).
+        Used by terms that need every point of the group at once e.g. integrals and weak form residuals, so the group must also be added with
+        `batch_size = len(points)` and `shuffle = False`
+        '''
+        dataset_group = self.dataset.groups[group]
+        if dataset_group.batch_size != len(dataset_group) or dataset_group.shuffle:
+            raise ValueError(f'group {group} must be full batch and unshuffled (batch_size = {len(dataset_group)}, shuffle = False). '
+                             f'Got batch_size = {dataset_group.batch_size} and shuffle = {dataset_group.shuffle} instead')
+        dataset_group.unbatchables['full_batch'] = True
+
     def add_periodic(self,group_1:str,group_2:str,variable:str):
         '''
         Add Periodic Conditions
@@ -288,15 +483,16 @@ class Loss_handler():
             return batched_output[group_1][variable] - batched_output[group_2][variable]
 
         periodic_dict = {variable: periodic}    
-        self.set_terms('periodic',group_1,periodic_dict,weighting=1.,custom=True)
+        self.set_terms('periodic',group_1,periodic_dict,weighting=1.,custom=True,groups = (group_1,group_2))
     
 
-    def add_custom_function(self,loss_type:str,group:str,func_dict:dict[str,Callable]):
+    def add_custom_function(self,loss_type:str,group:str,func_dict:dict[str,Callable],groups:List[str] = None):
         '''
         Add a custom function. 
         Inputs:
         - group: str - the name to place all custom functions in. This group can be arbitary. This is useful to group custom functions together. For example grouping a specific set of function under 'mass flow'
         - func_dict: dictionary: a Dictionary containing the function name and a tuple (func,kwargs) to put in group_name. The dictionary syntax of (key,value) --> (func_name,(function,kwargs))
+        - groups: list[str] | None - the dataset groups the functions use. Only needed to split the loss into chunks (see `torch_DE.utils.training.streamed_backward()`). None means all groups
 
         Note that weighing is not provided for custom functions. The weighting must be defined within the function itself.
 
@@ -310,6 +506,6 @@ class Loss_handler():
 
         '''
         custom = True
-        self.set_terms(loss_type,group,func_dict,weighting=1.,custom=custom)
+        self.set_terms(loss_type,group,func_dict,weighting=1.,custom=custom,groups = groups)
 
     
\ No newline at end of file
@@ -0,0 +1,196 @@
+import torch
+import numpy as np
+from collections import OrderedDict
+from typing import Dict,List,Union,Tuple
+from torch import Tensor
+from torch_DE.utils.data import PINN_group
+
+
+class Memmap_reader():
+    '''
+    Reads rows from a memory mapped array on disk. Used by `PINN_memmap_group()` and its prefetch source.
+
+    Rows are always read in sorted order so the OS can stream the file. An optional page cache with least recently used (LRU) eviction keeps
+    `cache_pages` pages of `page_size` rows in memory. This helps when groups are not shuffled or when the same region is revisited often.
+
+    inputs:
+        - path: str path to a `.npy` file or a raw binary file
+        - dtype: numpy dtype of a raw binary file. Ignored for `.npy` files
+        - shape: tuple shape of a raw binary file. Ignored for `.npy` files
+        - offset: int byte offset of the array in a raw binary file
+        - cache_pages: int maximum number of pages held in the cache. 0 disables the cache
+        - page_size: int number of rows per page
+
+    Arrays with more than two dimensions (e.g. an export of shape `[T,N,C]`) are viewed as `(T*N,C)` rows.
+    '''
+    def __init__(self,path:str,dtype = None,shape:tuple = None,offset:int = 0,*,cache_pages:int = 0,page_size:int = 4096) -> None:
+        self.path = path
+        self.dtype = dtype
+        self.shape = shape
+        self.offset = offset
+        self.cache_pages = cache_pages
+        self.page_size = page_size
+        self.open()
+
+    def open(self):
+        if str(self.path).endswith('.npy'):
+            array = np.load(self.path,mmap_mode = 'r')
+        else:
+            assert self.dtype is not None and self.shape is not None, 'dtype and shape must be given for raw binary files'
+            array = np.memmap(self.path,dtype = self.dtype,mode = 'r',shape = tuple(self.shape),offset = self.offset)
+
+        if array.ndim == 1:
+            array = array.reshape(-1,1)
+        elif array.ndim > 2:
+            array = array.reshape(-1,array.shape[-1])
+        self.array = array
+        self.cache = OrderedDict()
+        self.hits,self.misses = 0,0
+
+    def __getstate__(self):
+        #Memmaps and the cache are not sent to workers. Each process opens the file itself
+        state = self.__dict__.copy()
+        for key in ('array','cache'):
+            state.pop(key,None)
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.open()
+
+    def __len__(self):
+        return self.array.shape[0]
+
+    @property
+    def num_cols(self):
+        return self.array.shape[1]
+
+    def read_page(self,page:int) -> np.ndarray:
+        if page in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(page)
+            return self.cache[page]
+
+        self.misses += 1
+        rows = np.array(self.array[page*self.page_size:(page+1)*self.page_size])
+        self.cache[page] = rows
+        while len(self.cache) > self.cache_pages:
+            self.cache.popitem(last = False)
+        return rows
+
+    def read_sorted(self,sorted_idx:np.ndarray) -> np.ndarray:
+        '''
+        Read rows given ascending indices
+        '''
+        if self.cache_pages <= 0:
+            return self.array[sorted_idx]
+
+        pages = sorted_idx // self.page_size
+        unique_pages,starts = np.unique(pages,return_index = True)
+        ends = np.append(starts[1:],len(sorted_idx))
+        out = np.empty((len(sorted_idx),self.num_cols),dtype = self.array.dtype)
+        #Only gather the needed rows of each page. Indices are sorted so the rows of a page are contiguous in the output
+        for page,start,end in zip(unique_pages,starts,ends):
+            out[start:end] = self.read_page(int(page))[sorted_idx[start:end] - page*self.page_size]
+        return out
+
+    def read(self,idx:Union[Tensor,np.ndarray]) -> np.ndarray:
+        '''
+        Read the rows `idx` and return them in the same order as `idx`
+        '''
+        idx = idx.cpu().numpy() if isinstance(idx,Tensor) else np.asarray(idx)
+        order = np.argsort(idx,kind = 'stable')
+        rows = self.read_sorted(idx[order])
+        out = np.empty_like(rows)
+        out[order] = rows
+        return out
+
+
+class Memmap_source():
+    '''
+    Prefetch source for `PINN_memmap_group()` see `torch_DE.utils.prefetch.PINN_Prefetcher()`. Only the file path and column layout are sent to workers
+    '''
+    def __init__(self,reader:Memmap_reader,columns:Dict[str,Union[List[int],int]],dtype:torch.dtype) -> None:
+        self.reader = reader
+        self.columns = columns
+        self.dtype = dtype
+
+    def buffer_spec(self) -> Dict[str,Tuple[tuple,torch.dtype]]:
+        return {key:(() if isinstance(cols,int) else (len(cols),),self.dtype) for key,cols in self.columns.items()}
+
+    def gather(self,idx:Tensor,out:Dict[str,Tensor]) -> None:
+        rows = torch.from_numpy(self.reader.read(idx))
+        for key,cols in self.columns.items():
+            out[key].copy_(rows[:,cols])
+
+
+class PINN_memmap_group(PINN_group):
+    def __init__(self,name:str,reader:Union[Memmap_reader,str],batch_size:int,input_vars:List[str],input_cols:List[int] = None,
+                 batchable_cols:Dict[str,int] = None,unbatched_kwargs:dict = None,*,shuffle:bool = False,dtype:torch.dtype = torch.float32,**reader_kwargs) -> None:
+        '''
+        PINN group backed by a memory mapped array on disk (`.npy` or raw binary). Use this for data driven groups (e.g. reference fields
+        from simulation exports) that are too large to fit in memory. Only the rows in each batch are read.
+
+        Each row of the array holds one point. The columns are split into network inputs and batchable kwargs (usually targets).
+
+        inputs:
+            - name: str name of group
+            - reader: `Memmap_reader()` or str path to the file. If a path is given, `reader_kwargs` are passed to `Memmap_reader()`
+                (e.g. `dtype`,`shape`,`cache_pages`,`page_size`)
+            - batch_size: int batch size
+            - input_vars: list[str] names of the input variables. Must be the same as the `PINN_dataset()`
+            - input_cols: list[int] columns holding the inputs in the order of `input_vars`. Default is the first `len(input_vars)` columns
+            - batchable_cols: dict mapping batchable kwarg names to a column e.g. `{'u':3,'v':4}`. Default None
+            - unbatched_kwargs: dict of kwargs that are not batched
+            - shuffle: bool. Shuffles the data if true. Default is False
+            - dtype: torch dtype batches are cast to. Default torch.float32
+
+        Add to a dataset with `PINN_dataset.register_group()`. The group works with `PINN_sampler()`, `PINN_Dataloader()` and `PINN_Prefetcher()`
+        '''
+        self.reader = reader if isinstance(reader,Memmap_reader) else Memmap_reader(reader,**reader_kwargs)
+        self.name:str = name
+        self.batch_size:int = batch_size
+        self.input_vars:list[str] = input_vars
+        self.input_cols = list(range(len(input_vars))) if input_cols is None else list(input_cols)
+        self.batchable_cols = {} if batchable_cols is None else dict(batchable_cols)
+        self.batchables_vars:list[str] = list(self.batchable_cols.keys())
+        self.shared_keys_check(dict.fromkeys(list(input_vars) + ['input']),self.batchable_cols)
+        self.is_dict_OR_none(unbatched_kwargs)
+        self.unbatchables = unbatched_kwargs if isinstance(unbatched_kwargs,dict) else {}
+        self.shuffle = shuffle
+        self.dtype = dtype
+        self.device = 'cpu'
+        self.N,self.D = len(self.reader),len(self.input_cols)
+        self.checks()
+
+    def checks(self):
+        assert self.batch_size <= self.__len__()
+        assert len(self.input_vars) == self.D
+        for col in self.input_cols + list(self.batchable_cols.values()):
+            assert 0 <= col < self.reader.num_cols, f'column {col} is out of range for an array with {self.reader.num_cols} columns'
+
+    def to(self,*args,**kwargs):
+        '''
+        Batches are read on the cpu and then moved to the device given here
+        '''
+        for key,x in self.unbatchables.items():
+            if hasattr(x,'to'):
+                self.unbatchables[key] = x.to(*args,**kwargs)
+        device = torch.empty(0).to(*args,**kwargs).device
+        self.device = device
+        return self
+
+    def columns(self) -> Dict[str,Union[List[int],int]]:
+        return {'input':self.input_cols,**self.batchable_cols}
+
+    def subgroup(self,idx) -> PINN_group:
+        '''
+        Read the rows `idx` from disk and return a regular `PINN_group` holding the batch
+        '''
+        rows = torch.from_numpy(self.reader.read(idx)).to(dtype = self.dtype,device = self.device)
+        inputs = rows[:,self.input_cols]
+        batchable_kwargs = {key:rows[:,col] for key,col in self.batchable_cols.items()}
+        return PINN_group(self.name,inputs,self.batch_size,self.input_vars,batchable_kwargs = batchable_kwargs,unbatched_kwargs=self.unbatchables,shuffle=self.shuffle)
+
+    def prefetch_source(self) -> Memmap_source:
+        return Memmap_source(self.reader,self.columns(),self.dtype)
@@ -0,0 +1,252 @@
+import torch
+import torch.multiprocessing as mp
+from collections import deque
+from typing import Dict,Iterator,Union,Tuple
+from torch import Tensor
+from torch_DE.utils.data import PINN_dataset,PINN_dict,PINN_group
+from torch_DE.utils.time import add_random_time,add_random_time_point,add_time_point
+
+
+class Tensor_source():
+    '''
+    Picklable source of batchable data for a `PINN_group()`. The tensors are placed in shared memory so prefetch workers can read them without
+    pickling the group through a queue.
+
+    Group types that do not hold their data in memory (e.g. memory mapped groups) can provide their own source via a `prefetch_source()` method.
+    A source must implement `buffer_spec()` and `gather(idx,out)`
+    '''
+    def __init__(self,group:PINN_group):
+        self.tensors = {'input':group.batchables['input'].detach().cpu().contiguous()}
+        self.tensors.update({key:group.batchables[key].detach().cpu().contiguous() for key in group.batchables_vars})
+        for tensor in self.tensors.values():
+            tensor.share_memory_()
+
+    def buffer_spec(self) -> Dict[str,Tuple[tuple,torch.dtype]]:
+        '''
+        Returns the trailing shape and dtype of each tensor in a batch
+        '''
+        return {key:(tuple(tensor.shape[1:]),tensor.dtype) for key,tensor in self.tensors.items()}
+
+    def gather(self,idx:Tensor,out:Dict[str,Tensor]) -> None:
+        '''
+        Write the rows `idx` of each tensor directly into the buffers in `out`
+        '''
+        for key,tensor in self.tensors.items():
+            torch.index_select(tensor,0,idx,out = out[key])
+
+
+def get_source(group:PINN_group):
+    if hasattr(group,'prefetch_source'):
+        return group.prefetch_source()
+    return Tensor_source(group)
+
+
+def resample_time(tensor:Tensor,time_type:str,time_interval = None,point:float = None,col:int = -1) -> None:
+    '''
+    Resample the time column of a batch in place. Uses the same `time_type` strings as `torch_DE.utils.time.set_time()`
+    '''
+    if time_type == 'random interval':
+        add_random_time(tensor,time_interval,col)
+    elif time_type == 'random point':
+        add_random_time_point(tensor,time_interval,col)
+    elif time_type == 'single point':
+        add_time_point(tensor,point,col)
+    else:
+        raise ValueError(f'time type is a string of either "random interval","random point" or "single point" Got {time_type} string instead')
+
+
+def _prefetch_worker(worker_id:int,sources:dict,slots:list,tasks,done,seed:int,time_resample:dict,time_col:int):
+    '''
+    Worker loop. Each task is `(batch_id,slot_id,indices)`. The batch is gathered straight into the shared memory slot and only the ids are sent back
+    '''
+    torch.set_num_threads(1)
+    torch.manual_seed(seed + worker_id)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        batch_id,slot_id,indices = task
+        slot = slots[slot_id]
+        for name,idx in indices.items():
+            sources[name].gather(idx,slot[name])
+            if name in time_resample:
+                resample_time(slot[name]['input'],*time_resample[name],col = time_col)
+        done.put((batch_id,slot_id))
+
+
+class PINN_Prefetcher():
+    def __init__(self,dataset:PINN_dataset,num_workers:int = 2,prefetch_depth:int = 2,*,pin_memory:bool = False,seed:int = 0,
+                 time_resample:Dict[str,tuple] = None,time_col:int = -1,multiprocessing_context:Union[str,None] = None) -> None:
+        '''
+        Multi-worker prefetching loader for a `PINN_dataset()`. Replaces `PINN_Dataloader()` when batch assembly becomes a bottleneck.
+
+        Indices are generated in the main process by `PINN_sampler()`. Worker processes then slice each group directly into a ring of shared memory
+        buffers (`prefetch_depth` slots per worker) so no `PINN_group` or `TensorDict` objects are pickled. Batch assembly therefore overlaps
+        with the training step.
+
+        inputs:
+            - dataset: `PINN_dataset()` to load from
+            - num_workers: int number of worker processes. If 0 batches are gathered in the main process using the same buffers
+            - prefetch_depth: int number of batches each worker can prepare ahead of the training loop
+            - pin_memory: bool. If True each batch is copied into a freshly allocated page locked buffer so `.to('cuda',non_blocking = True)`
+                is asynchronous. A new buffer is used for every batch (as in `torch.utils.data.DataLoader`) so an in flight copy is never overwritten
+            - seed: int. Worker `i` is seeded with `seed + i`. Batch `k` is always assembled by worker `k % num_workers` so time resampling is reproducible
+            - time_resample: dict mapping group names to a tuple of `(time_type,time_interval,point)` arguments (see `torch_DE.utils.time.set_time()`).
+                The time column of these groups is resampled in the worker for every batch, similar to `Data_handler.time_resample()`
+            - time_col: int column of the time variable. Default -1
+            - multiprocessing_context: str | None start method for the workers e.g. 'spawn' or 'fork'. None uses the default
+
+        Batches are views into the ring buffers and are only valid until the next iteration. Call `.to(device)` on the batch (as in the
+        tutorials) or clone the tensors to keep them.
+        '''
+        assert num_workers >= 0 and prefetch_depth >= 1
+        self.dataset = dataset
+        self.groups = dataset.groups
+        self.num_workers = num_workers
+        self.prefetch_depth = prefetch_depth
+        self.pin_memory = pin_memory
+        self.seed = seed
+        self.time_col = time_col
+        self.time_resample = {}
+        for name,args in (time_resample or {}).items():
+            assert name in self.groups.keys(), f'Could not find the group {name} in the dataset'
+            self.time_resample[name] = tuple(args) if isinstance(args,(list,tuple)) else (args,)
+
+        self.context = mp.get_context(multiprocessing_context)
+        self.sampler = dataset.Sampler()
+        self.sources = {name:get_source(group) for name,group in self.groups.items()}
+
+        num_slots = max(num_workers,1)*prefetch_depth
+        self.slots = [self.make_slot(share = True) for _ in range(num_slots)]
+        self.workers = []
+        self._outstanding = [0 for _ in range(max(num_workers,1))]
+
+    def make_slot(self,share = True) -> Dict[str,Dict[str,Tensor]]:
+        '''
+        Allocate one batch worth of buffers for every group
+        '''
+        slot = {}
+        for name,group in self.groups.items():
+            slot[name] = {}
+            for key,(shape,dtype) in self.sources[name].buffer_spec().items():
+                buffer = torch.empty((group.batch_size,) + shape,dtype = dtype)
+                if share:
+                    buffer.share_memory_()
+                slot[name][key] = buffer
+        return slot
+
+    def start(self):
+        '''
+        Start the worker processes. Called automatically on the first iteration
+        '''
+        if self.workers or self.num_workers == 0:
+            return
+        self.tasks = [self.context.Queue() for _ in range(self.num_workers)]
+        self.done = [self.context.Queue() for _ in range(self.num_workers)]
+        for i in range(self.num_workers):
+            worker = self.context.Process(target = _prefetch_worker,
+                                          args = (i,self.sources,self.slots,self.tasks[i],self.done[i],self.seed,self.time_resample,self.time_col),
+                                          daemon = True)
+            worker.start()
+            self.workers.append(worker)
+
+    def close(self):
+        '''
+        Stop the worker processes
+        '''
+        for tasks in getattr(self,'tasks',[]):
+            tasks.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.sampler)
+
+    def make_batch(self,slot:Dict[str,Dict[str,Tensor]]) -> PINN_dict:
+        '''
+        Wrap the buffers of a slot into `PINN_group` objects. No data is copied
+        '''
+        batch = PINN_dict()
+        for name,group in self.groups.items():
+            buffers = slot[name]
+            batchable_kwargs = {key:buffer for key,buffer in buffers.items() if key != 'input'}
+            batch[name] = PINN_group(name,buffers['input'],group.batch_size,group.input_vars,batchable_kwargs = batchable_kwargs,
+                                     unbatched_kwargs = group.unbatchables,shuffle = group.shuffle)
+        return batch
+
+    def _gather_local(self,slot_id:int,indices:Dict[str,Tensor]):
+        for name,idx in indices.items():
+            self.sources[name].gather(idx,self.slots[slot_id][name])
+            if name in self.time_resample:
+                resample_time(self.slots[slot_id][name]['input'],*self.time_resample[name],col = self.time_col)
+
+    def _to_pinned(self,slot_id:int):
+        #Reusing pinned buffers is unsafe as a non_blocking copy from the previous batch may still be reading them.
+        #pin_memory() goes through the caching host allocator, which only hands a block out again once its copies have finished
+        return {name:{key:buffer.pin_memory() for key,buffer in buffers.items()} for name,buffers in self.slots[slot_id].items()}
+
+    def _drain(self):
+        #If the consumer stopped early there are still batches in flight. Wait for them so the slots are free again
+        for w,done in enumerate(self.done):
+            for _ in range(self._outstanding[w]):
+                done.get()
+            self._outstanding[w] = 0
+
+    def __iter__(self) -> Iterator[PINN_dict]:
+        if self.num_workers == 0:
+            yield from self._iter_local()
+            return
+
+        self.start()
+        self._drain()
+        num_batches = len(self)
+        index_iter = iter(self.sampler)
+        free = [deque(range(w*self.prefetch_depth,(w+1)*self.prefetch_depth)) for w in range(self.num_workers)]
+        next_batch = 0
+
+        def submit():
+            nonlocal next_batch
+            while next_batch < num_batches and free[next_batch % self.num_workers]:
+                w = next_batch % self.num_workers
+                self.tasks[w].put((next_batch,free[w].popleft(),next(index_iter)))
+                self._outstanding[w] += 1
+                next_batch += 1
+
+        submit()
+        for i in range(num_batches):
+            w = i % self.num_workers
+            batch_id,slot_id = self.done[w].get()
+            self._outstanding[w] -= 1
+            assert batch_id == i, 'Prefetch workers returned batches out of order'
+
+            if self.pin_memory:
+                slot = self._to_pinned(slot_id)
+                free[w].append(slot_id)
+                submit()
+                yield self.make_batch(slot)
+            else:
+                yield self.make_batch(self.slots[slot_id])
+                #Consumer is done with the batch so the slot can be refilled
+                free[w].append(slot_id)
+                submit()
+
+    def _iter_local(self) -> Iterator[PINN_dict]:
+        for i,indices in enumerate(self.sampler):
+            slot_id = i % len(self.slots)
+            self._gather_local(slot_id,indices)
+            slot = self._to_pinned(slot_id) if self.pin_memory else self.slots[slot_id]
+            yield self.make_batch(slot)
@@ -71,11 +71,12 @@ class R3_sampler():
 
         if isinstance(res,Loss):
             if loss_type == 'weighted':
-                res = list(res.weighted_error()['Residual'][self.group].values())
+                errors = res.weighted_point_error()
             elif loss_type == 'point error':
-                res = list(res.point_error()['Residual'][self.group].values())
+                errors = res.point_error()
             else:
                 raise ValueError(f'loss_type accepts only strings weighted and point error')
+            res = [e for term,e in zip(res.terms,errors) if term.group == self.group and term.loss_type == 'residual']
             
         if isinstance(x,dict):
             x = x[self.group]
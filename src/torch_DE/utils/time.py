@@ -114,4 +114,4 @@ def add_random_time_point(tensor,interval,col = -1):
 
 def add_random_time(tensor,interval,col = -1):
     a,b = interval
-    tensor[:,col] = torch.rand((tensor.shape[0]),device=tensor.device)*((b-a)+ a)
+    tensor[:,col] = torch.rand((tensor.shape[0]),device=tensor.device)*(b-a) + a
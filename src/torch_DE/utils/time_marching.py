@@ -0,0 +1,287 @@
+import os
+import glob
+import torch
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict,List,Tuple,Union,Callable
+from torch import Tensor
+from torch_DE.utils.data import PINN_dataset,PINN_Dataloader,PINN_dict
+from torch_DE.utils.time import set_time
+
+
+class TimeMarchingTrainer():
+    def __init__(self,PINN,losses,dataset:PINN_dataset,optimizer_factory:Callable,num_windows:int,window_length:float = 1.,overlap:float = 0.,
+                 ic_group:str = 'initial condition',ic_vars:List[str] = ('u',),time_col:int = -1,t_start:float = 0.,
+                 overlap_inputs:Tensor = None,overlap_weighting:float = 1.,warm_start:bool = True,pipeline:str = 'thread',
+                 checkpoint_dir:str = None,device = 'cpu',eval_batch_size:int = 100_000) -> None:
+        '''
+        Train a sequence of time windows (time marching). Every window is trained in local time [0,window_length] on the same dataset with the same
+        network and `DE_Getter()`. The network is warm started from the previous window and the initial condition group of the next window is
+        the state of the previous window, transferred in place into the IC group targets.
+
+        Window k starts at the global time t_start + k*(window_length - overlap). With an overlap, the start of each window is also tied to the end of
+        the previous one with a consistency loss on `overlap_inputs`.
+
+        inputs:
+            - PINN: `DE_Getter()` whose network is trained
+            - losses: `Loss_handler()` of the dataset. The IC group must use data constraints on `ic_vars`
+                e.g. `losses.add_data_constraint('initial condition','initial condition',['u','v'])`
+            - dataset: `PINN_dataset()` in local time. The IC group must have the batchable kwargs `ic_vars`
+            - optimizer_factory: function f(net) returning an optimizer or a tuple (optimizer,scheduler). Called at the start of every window
+            - num_windows: int number of windows
+            - window_length: float length of each window in local time
+            - overlap: float length of the overlap between consecutive windows
+            - ic_group: str name of the initial condition group (local time 0)
+            - ic_vars: list of outputs transferred as the next initial condition (e.g. ['u','v'])
+            - time_col: int column of the time input
+            - t_start: float global time of the start of the first window
+            - overlap_inputs: Tensor of points with local times in [0,overlap]. Added as the group 'overlap' with the loss type 'overlap consistency'
+                whose targets are the previous window's outputs at the same global times. Required if overlap > 0
+            - overlap_weighting: float weight of the overlap consistency terms
+            - warm_start: bool start each window from the previous window's weights. Otherwise the network is reset to its initial weights
+            - pipeline: str | None how the transfer to the next window is overlapped with saving the checkpoint
+                - 'thread': the transfer runs in a background thread
+                - 'stream': the transfer runs on a separate CUDA stream (falls back to 'thread' on the cpu)
+                - None: run one after the other
+            - checkpoint_dir: str | None directory of the per window checkpoints `window_{k}.pt`. Use `train(resume = True)` to restart from them
+            - device: device of the training
+            - eval_batch_size: int chunk size used to evaluate the transfers
+        '''
+        assert overlap < window_length, 'overlap must be smaller than the window length'
+        if pipeline not in ('thread','stream',None):
+            raise ValueError(f'pipeline must be one of \'thread\', \'stream\' or None. Got {pipeline} instead')
+        self.PINN = PINN
+        self.net = PINN.net
+        self.losses = losses
+        self.dataset = dataset
+        self.optimizer_factory = optimizer_factory
+        self.num_windows = num_windows
+        self.window_length = window_length
+        self.overlap = overlap
+        self.ic_group = ic_group
+        self.ic_vars = list(ic_vars)
+        self.time_col = time_col
+        self.t_start = t_start
+        self.overlap_weighting = overlap_weighting
+        self.warm_start = warm_start
+        self.pipeline = pipeline
+        self.checkpoint_dir = checkpoint_dir
+        self.device = torch.device(device)
+        self.eval_batch_size = eval_batch_size
+
+        assert ic_group in dataset.groups, f'Could not find the initial condition group {ic_group}'
+        for var in self.ic_vars:
+            assert var in dataset.groups[ic_group].batchables_vars, f'The initial condition group has no batchable kwarg {var}'
+
+        self.overlap_group = None
+        if overlap > 0:
+            assert overlap_inputs is not None, 'overlap_inputs must be given when the windows overlap'
+            self.overlap_group = 'overlap'
+            dataset.add_group(self.overlap_group,overlap_inputs,{f'{var}_target':torch.zeros(len(overlap_inputs)) for var in self.ic_vars},
+                              batch_size = len(overlap_inputs),shuffle = False)
+            losses.update_dataset(dataset)
+            losses.set_terms('overlap consistency',self.overlap_group,{var:self.overlap_residual(var) for var in self.ic_vars},
+                             weighting = self.overlap_weight)
+
+        self.loader = PINN_Dataloader(dataset)
+        self.iterator = iter(self.loader)
+        self.window = 0
+        self.history:Dict[int,List[float]] = {}
+        self.window_states:Dict[int,Dict[str,Tensor]] = {}
+        self.stream = torch.cuda.Stream() if pipeline == 'stream' and self.device.type == 'cuda' else None
+        #Not every layer has reset_parameters() (e.g. RWF_Linear) so cold starts reload the initial weights
+        self.initial_state = {key:value.detach().cpu().clone() for key,value in self.net.state_dict().items()}
+
+    @staticmethod
+    def overlap_residual(var:str) -> Callable:
+        def residual(group_input,group_output):
+            return group_output[var] - group_input.batchables[f'{var}_target']
+        return residual
+
+    def overlap_weight(self,group_input,group_output) -> float:
+        #The first window has no previous window to be consistent with
+        return self.overlap_weighting if self.window > 0 else 0.
+
+    def window_start(self,k:int) -> float:
+        '''
+        Global time of the start of window k
+        '''
+        return self.t_start + k*(self.window_length - self.overlap)
+
+    def local_inputs(self,x:Tensor,k:int) -> Tensor:
+        '''
+        Convert inputs with global times to the local time of window k
+        '''
+        x = x.clone()
+        x[:,self.time_col] -= self.window_start(k)
+        return x
+
+    @torch.no_grad()
+    def evaluate(self,x:Tensor) -> Tensor:
+        '''
+        Network output at the inputs x (local time) in chunks of `eval_batch_size`
+        '''
+        return torch.cat([self.net(x_m.to(self.device)) for x_m in torch.split(x,self.eval_batch_size)])
+
+    def transfer_targets(self) -> Dict[str,Dict[str,Tensor]]:
+        '''
+        Targets of the next window from the current network: the state at the start of the next window for the IC group and the outputs over the
+        overlap for the overlap group. The start of the next window is local time window_length - overlap of the current window
+        '''
+        step = self.window_length - self.overlap
+        ic_inputs = set_time('single point',self.dataset.groups[self.ic_group].batchables['input'],point = step,col = self.time_col)
+        out = self.evaluate(ic_inputs)
+        targets = {self.ic_group:{var:out[:,self.PINN.output_vars_idx[var]] for var in self.ic_vars}}
+        if self.overlap_group is not None:
+            overlap_inputs = self.dataset.groups[self.overlap_group].batchables['input'].clone()
+            overlap_inputs[:,self.time_col] += step
+            out = self.evaluate(overlap_inputs)
+            targets[self.overlap_group] = {f'{var}_target':out[:,self.PINN.output_vars_idx[var]] for var in self.ic_vars}
+        return targets
+
+    def pipelined_transfer(self) -> Dict[str,Dict[str,Tensor]]:
+        '''
+        Evaluate the transfer while the checkpoint of the current window is saved
+        '''
+        if self.pipeline is None:
+            targets = self.transfer_targets()
+            self.save_checkpoint()
+            return targets
+
+        if self.stream is not None:
+            self.stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(self.stream):
+                targets = self.transfer_targets()
+            self.save_checkpoint()
+            torch.cuda.current_stream().wait_stream(self.stream)
+            return targets
+
+        with ThreadPoolExecutor(max_workers = 1) as executor:
+            future = executor.submit(self.transfer_targets)
+            self.save_checkpoint()
+            return future.result()
+
+    def apply_targets(self,targets:Dict[str,Dict[str,Tensor]]) -> None:
+        for group,values in targets.items():
+            self.dataset.update_group(group,batchable_kwargs = values)
+
+    def reset_parameters(self) -> None:
+        self.net.load_state_dict(self.initial_state)
+
+    def checkpoint_path(self,k:int) -> str:
+        return os.path.join(self.checkpoint_dir,f'window_{k}.pt')
+
+    def save_checkpoint(self) -> None:
+        state = {key:value.detach().cpu().clone() for key,value in self.net.state_dict().items()}
+        self.window_states[self.window] = state
+        if self.checkpoint_dir is None:
+            return
+        os.makedirs(self.checkpoint_dir,exist_ok = True)
+        torch.save({'window':self.window,'net':state,'history':self.history.get(self.window,[]),
+                    'window_start':self.window_start(self.window)},self.checkpoint_path(self.window))
+
+    def last_checkpoint(self) -> Union[int,None]:
+        if self.checkpoint_dir is None:
+            return None
+        windows = [int(os.path.basename(path)[len('window_'):-len('.pt')]) for path in glob.glob(os.path.join(self.checkpoint_dir,'window_*.pt'))]
+        return max(windows) if len(windows) > 0 else None
+
+    def resume(self) -> int:
+        '''
+        Load the last checkpoint and transfer its state to the next window. Returns the window to continue from
+        '''
+        k = self.last_checkpoint()
+        if k is None:
+            return 0
+        for j in range(k + 1):
+            if os.path.exists(self.checkpoint_path(j)):
+                checkpoint = torch.load(self.checkpoint_path(j),map_location = 'cpu')
+                self.window_states[j] = checkpoint['net']
+                self.history[j] = checkpoint['history']
+        self.net.load_state_dict(self.window_states[k])
+        self.net.to(self.device)
+        self.window = k
+        self.apply_targets(self.transfer_targets())
+        return k + 1
+
+    def next_batch(self) -> PINN_dict:
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            self.iterator = iter(self.loader)
+            return next(self.iterator)
+
+    def train_window(self,num_steps:int,step_callback:Callable = None,weight_callback:Callable = None) -> List[float]:
+        '''
+        Train the current window for num_steps steps.
+
+        inputs:
+            - num_steps: int number of optimizer steps
+            - step_callback: function f(trainer,step,loss) called after every optimizer step e.g. for logging
+            - weight_callback: function f(trainer,step,loss) called before the backward pass while the graph of the loss is alive. It can return
+                global weights of `loss.individual_losses()` (e.g. from `GradNorm()`). If it returns None the previous weights are kept
+
+        Returns the loss history of the window with one (weighted) total loss per step
+        '''
+        created = self.optimizer_factory(self.net)
+        optimizer,scheduler = created if isinstance(created,tuple) else (created,None)
+        weights = None
+        history = self.history.setdefault(self.window,[])
+        self.net.train()
+        for step in range(num_steps):
+            batch = self.next_batch().to(self.device)
+            loss = self.losses(batch,self.PINN(batch))
+            if weight_callback is not None:
+                new_weights = weight_callback(self,step,loss)
+                weights = new_weights if new_weights is not None else weights
+            total = (weights*loss.individual_losses()).sum() if weights is not None else loss.sum()
+            total.backward()
+            optimizer.step()
+            optimizer.zero_grad()
+            if scheduler is not None:
+                scheduler.step()
+            history.append(float(total.detach()))
+            if step_callback is not None:
+                step_callback(self,step,loss)
+        return history
+
+    def train(self,steps_per_window:int,step_callback:Callable = None,weight_callback:Callable = None,resume:bool = False) -> Dict[int,List[float]]:
+        '''
+        Train all windows. If resume the training restarts after the last checkpoint in `checkpoint_dir`. See `train_window()` for the callbacks
+        '''
+        self.net.to(self.device)
+        first = self.resume() if resume else 0
+        for k in range(first,self.num_windows):
+            self.window = k
+            if k > 0 and not self.warm_start:
+                self.reset_parameters()
+            self.train_window(steps_per_window,step_callback,weight_callback)
+            if k < self.num_windows - 1:
+                self.apply_targets(self.pipelined_transfer())
+            else:
+                self.save_checkpoint()
+        return self.history
+
+    def window_index(self,t:Tensor) -> Tensor:
+        '''
+        Window of each global time. In an overlap the later window is used
+        '''
+        k = torch.floor((t - self.t_start)/(self.window_length - self.overlap)).long()
+        return k.clamp(0,self.num_windows - 1)
+
+    @torch.no_grad()
+    def predict(self,x:Tensor) -> Tensor:
+        '''
+        Evaluate the trained windows at inputs x with global times. Uses the saved weights of each window
+        '''
+        current = {key:value.detach().clone() for key,value in self.net.state_dict().items()}
+        k_idx = self.window_index(x[:,self.time_col])
+        out = None
+        for k in k_idx.unique().tolist():
+            mask = k_idx == k
+            self.net.load_state_dict(self.window_states[k])
+            u = self.evaluate(self.local_inputs(x[mask],k))
+            if out is None:
+                out = torch.empty(len(x),u.shape[-1],dtype = u.dtype,device = u.device)
+            out[mask.to(u.device)] = u
+        self.net.load_state_dict(current)
+        return out
@@ -0,0 +1,200 @@
+import torch
+import weakref
+from typing import Dict,List,Union,Tuple
+from torch import Tensor
+from torch_DE.utils.data import PINN_dict,PINN_group
+from torch_DE.utils.loss import Loss,Loss_handler
+from torch_DE.utils.loss_weighting import term_gradients
+
+
+def plan_chunks(handler:Loss_handler,group_names:List[str],chunks:Union[int,List[List[str]],None] = None) -> Tuple[List[List[str]],List[List[int]]]:
+    '''
+    Split the groups of a batch into chunks. Chunks are merged so every custom term has all the groups it needs (see `Loss_handler.add_custom_function()`)
+    in the same chunk. Returns the groups of each chunk and the indices of the custom terms evaluated in each chunk
+    '''
+    group_names = list(group_names)
+    if chunks is None:
+        chunks = [[name] for name in group_names]
+    elif isinstance(chunks,int):
+        assert chunks >= 1, 'chunks must be atleast 1'
+        size = -(-len(group_names)//chunks)
+        chunks = [group_names[i:i+size] for i in range(0,len(group_names),size)]
+    else:
+        chunks = [[name for name in chunk if name in group_names] for chunk in chunks]
+        missing = set(group_names) - set(name for chunk in chunks for name in chunk)
+        chunks += [[name] for name in group_names if name in missing]
+    chunks = [chunk for chunk in chunks if len(chunk) > 0]
+
+    custom_needs = []
+    for i,term in handler.custom_plan:
+        needed = set(group_names) if term.groups is None else set(term.groups) & set(group_names)
+        if not needed:
+            continue
+        custom_needs.append((i,needed))
+        merged = [chunk for chunk in chunks if needed & set(chunk)]
+        if len(merged) > 1:
+            chunks = [chunk for chunk in chunks if not (needed & set(chunk))] + [[name for chunk in merged for name in chunk]]
+
+    chunk_custom = [[i for i,needed in custom_needs if needed <= set(chunk)] for chunk in chunks]
+    return chunks,chunk_custom
+
+
+#Estimates of bytes_per_point() for each Loss_handler keyed by (DE_Getter,group name,batch size). The estimate does not change between steps
+_bytes_per_point_cache = weakref.WeakKeyDictionary()
+
+
+def clear_memory_estimates() -> None:
+    '''
+    Clear the cached `bytes_per_point()` estimates e.g. after changing the network or the derivatives
+    '''
+    _bytes_per_point_cache.clear()
+
+
+def cached_bytes_per_point(PINN,handler:Loss_handler,group:PINN_group) -> float:
+    '''
+    `bytes_per_point()` measured once per group name and batch size
+    '''
+    cache = _bytes_per_point_cache.setdefault(handler,{})
+    key = (id(PINN),group.name,len(group))
+    if key not in cache:
+        cache[key] = bytes_per_point(PINN,handler,group)
+    return cache[key]
+
+
+def bytes_per_point(PINN,handler:Loss_handler,group:PINN_group,probe_size:int = 64) -> float:
+    '''
+    Estimate the autograd memory (bytes) each point of a group needs. The tensors saved for backward are counted with `saved_tensors_hooks` for
+    probe_size and 2*probe_size points. The difference removes the memory that does not scale with the batch (e.g. saved parameters)
+    '''
+    probe_size = max(1,min(probe_size,len(group)//2))
+    def measure(n:int) -> int:
+        total = [0]
+        def pack(t):
+            total[0] += t.numel()*t.element_size()
+            return t
+        sub_batch = PINN_dict({group.name:group.split(n)[0]})
+        with torch.autograd.graph.saved_tensors_hooks(pack,lambda t: t):
+            loss = handler.calculate(sub_batch,PINN(sub_batch),custom_terms = False)
+            if len(loss) > 0:
+                loss.aggregated_loss()
+        return total[0]
+    small,large = measure(probe_size),measure(2*probe_size)
+    return max(large - small,1)/probe_size
+
+
+def micro_batch_sizes(PINN,handler:Loss_handler,batch:PINN_dict,memory_budget:int = None,micro_batch_size:Union[int,Dict[str,int]] = None) -> Dict[str,int]:
+    '''
+    Micro batch size of each group of a batch either given directly or from a memory budget in bytes (see `bytes_per_point()`).
+    Groups that `DE_Getter.splittable()` rejects are never split e.g. grid groups (see `PINN_grid_group()`) and groups with the unbatched kwarg
+    `full_batch` (quadrature groups of integral and weak form terms)
+    '''
+    sizes = {}
+    for name,group in batch.items():
+        if not PINN.splittable(group):
+            sizes[name] = len(group)
+        elif isinstance(micro_batch_size,dict):
+            sizes[name] = micro_batch_size.get(name,len(group))
+        elif micro_batch_size is not None:
+            sizes[name] = micro_batch_size
+        elif memory_budget is not None:
+            sizes[name] = max(1,int(memory_budget//cached_bytes_per_point(PINN,handler,group)))
+        else:
+            sizes[name] = len(group)
+        sizes[name] = min(sizes[name],len(group))
+    return sizes
+
+
+def streamed_backward(PINN,handler:Loss_handler,batch:PINN_dict,weights:Tensor = None,chunks:Union[int,List[List[str]],None] = None,
+                      power:int = 2,aggregation_method:str = 'mean',grad_norms:bool = False,last_layer:bool = False,
+                      memory_budget:int = None,micro_batch_size:Union[int,Dict[str,int]] = None) -> Loss:
+    '''
+    Calculate the loss and call backward one chunk of groups at a time. The graph of each chunk is freed before the next chunk is evaluated so
+    peak memory is set by the largest chunk rather than the whole batch. The gradients are the same as `(weights*loss.individual_losses()).sum().backward()`
+
+    inputs:
+        - PINN: `DE_Getter()`
+        - handler: `Loss_handler()`
+        - batch: `PINN_dict` batch from the dataloader
+        - weights: Tensor of global weights of each loss term (e.g. from GradNorm). Default None (all ones)
+        - chunks: int | list[list[str]] | None. Number of chunks, explicit lists of group names or None for one chunk per group
+        - power, aggregation_method: see `Loss_handler.calculate()`
+        - grad_norms: bool calculate the gradient norm of every loss term while its graph is alive. Stored in `loss.grad_norms` for use with
+            `torch_DE.utils.loss_weighting.weights_from_norms()`
+        - last_layer: bool only use the output layer for the gradient norms
+        - memory_budget: int bytes. Groups whose batch needs more memory are split into micro batches that fit (see `micro_batch_sizes()`)
+        - micro_batch_size: int | dict[str,int]. Set the micro batch size directly instead of using a memory budget
+
+    Operator networks (see `Operator_Module()`) cache a branch embedding that every chunk shares. Its graph is kept alive (`retain_graph`) until the
+    last chunk so `set_branch()` only needs to be called once per step. The retained graph is freed once the embedding is replaced.
+
+    Custom terms are evaluated in the chunk containing all of their groups. Custom terms that do not declare their groups need every group so
+    they force a single chunk. Chunks with custom terms are not micro batched.
+
+    With micro batching each group is evaluated on its own and every micro batch of b points of a batch of B points is scaled by b/B (for mean aggregation)
+    so the gradients are the same as the full batch. Pointwise weighting functions that depend on the whole batch (e.g. causal weighting) only see the micro batch.
+
+    Returns a detached `Loss()` object. The aggregated losses are precomputed so `sum()`, `individual_losses()` and `print_losses()` can be used as normal.
+    `loss.batch_sizes` and `loss.micro_batch_sizes` hold the effective (statistical) batch size and micro batch size of every group
+    '''
+    chunk_groups,chunk_custom = plan_chunks(handler,batch.keys(),chunks)
+    micro = micro_batch_sizes(PINN,handler,batch,memory_budget,micro_batch_size) if (memory_budget is not None or micro_batch_size is not None) \
+        else {name:len(group) for name,group in batch.items()}
+    net = PINN.net
+    mean = aggregation_method == 'mean'
+    #The cached branch embedding of operator networks is shared by every chunk, so its graph must survive each backward
+    branch = getattr(net,'branch_embedding',None)
+    retain = isinstance(branch,Tensor) and branch.requires_grad
+    acc = {}
+
+    def backward_part(sub_batch:PINN_dict,custom,scale:float):
+        loss = handler.calculate(sub_batch,PINN(sub_batch),power,aggregation_method,custom_terms = custom)
+        if len(loss) == 0:
+            return
+        L = scale*loss.aggregated_loss()
+        grads = term_gradients(net,L,last_layer) if grad_norms else None
+        w = 1. if weights is None else weights[torch.tensor(loss.indices,device = weights.device)]
+        (w*L).sum().backward(retain_graph = retain)
+
+        L = L.detach()
+        for k,(term,r,weighting,i) in enumerate(zip(loss.terms,loss.residuals,loss.weightings,loss.indices)):
+            record = acc.setdefault(i,{'term':term,'residuals':[],'weightings':[],'loss':0.,'grads':None})
+            record['residuals'].append(r.detach() if isinstance(r,Tensor) else r)
+            record['weightings'].append(weighting.detach() if isinstance(weighting,Tensor) else weighting)
+            record['loss'] = record['loss'] + L[k]
+            if grads is not None:
+                g = [gj[k] for gj in grads]
+                record['grads'] = g if record['grads'] is None else [a + b for a,b in zip(record['grads'],g)]
+
+    for groups,custom in zip(chunk_groups,chunk_custom):
+        if custom or all(micro[name] >= len(batch[name]) for name in groups):
+            backward_part(PINN_dict({name:batch[name] for name in groups}),custom,1.)
+            continue
+        for name in groups:
+            group = batch[name]
+            B = len(group)
+            for part in group.split(micro[name]):
+                backward_part(PINN_dict({name:part}),False,len(part)/B if mean else 1.)
+
+    if not acc:
+        raise ValueError(f'No loss terms were found for the groups {list(batch.keys())}')
+
+    #Micro batches are joined along the point dimension of the engine e.g. (K,B) residuals of ensembles. Lower rank pieces (e.g. pointwise
+    #weightings of shape (B)) have the points in the last dimension
+    dim = getattr(PINN.deriv_method,'batch_dim',0)
+    def join(pieces):
+        if len(pieces) == 1:
+            return pieces[0]
+        if all(isinstance(p,Tensor) and p.dim() > 0 for p in pieces):
+            return torch.cat(pieces,dim = dim if pieces[0].dim() > dim else -1)
+        return pieces[0]
+
+    #Same order as the handler so the losses line up with the global weights
+    indices = sorted(acc.keys())
+    records = [acc[i] for i in indices]
+    out = Loss([r['term'] for r in records],[join(r['residuals']) for r in records],[join(r['weightings']) for r in records],aggregation_method,power,
+               indices = indices,fused = handler.fused)
+    out.aggregated_loss_ = torch.stack([torch.as_tensor(r['loss']) for r in records])
+    out.grad_norms = torch.stack([torch.sqrt(sum(g.pow(2).sum() for g in r['grads'])) for r in records]) if grad_norms else None
+    out.batch_sizes = {name:len(group) for name,group in batch.items()}
+    out.micro_batch_sizes = micro
+    return out